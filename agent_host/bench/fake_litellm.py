@@ -0,0 +1,143 @@
+"""
+Local stand-in for the LiteLLM proxy, used by run_bench.py.
+
+Serves the two OpenAI-compatible endpoints AgentHost calls
+(/v1/chat/completions, streaming or not, and /v1/models) with configurable
+latency, token rate and error injection, plus a tiny HTTP agent at /agent
+so the benchmark can exercise AgentHost's execution engine.
+
+Router requests (model == --router-model) answer "BenchAgent" when the user
+query mentions "bench", otherwise "none"; everything else gets
+--reply-tokens filler tokens.
+
+    python bench/fake_litellm.py --port 4199 --latency-ms 80 --tokens-per-sec 150
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from typing import Any, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+CONFIG: Dict[str, Any] = {
+    "latency_ms": 50.0,
+    "jitter_ms": 10.0,
+    "tokens_per_sec": 200.0,
+    "reply_tokens": 40,
+    "error_rate": 0.0,
+    "error_status": 500,
+    "router_model": "tinyllama",
+    "agent_latency_ms": 20.0,
+}
+
+STATS: Dict[str, int] = {"chat_completions": 0, "streams": 0, "errors_injected": 0, "agent_calls": 0}
+
+app = FastAPI(title="Fake LiteLLM")
+
+
+def reply_tokens(body: Dict[str, Any]) -> List[str]:
+    if body.get("model") == CONFIG["router_model"]:
+        user_message = body["messages"][-1]["content"]
+        query = user_message.split("Available agents:")[0].lower()
+        return ["BenchAgent"] if "bench" in query else ["none"]
+    count = min(int(body.get("max_tokens") or CONFIG["reply_tokens"]), CONFIG["reply_tokens"])
+    return [f"tok{i} " for i in range(count)]
+
+
+async def simulate_prefill():
+    jitter = random.uniform(-CONFIG["jitter_ms"], CONFIG["jitter_ms"])
+    await asyncio.sleep(max(CONFIG["latency_ms"] + jitter, 0.0) / 1000)
+
+
+@app.get("/v1/models")
+async def models():
+    return {"object": "list", "data": [{"id": CONFIG["router_model"], "object": "model"}, {"id": "qwen2.5", "object": "model"}]}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    STATS["chat_completions"] += 1
+    await simulate_prefill()
+
+    if random.random() < CONFIG["error_rate"]:
+        STATS["errors_injected"] += 1
+        return JSONResponse(
+            status_code=CONFIG["error_status"],
+            content={"error": {"message": "injected failure", "type": "fake_litellm"}},
+        )
+
+    tokens = reply_tokens(body)
+    per_token = 1.0 / CONFIG["tokens_per_sec"] if CONFIG["tokens_per_sec"] > 0 else 0.0
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+    if body.get("stream"):
+        STATS["streams"] += 1
+
+        async def events():
+            for token in tokens:
+                await asyncio.sleep(per_token)
+                chunk = {"id": completion_id, "choices": [{"index": 0, "delta": {"content": token}}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    await asyncio.sleep(per_token * len(tokens))
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+        "usage": {"completion_tokens": len(tokens)},
+    }
+
+
+@app.post("/agent")
+async def bench_agent(request: Request):
+    body = await request.json()
+    STATS["agent_calls"] += 1
+    await asyncio.sleep(CONFIG["agent_latency_ms"] / 1000)
+    return {
+        "request_id": body["request_id"],
+        "status": "success",
+        "result": f"BenchAgent handled: {body['user_query']}",
+        "metadata": {"agent": "BenchAgent"},
+    }
+
+
+@app.get("/fake/stats")
+async def fake_stats():
+    return {"config": CONFIG, **STATS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake LiteLLM server for AgentHost benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4199)
+    parser.add_argument("--latency-ms", type=float, default=CONFIG["latency_ms"], help="time before the first token")
+    parser.add_argument("--jitter-ms", type=float, default=CONFIG["jitter_ms"])
+    parser.add_argument("--tokens-per-sec", type=float, default=CONFIG["tokens_per_sec"])
+    parser.add_argument("--reply-tokens", type=int, default=CONFIG["reply_tokens"])
+    parser.add_argument("--error-rate", type=float, default=CONFIG["error_rate"], help="0..1 share of failed completions")
+    parser.add_argument("--error-status", type=int, default=CONFIG["error_status"])
+    parser.add_argument("--router-model", default=CONFIG["router_model"])
+    parser.add_argument("--agent-latency-ms", type=float, default=CONFIG["agent_latency_ms"])
+    args = parser.parse_args()
+
+    for key in CONFIG:
+        CONFIG[key] = getattr(args, key)
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Microbenchmark of AgentHost's per-request orchestration overhead.
+
+Imports main.py in-process (no server, no LiteLLM) and registers synthetic
+in-process agents that compose in passthrough mode, so a manual-mode query
+exercises routing, execution and composition without any network I/O. Each
+case reports the best-of-N mean cost per call in microseconds as JSON; the
+"legacy" cases reproduce the previous implementation (Pydantic records, a
+registry scan per request) for comparison.
+
+    cd agent_host
+    python bench/micro_orchestration.py --agents 50 --iterations 20000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+AGENT_HOST_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class LegacyExecutionRequest(BaseModel):
+    request_id: str
+    user_query: str
+    routing_mode: str
+    selected_agent: str
+
+
+class LegacyExecutionResponse(BaseModel):
+    request_id: str
+    status: str
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    metadata: Optional[Dict[str, Any]] = None
+
+
+def load_agenthost():
+    # no persistence, logs in a scratch dir, quiet logger
+    os.environ.update({
+        "REGISTRY_LOG_PATH": "",
+        "SESSION_DIR": "",
+        "BATCH_STATE_DIR": "",
+        "HEALTH_PROBE_ENABLED": "false",
+    })
+    os.chdir(tempfile.mkdtemp(prefix="agenthost-bench-"))
+    sys.path.insert(0, AGENT_HOST_DIR)
+    import main
+    main.logger.disabled = True
+    return main
+
+
+def register_bench_agents(main, count: int):
+    async def handle(exec_req):
+        return main.ExecutionResponse(
+            request_id=exec_req.request_id,
+            status="success",
+            result=f"handled {exec_req.user_query}",
+            metadata={"final": True},
+        )
+
+    main.register_builtin_dummy_agent()
+    for i in range(count):
+        agent = main.AgentInfo(
+            agent_name=f"BenchAgent{i}",
+            description=f"Synthetic agent number {i} for the orchestration benchmark.",
+            capability_tags=["bench", f"topic{i}"],
+            curated_routing_prompts=f"Use for topic{i} questions.",
+            example_queries=[f"question about topic{i}"],
+            how_to_call="internal://bench",
+            health_status="healthy",
+            composition_mode="passthrough",
+        )
+        main.AGENT_REGISTRY[agent.agent_name] = agent
+        main.AGENT_HANDLERS[agent.agent_name] = handle
+        main.mark_registry_changed(f"register {agent.agent_name}", agent.agent_name)
+
+
+def time_sync(fn: Callable[[], Any], iterations: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        best = min(best, time.perf_counter() - started)
+    return round(best / iterations * 1e6, 3)
+
+
+async def time_async(fn: Callable[[], Any], iterations: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await fn()
+        best = min(best, time.perf_counter() - started)
+    return round(best / iterations * 1e6, 3)
+
+
+def run(args) -> Dict[str, Any]:
+    main = load_agenthost()
+    register_bench_agents(main, args.agents)
+    n, repeat = args.iterations, args.repeat
+
+    def legacy_eligible() -> List[Any]:
+        return [
+            info for name, info in main.AGENT_REGISTRY.items()
+            if main.is_agent_executable(info) and info.health_status == "healthy"
+        ]
+
+    fields = {"request_id": "r", "user_query": "q", "routing_mode": "manual", "selected_agent": "BenchAgent0"}
+    reply = {"request_id": "r", "status": "success", "result": "x", "metadata": {"final": True}}
+    payload = main.QueryRequest(user_query="question about topic7", routing_mode="manual", selected_agent="BenchAgent7")
+
+    async def orchestrate():
+        return await main.answer_query(payload)
+
+    async def admitted():
+        admitted_at = await main.admit_request("interactive")
+        main.release_request(admitted_at)
+
+    async def measure() -> Dict[str, float]:
+        return {
+            "admission_us": await time_async(admitted, n, repeat),
+            "answer_query_manual_us": await time_async(orchestrate, n, repeat),
+        }
+
+    cases = {
+        "eligible_agents_legacy_scan_us": time_sync(legacy_eligible, n, repeat),
+        "eligible_agents_us": time_sync(main.eligible_agents, n, repeat),
+        "execution_request_legacy_pydantic_us": time_sync(lambda: LegacyExecutionRequest(**fields), n, repeat),
+        "execution_request_us": time_sync(lambda: main.ExecutionRequest(**fields), n, repeat),
+        "execution_response_legacy_pydantic_us": time_sync(lambda: LegacyExecutionResponse(**reply), n, repeat),
+        "execution_response_us": time_sync(lambda: main.ExecutionResponse(**reply), n, repeat),
+        **asyncio.run(measure()),
+    }
+    return {
+        "config": {"agents": len(main.AGENT_REGISTRY), "iterations": n, "repeat": repeat},
+        "results": cases,
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="AgentHost orchestration microbenchmark")
+    parser.add_argument("--agents", type=int, default=50, help="synthetic agents in the registry")
+    parser.add_argument("--iterations", type=int, default=20000, help="calls per timing run")
+    parser.add_argument("--repeat", type=int, default=5, help="timing runs per case (best is reported)")
+    parser.add_argument("--out", default="", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    text = json.dumps(run(args), indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Load-generation benchmark for AgentHost.
+
+Starts fake_litellm.py and an AgentHost instance pointed at it (or uses an
+already running AgentHost via --agenthost-url), registers an HTTP BenchAgent,
+then drives /agenthost/query through the auto, manual and fallback paths at
+fixed concurrency levels. Reports RPS, latency percentiles and the mean
+per-stage breakdown (from AgentHost's Server-Timing header) as JSON.
+
+    cd agent_host
+    python bench/run_bench.py --concurrency 1,8,32 --requests 200 --out bench.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+
+AGENT_HOST_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKE_LITELLM = os.path.join(AGENT_HOST_DIR, "bench", "fake_litellm.py")
+
+PATHS = ("auto", "manual", "fallback")
+
+
+def build_query(path: str, seq: int, unique: bool) -> Dict[str, Any]:
+    suffix = f" #{seq}" if unique else ""
+    if path == "auto":
+        return {"user_query": f"run the bench workload{suffix}", "routing_mode": "auto"}
+    if path == "manual":
+        return {"user_query": f"run the workload{suffix}", "routing_mode": "manual", "selected_agent": "BenchAgent"}
+    return {"user_query": f"tell me something general{suffix}", "routing_mode": "auto"}
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    stages: Dict[str, float] = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.startswith("dur="):
+            stages[name] = float(params[len("dur="):])
+    return stages
+
+
+async def run_level(
+    client: httpx.AsyncClient,
+    base_url: str,
+    path: str,
+    concurrency: int,
+    total_requests: int,
+    unique: bool,
+    seq: "itertools.count[int]",
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+    stage_totals: Dict[str, float] = {}
+    errors = 0
+    remaining = total_requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            body = build_query(path, next(seq), unique)
+            started = time.perf_counter()
+            try:
+                resp = await client.post(
+                    f"{base_url}/agenthost/query",
+                    json=body,
+                    headers={"X-AgentHost-Timing": "true"},
+                )
+                resp.raise_for_status()
+            except Exception:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+            for stage, ms in parse_server_timing(resp.headers.get("server-timing", "")).items():
+                stage_totals[stage] = stage_totals.get(stage, 0.0) + ms
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    ok = len(latencies)
+    return {
+        "path": path,
+        "concurrency": concurrency,
+        "requests": total_requests,
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "rps": round(ok / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / ok, 2) if ok else 0.0,
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "max": round(latencies[-1], 2) if ok else 0.0,
+        },
+        "stages_ms": {stage: round(total / ok, 2) for stage, total in stage_totals.items()} if ok else {},
+    }
+
+
+def start_process(cmd: List[str], env: Dict[str, str], cwd: str) -> subprocess.Popen:
+    return subprocess.Popen(cmd, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+async def wait_ready(url: str, timeout: float = 20.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=2) as client:
+        while time.monotonic() < deadline:
+            try:
+                resp = await client.get(url)
+                if resp.status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not become ready within {timeout}s")
+
+
+def start_stack(args: argparse.Namespace) -> Tuple[List[subprocess.Popen], str, str]:
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    procs = [start_process(
+        [
+            sys.executable, FAKE_LITELLM,
+            "--port", str(args.fake_port),
+            "--latency-ms", str(args.latency_ms),
+            "--tokens-per-sec", str(args.tokens_per_sec),
+            "--reply-tokens", str(args.reply_tokens),
+            "--error-rate", str(args.error_rate),
+        ],
+        dict(os.environ),
+        AGENT_HOST_DIR,
+    )]
+
+    agenthost_url = args.agenthost_url
+    if not agenthost_url:
+        agenthost_url = f"http://127.0.0.1:{args.agenthost_port}"
+        env = dict(os.environ, LITELLM_BASE_URL=fake_url)
+        procs.append(start_process(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.agenthost_port), "--log-level", "warning"],
+            env,
+            AGENT_HOST_DIR,
+        ))
+    return procs, fake_url, agenthost_url
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    procs, fake_url, agenthost_url = start_stack(args)
+    try:
+        await wait_ready(f"{fake_url}/v1/models")
+        await wait_ready(f"{agenthost_url}/agenthost/agents")
+
+        limits = httpx.Limits(max_connections=max(args.concurrency) * 2)
+        async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+            resp = await client.post(f"{agenthost_url}/agenthost/register", json={
+                "agent_name": "BenchAgent",
+                "description": "Benchmark agent served by fake_litellm.",
+                "capability_tags": ["benchmark"],
+                "how_to_call": f"{fake_url}/agent",
+            })
+            resp.raise_for_status()
+
+            seq = itertools.count()
+            results = []
+            for path in args.paths:
+                for concurrency in args.concurrency:
+                    if args.warmup:
+                        await run_level(client, agenthost_url, path, concurrency, args.warmup, args.unique, seq)
+                    result = await run_level(
+                        client, agenthost_url, path, concurrency, args.requests, args.unique, seq
+                    )
+                    print(
+                        f"{path:>8} c={concurrency:<4} rps={result['rps']:<8} "
+                        f"p50={result['latency_ms']['p50']}ms p99={result['latency_ms']['p99']}ms "
+                        f"errors={result['errors']}",
+                        file=sys.stderr,
+                    )
+                    results.append(result)
+
+            fake_stats = (await client.get(f"{fake_url}/fake/stats")).json()
+
+        return {
+            "config": {
+                "agenthost_url": agenthost_url,
+                "requests_per_level": args.requests,
+                "unique_queries": args.unique,
+                "fake_litellm": fake_stats["config"],
+            },
+            "results": results,
+            "fake_litellm_stats": {k: v for k, v in fake_stats.items() if k != "config"},
+        }
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.wait(timeout=10)
+
+
+def csv_ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def csv_paths(value: str) -> List[str]:
+    paths = [v for v in value.split(",") if v]
+    unknown = set(paths) - set(PATHS)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown paths: {sorted(unknown)}")
+    return paths
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="AgentHost load benchmark")
+    parser.add_argument("--concurrency", type=csv_ints, default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="requests per (path, concurrency) level")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--paths", type=csv_paths, default=list(PATHS))
+    parser.add_argument("--unique", action=argparse.BooleanOptionalAction, default=True,
+                        help="unique query text per request (defeats the routing/completion caches)")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--agenthost-url", default="", help="benchmark a running AgentHost instead of spawning one")
+    parser.add_argument("--agenthost-port", type=int, default=8199)
+    parser.add_argument("--fake-port", type=int, default=4199)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0)
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--out", default="", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
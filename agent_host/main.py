@@ -1,9 +1,30 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
-from typing import List, Dict, Optional, Any
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field, ValidationError
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from typing import AsyncIterator, Callable, Iterator, List, Dict, Optional, Any, Protocol, Tuple
+import asyncio
+import bisect
+import hashlib
+import heapq
 import httpx
+import inspect
+import itertools
+import json
+import math
 import os
+import random
+import re
+import sqlite3
+import threading
+import time
 import uuid
+import weakref
 import logging
 from logging.handlers import RotatingFileHandler
 
@@ -42,33 +63,920 @@ LITELLM_API_KEY = os.getenv("LITELLM_API_KEY", "sk-litellm-hub-local-123")
 ROUTER_MODEL_NAME = os.getenv("ROUTER_MODEL_NAME", "tinyllama")
 COMPOSER_MODEL_NAME = os.getenv("COMPOSER_MODEL_NAME", "qwen2.5")  # also used for fallback chat
 
+# Connection pool for the shared LiteLLM client (one per process, see startup/shutdown)
+LITELLM_MAX_CONNECTIONS = int(os.getenv("LITELLM_MAX_CONNECTIONS", "50"))
+LITELLM_MAX_KEEPALIVE = int(os.getenv("LITELLM_MAX_KEEPALIVE", "20"))
+LITELLM_KEEPALIVE_EXPIRY = float(os.getenv("LITELLM_KEEPALIVE_EXPIRY", "30"))
+LITELLM_HTTP2 = os.getenv("LITELLM_HTTP2", "true").lower() in ("1", "true", "yes")
+
+
+# ============================================================
+# METRICS (Per-stage latency, Prometheus text format at /metrics)
+# ============================================================
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{escape_label_value(str(v))}"' for n, v in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...], buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [per-bucket counts (not cumulative; last = above all bounds)..., sum, count]
+        self.series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        data = self.series.get(labels)
+        if data is None:
+            data = self.series[labels] = [0.0] * (len(self.buckets) + 3)
+        data[bisect.bisect_left(self.buckets, value)] += 1
+        data[-2] += value
+        data[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, data in sorted(self.series.items()):
+            count = 0.0
+            for bound, in_bucket in zip(self.buckets, data):
+                count += in_bucket
+                le = format_labels(self.labelnames, labels, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {count:g}")
+            le_inf = format_labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le_inf} {data[-1]:g}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, labels)} {data[-2]}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, labels)} {data[-1]:g}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...], kind: str = "counter"):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.kind = kind
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{format_labels(self.labelnames, labels)} {value:g}")
+        return lines
+
+
+STAGE_DURATION = Histogram(
+    "agenthost_stage_duration_seconds",
+    "Time spent per pipeline stage.",
+    ("stage", "agent", "model"),
+)
+REQUEST_DURATION = Histogram(
+    "agenthost_request_duration_seconds",
+    "End-to-end time per AgentHost query endpoint.",
+    ("endpoint",),
+)
+STAGE_ERRORS = Counter(
+    "agenthost_stage_errors_total",
+    "Failed pipeline stages (LLM errors, agent failures, timeouts).",
+    ("stage", "agent", "model"),
+)
+INFLIGHT_REQUESTS = Counter(
+    "agenthost_inflight_requests",
+    "Query requests currently being processed.",
+    ("endpoint",),
+    kind="gauge",
+)
+
+# Per-request stage totals (seconds); set by track_request, read for Server-Timing
+request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def stage_timer(stage: str, agent: str = "", model: str = "") -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage, agent, model)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_DURATION.observe(elapsed, stage, agent, model)
+        timings = request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def record_stage_error(stage: str, agent: str = "", model: str = ""):
+    STAGE_ERRORS.inc(stage, agent, model)
+
+
+@contextmanager
+def track_request(endpoint: str) -> Iterator[Dict[str, float]]:
+    """
+    In-flight gauge + end-to-end histogram for one query; yields the dict the
+    stage timers of this request accumulate into.
+    """
+    timings: Dict[str, float] = {}
+    token = request_timings.set(timings)
+    INFLIGHT_REQUESTS.inc(endpoint)
+    started = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        elapsed = time.perf_counter() - started
+        timings["total"] = elapsed
+        REQUEST_DURATION.observe(elapsed, endpoint)
+        INFLIGHT_REQUESTS.dec(endpoint)
+        request_timings.reset(token)
+
+
+def wants_timing_header(request: Request) -> bool:
+    return request.headers.get("x-agenthost-timing", "").lower() in ("1", "true", "yes")
+
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+
+def render_stats_gauges(prefix: str, stats: Dict[str, Any]) -> List[str]:
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        name = f"agenthost_{prefix}_{key}"
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value:g}")
+    return lines
+
+
+# ============================================================
+# ADMISSION CONTROL (Priority queues, per-model caps, fast rejection)
+# ============================================================
+#
+# Two layers of PriorityLimiter (a counting semaphore whose waiters are served
+# by priority class, FIFO within a class):
+#   - requests: every /agenthost/query* request needs one of
+#     ADMISSION_MAX_INFLIGHT slots before it starts. A full queue is rejected
+#     at once with 429, a wait past the class deadline with 503; both carry
+#     Retry-After estimated from recent slot hold times.
+#   - per model: every upstream LiteLLM call holds a slot of its model's cap
+#     (LLM_MODEL_CONCURRENCY, e.g. "tinyllama=4,qwen2.5=2") for its duration.
+#     A call that can't get one in time raises AdmissionRejected, which the
+#     pipeline degrades like any other LLM failure.
+# The class comes from the X-AgentHost-Priority header (interactive | batch).
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", "64"))
+ADMISSION_MAX_QUEUE = {
+    "interactive": int(os.getenv("ADMISSION_INTERACTIVE_MAX_QUEUE", "64")),
+    "batch": int(os.getenv("ADMISSION_BATCH_MAX_QUEUE", "512")),
+}
+ADMISSION_WAIT_SECONDS = {
+    "interactive": float(os.getenv("ADMISSION_INTERACTIVE_WAIT_SECONDS", "5")),
+    "batch": float(os.getenv("ADMISSION_BATCH_WAIT_SECONDS", "60")),
+}
+LLM_MODEL_DEFAULT_CONCURRENCY = int(os.getenv("LLM_MODEL_DEFAULT_CONCURRENCY", "4"))
+LLM_MODEL_MAX_QUEUE = int(os.getenv("LLM_MODEL_MAX_QUEUE", "256"))
+
+PRIORITY_CLASSES = ("interactive", "batch")  # served in this order
+
+
+def parse_model_caps(spec: str) -> Dict[str, int]:
+    caps: Dict[str, int] = {}
+    for item in spec.split(","):
+        if "=" in item:
+            model, cap = item.rsplit("=", 1)
+            caps[model.strip()] = int(cap)
+    return caps
+
+
+LLM_MODEL_CONCURRENCY = parse_model_caps(os.getenv("LLM_MODEL_CONCURRENCY", ""))
+
+ADMISSION_WAIT = Histogram(
+    "agenthost_admission_wait_seconds",
+    "Time spent queued for a request or model slot.",
+    ("pool", "priority"),
+)
+
+# Priority class of the current request; inherited by the LLM calls it makes
+request_priority: ContextVar[str] = ContextVar("request_priority", default="interactive")
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class PriorityLimiter:
+    def __init__(self, name: str, capacity: int, max_queue: Dict[str, int]):
+        self.name = name
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.active = 0
+        self.heap: List[list] = []  # [class rank, seq, future, class]; cancelled futures are skipped lazily
+        self.seq = itertools.count()
+        self.queued = {cls: 0 for cls in PRIORITY_CLASSES}
+        self.hold_seconds = 1.0  # EWMA of slot hold time, for Retry-After
+        self.stats = {"admitted": 0, "rejected_full": 0, "rejected_timeout": 0}
+
+    def retry_after(self) -> int:
+        backlog = sum(self.queued.values()) + 1
+        return max(1, math.ceil(self.hold_seconds * backlog / self.capacity))
+
+    async def acquire(self, priority: str, timeout: float):
+        started = time.perf_counter()
+        if self.active < self.capacity and not any(self.queued.values()):
+            self.active += 1
+            self.stats["admitted"] += 1
+            ADMISSION_WAIT.observe(0.0, self.name, priority)
+            return
+
+        if self.queued[priority] >= self.max_queue[priority]:
+            self.stats["rejected_full"] += 1
+            raise AdmissionRejected(429, f"{self.name} queue is full", self.retry_after())
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.heap, [PRIORITY_CLASSES.index(priority), next(self.seq), fut, priority])
+        self.queued[priority] += 1
+        try:
+            async with asyncio.timeout(timeout):
+                await fut
+        except (TimeoutError, asyncio.CancelledError) as e:
+            if fut.done() and not fut.cancelled():
+                self.release(0.0)  # granted right at the deadline: pass the slot on
+            else:
+                fut.cancel()
+                self.queued[priority] -= 1
+            if isinstance(e, TimeoutError):
+                self.stats["rejected_timeout"] += 1
+                raise AdmissionRejected(
+                    503, f"{self.name} queue wait exceeded {timeout:g}s", self.retry_after()
+                ) from None
+            raise
+        finally:
+            ADMISSION_WAIT.observe(time.perf_counter() - started, self.name, priority)
+        self.stats["admitted"] += 1
+
+    def release(self, held: float):
+        self.hold_seconds = 0.9 * self.hold_seconds + 0.1 * held
+        # hand the slot straight to the best waiter, if any
+        while self.heap:
+            _, _, fut, priority = heapq.heappop(self.heap)
+            if fut.done():
+                continue
+            self.queued[priority] -= 1
+            fut.set_result(True)
+            return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: str, timeout: float):
+        await self.acquire(priority, timeout)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - started)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "active": self.active,
+            "queued": dict(self.queued),
+            "retry_after": self.retry_after(),
+            **self.stats,
+        }
+
+
+REQUEST_LIMITER = PriorityLimiter("requests", ADMISSION_MAX_INFLIGHT, ADMISSION_MAX_QUEUE)
+MODEL_LIMITERS: Dict[str, PriorityLimiter] = {}
+
+
+def model_limiter(model: str) -> PriorityLimiter:
+    limiter = MODEL_LIMITERS.get(model)
+    if limiter is None:
+        cap = LLM_MODEL_CONCURRENCY.get(model, LLM_MODEL_DEFAULT_CONCURRENCY)
+        limiter = MODEL_LIMITERS[model] = PriorityLimiter(
+            f"model:{model}", cap, {cls: LLM_MODEL_MAX_QUEUE for cls in PRIORITY_CLASSES}
+        )
+    return limiter
+
+
+def request_priority_from(request: Request) -> str:
+    priority = request.headers.get("x-agenthost-priority", "").lower()
+    return priority if priority in PRIORITY_CLASSES else "interactive"
+
+
+@asynccontextmanager
+async def model_slot(model: str):
+    if not ADMISSION_ENABLED:
+        yield
+        return
+    priority = request_priority.get()
+    async with model_limiter(model).slot(priority, ADMISSION_WAIT_SECONDS[priority]):
+        yield
+
+
+async def admit_request(priority: str) -> float:
+    """
+    Wait for a request slot (recorded as the "admission_queue" stage).
+    Raises AdmissionRejected; pass the returned start time to release_request().
+    """
+    request_priority.set(priority)
+    if ADMISSION_ENABLED:
+        with stage_timer("admission_queue"):
+            await REQUEST_LIMITER.acquire(priority, ADMISSION_WAIT_SECONDS[priority])
+    return time.perf_counter()
+
+
+def release_request(admitted_at: float):
+    if ADMISSION_ENABLED:
+        REQUEST_LIMITER.release(time.perf_counter() - admitted_at)
+
+
+def rejection_response(e: AdmissionRejected) -> JSONResponse:
+    return JSONResponse(
+        status_code=e.status_code,
+        content={"detail": e.reason, "retry_after": e.retry_after},
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+# ============================================================
+# SHARED LITELLM CLIENT (Keep-alive pool, opened at startup)
+# ============================================================
+
+litellm_client: Optional[httpx.AsyncClient] = None
+
+
+def open_litellm_client() -> httpx.AsyncClient:
+    global litellm_client
+    if litellm_client is None:
+        litellm_client = httpx.AsyncClient(
+            base_url=LITELLM_BASE_URL,
+            headers={"Authorization": f"Bearer {LITELLM_API_KEY}"},
+            limits=httpx.Limits(
+                max_connections=LITELLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LITELLM_MAX_KEEPALIVE,
+                keepalive_expiry=LITELLM_KEEPALIVE_EXPIRY,
+            ),
+            http2=LITELLM_HTTP2,
+            timeout=20,
+        )
+    return litellm_client
+
+
+async def close_litellm_client():
+    global litellm_client
+    if litellm_client is not None:
+        await litellm_client.aclose()
+        litellm_client = None
+
+
+async def request_chat_completion(payload: Dict[str, Any], timeout: float) -> str:
+    """
+    POST /v1/chat/completions on the shared client and return the message content.
+    Raises on transport / HTTP errors; callers decide how to degrade.
+    """
+    client = open_litellm_client()
+    async with model_slot(payload["model"]):
+        resp = await client.post("/v1/chat/completions", json=payload, timeout=timeout)
+    resp.raise_for_status()
+    return resp.json()["choices"][0]["message"]["content"]
+
+
+async def request_chat_completion_stream(payload: Dict[str, Any], timeout: float) -> AsyncIterator[str]:
+    """
+    Same as request_chat_completion but with `stream: true`: yields content
+    deltas as LiteLLM forwards them (OpenAI-style SSE `data:` lines).
+    """
+    client = open_litellm_client()
+    async with model_slot(payload["model"]), client.stream(
+        "POST", "/v1/chat/completions", json={**payload, "stream": True}, timeout=timeout
+    ) as resp:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            choices = json.loads(data).get("choices") or []
+            delta = (choices[0].get("delta") or {}).get("content") if choices else None
+            if delta:
+                yield delta
+
+
+# ============================================================
+# SINGLE-FLIGHT (Coalesce identical in-flight LiteLLM calls)
+# ============================================================
+#
+# Concurrent calls with the same payload (model, messages, params; the stream
+# flag aside) share one upstream request. Streaming joiners get the tokens
+# buffered so far, then the live tail; plain joiners get the final text. The
+# upstream call is cancelled only when every waiter has gone away. Flights
+# end with the upstream call: this coalesces bursts, it does not cache.
+
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+class BufferedStream:
+    """
+    Runs an async text stream in the background and buffers its chunks, so
+    a consumer can attach at any point and replay what was already produced
+    before following the live tail. If the source fails, followers re-raise
+    its exception once they have replayed the buffered chunks.
+    """
+
+    def __init__(self, source: AsyncIterator[str]):
+        self.chunks: List[str] = []
+        self.updated = asyncio.Event()
+        self.task = asyncio.create_task(self.pump(source))
+
+    async def pump(self, source: AsyncIterator[str]):
+        try:
+            async for chunk in source:
+                self.chunks.append(chunk)
+                self.updated.set()
+        finally:
+            self.updated.set()
+
+    async def follow(self) -> AsyncIterator[str]:
+        i = 0
+        while True:
+            self.updated.clear()
+            while i < len(self.chunks):
+                yield self.chunks[i]
+                i += 1
+            if self.task.done():
+                while i < len(self.chunks):
+                    yield self.chunks[i]
+                    i += 1
+                if not self.task.cancelled() and self.task.exception() is not None:
+                    raise self.task.exception()
+                break
+            await self.updated.wait()
+
+    async def text(self) -> str:
+        await self.task
+        return "".join(self.chunks)
+
+    def cancel(self):
+        self.task.cancel()
+
+
+class SingleFlight:
+    def __init__(self):
+        self.flights: Dict[str, Any] = {}  # key → asyncio.Task[str] | BufferedStream
+        self.waiters: Dict[str, int] = {}
+        self.stats: Dict[str, int] = {"leaders": 0, "joined": 0, "cancelled": 0}
+
+    @staticmethod
+    def key(payload: Dict[str, Any]) -> str:
+        body = {k: v for k, v in payload.items() if k != "stream"}
+        return hashlib.sha1(json.dumps(body, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def flight_task(flight: Any) -> asyncio.Task:
+        return flight if isinstance(flight, asyncio.Task) else flight.task
+
+    def start(self, key: str, flight: Any):
+        self.flights[key] = flight
+        self.waiters[key] = 0
+        self.stats["leaders"] += 1
+
+        def finished(_):
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+                self.waiters.pop(key, None)
+
+        self.flight_task(flight).add_done_callback(finished)
+
+    def join(self, key: str) -> Optional[Any]:
+        flight = self.flights.get(key)
+        if flight is not None:
+            self.stats["joined"] += 1
+        return flight
+
+    def enter(self, key: str):
+        self.waiters[key] += 1
+
+    def leave(self, key: str, flight: Any):
+        if self.flights.get(key) is not flight:
+            return
+        self.waiters[key] -= 1
+        task = self.flight_task(flight)
+        if self.waiters[key] <= 0 and not task.done():
+            # forget the flight first so the next caller starts a fresh one
+            # instead of joining a cancelled call or a truncated stream
+            del self.flights[key]
+            self.waiters.pop(key, None)
+            task.cancel()
+            self.stats["cancelled"] += 1
+
+    async def call(self, payload: Dict[str, Any], timeout: float) -> str:
+        key = self.key(payload)
+        flight = self.join(key)
+        if flight is None:
+            flight = asyncio.create_task(request_chat_completion(payload, timeout))
+            self.start(key, flight)
+        self.enter(key)
+        try:
+            # shield: one waiter being cancelled must not cancel the shared call
+            result = await asyncio.shield(self.flight_task(flight))
+        finally:
+            self.leave(key, flight)
+        return result if isinstance(flight, asyncio.Task) else "".join(flight.chunks)
+
+    async def stream(self, payload: Dict[str, Any], timeout: float) -> AsyncIterator[str]:
+        key = self.key(payload)
+        flight = self.join(key)
+        if flight is None:
+            flight = BufferedStream(request_chat_completion_stream(payload, timeout))
+            self.start(key, flight)
+        self.enter(key)
+        try:
+            if isinstance(flight, asyncio.Task):
+                # joined a non-streaming call: the whole text arrives as one chunk
+                yield await asyncio.shield(flight)
+            else:
+                async for chunk in flight.follow():
+                    yield chunk
+        finally:
+            self.leave(key, flight)
+
+    def snapshot(self) -> Dict[str, Any]:
+        total = self.stats["leaders"] + self.stats["joined"]
+        return {
+            "enabled": SINGLE_FLIGHT_ENABLED,
+            "in_flight": len(self.flights),
+            **self.stats,
+            "coalesced_ratio": self.stats["joined"] / total if total else 0.0,
+        }
+
+
+single_flight = SingleFlight()
+
+
+async def post_chat_completion(payload: Dict[str, Any], timeout: float) -> str:
+    """
+    Chat completion (message content), sharing the upstream call with any
+    identical request already in flight.
+    """
+    if not SINGLE_FLIGHT_ENABLED:
+        return await request_chat_completion(payload, timeout)
+    return await single_flight.call(payload, timeout)
+
+
+async def stream_chat_completion(payload: Dict[str, Any], timeout: float) -> AsyncIterator[str]:
+    """
+    Streaming chat completion (content deltas), sharing the upstream stream
+    with any identical request already in flight.
+    """
+    source = (
+        single_flight.stream(payload, timeout) if SINGLE_FLIGHT_ENABLED
+        else request_chat_completion_stream(payload, timeout)
+    )
+    async for delta in source:
+        yield delta
+
+
+# ============================================================
+# COMPLETION CACHE (Fallback chat + composer outputs, opt-in)
+# ============================================================
+
+COMPLETION_CACHE_ENABLED = os.getenv("COMPLETION_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+COMPLETION_CACHE_MAX_ENTRIES = int(os.getenv("COMPLETION_CACHE_MAX_ENTRIES", "512"))
+COMPLETION_CACHE_TTL_SECONDS = float(os.getenv("COMPLETION_CACHE_TTL_SECONDS", "3600"))
+COMPLETION_CACHE_MAX_ITEM_BYTES = int(os.getenv("COMPLETION_CACHE_MAX_ITEM_BYTES", "65536"))
+COMPLETION_CACHE_DB_PATH = os.getenv("COMPLETION_CACHE_DB_PATH", "")  # empty = memory tier only
+COMPLETION_CACHE_DB_MAX_ENTRIES = int(os.getenv("COMPLETION_CACHE_DB_MAX_ENTRIES", "50000"))
+
+# Per-request policy, set from the Cache-Control header at the endpoint:
+#   "default" → read + write, "no-cache" → skip read but refresh, "no-store" → skip both
+completion_cache_policy: ContextVar[str] = ContextVar("completion_cache_policy", default="default")
+
+
+def completion_cache_key(payload: Dict[str, Any]) -> str:
+    material = {
+        "model": payload.get("model"),
+        "messages": payload.get("messages"),
+        "max_tokens": payload.get("max_tokens"),
+        "temperature": payload.get("temperature"),
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode()).hexdigest()
+
+
+def set_completion_cache_policy(request: Request):
+    directives = request.headers.get("cache-control", "").lower()
+    if "no-store" in directives:
+        completion_cache_policy.set("no-store")
+    elif "no-cache" in directives:
+        completion_cache_policy.set("no-cache")
+    else:
+        completion_cache_policy.set("default")
+
+
+class CompletionStore(Protocol):
+    def get(self, key: str) -> Optional[str]:
+        ...
+
+    def put(self, key: str, value: str):
+        ...
+
+    def clear(self):
+        ...
+
+    def __len__(self) -> int:
+        ...
+
+
+class MemoryCompletionStore:
+    """
+    In-process LRU tier with a max age per entry.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.time() - stored_at > self.ttl_seconds:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: str):
+        self.entries[key] = (time.time(), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class SqliteCompletionStore:
+    """
+    On-disk tier that survives restarts. Entries older than ttl_seconds are
+    ignored on read and pruned periodically together with the least recently
+    used rows beyond max_entries.
+    """
+
+    PRUNE_EVERY_PUTS = 100
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.puts_since_prune = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.conn.commit()
+        self.prune()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, created_at FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                return None
+            self.conn.execute("UPDATE completions SET accessed_at = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            return row[0]
+
+    def put(self, key: str, value: str):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO completions (key, value, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self.conn.commit()
+            self.puts_since_prune += 1
+            if self.puts_since_prune < self.PRUNE_EVERY_PUTS:
+                return
+        self.prune()
+
+    def prune(self):
+        with self.lock:
+            self.puts_since_prune = 0
+            self.conn.execute(
+                "DELETE FROM completions WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            self.conn.execute(
+                "DELETE FROM completions WHERE key NOT IN ("
+                " SELECT key FROM completions ORDER BY accessed_at DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            self.conn.commit()
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM completions")
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+
+
+class CompletionCache:
+    """
+    Two-tier completion cache: memory first, then the optional disk tier
+    (hits there are promoted to memory). Disk I/O runs off the event loop.
+    """
+
+    def __init__(self, memory: CompletionStore, disk: Optional[CompletionStore] = None):
+        self.memory = memory
+        self.disk = disk
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "skipped_too_large": 0}
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.stats["memory_hits"] += 1
+            return value
+        if self.disk is not None:
+            value = await asyncio.to_thread(self.disk.get, key)
+            if value is not None:
+                self.stats["disk_hits"] += 1
+                self.memory.put(key, value)
+                return value
+        self.stats["misses"] += 1
+        return None
+
+    async def put(self, key: str, value: str):
+        if len(value.encode()) > COMPLETION_CACHE_MAX_ITEM_BYTES:
+            self.stats["skipped_too_large"] += 1
+            return
+        self.memory.put(key, value)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.put, key, value)
+        self.stats["stores"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled": COMPLETION_CACHE_ENABLED,
+            **self.stats,
+            "memory_entries": len(self.memory),
+            "disk_path": COMPLETION_CACHE_DB_PATH or None,
+        }
+
+
+completion_cache = CompletionCache(
+    MemoryCompletionStore(COMPLETION_CACHE_MAX_ENTRIES, COMPLETION_CACHE_TTL_SECONDS)
+)
+
+
+def open_completion_cache_disk():
+    if COMPLETION_CACHE_ENABLED and COMPLETION_CACHE_DB_PATH and completion_cache.disk is None:
+        completion_cache.disk = SqliteCompletionStore(
+            COMPLETION_CACHE_DB_PATH, COMPLETION_CACHE_DB_MAX_ENTRIES, COMPLETION_CACHE_TTL_SECONDS
+        )
+
+
+def close_completion_cache_disk():
+    if isinstance(completion_cache.disk, SqliteCompletionStore):
+        completion_cache.disk.close()
+    completion_cache.disk = None
+
+
+async def cached_chat_completion(payload: Dict[str, Any], timeout: float) -> str:
+    """
+    post_chat_completion behind the completion cache (when enabled and
+    allowed by the request's Cache-Control policy).
+    """
+    policy = completion_cache_policy.get()
+    if not COMPLETION_CACHE_ENABLED or policy == "no-store":
+        return await post_chat_completion(payload, timeout)
+
+    key = completion_cache_key(payload)
+    if policy != "no-cache":
+        cached = await completion_cache.get(key)
+        if cached is not None:
+            return cached
+
+    content = await post_chat_completion(payload, timeout)
+    await completion_cache.put(key, content)
+    return content
+
+
+async def cached_stream_chat_completion(payload: Dict[str, Any], timeout: float) -> AsyncIterator[str]:
+    """
+    Streaming counterpart: a hit is replayed as one chunk; a miss is stored
+    only once the upstream stream has completed without error.
+    """
+    policy = completion_cache_policy.get()
+    if not COMPLETION_CACHE_ENABLED or policy == "no-store":
+        async for delta in stream_chat_completion(payload, timeout):
+            yield delta
+        return
+
+    key = completion_cache_key(payload)
+    if policy != "no-cache":
+        cached = await completion_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+    chunks: List[str] = []
+    async for delta in stream_chat_completion(payload, timeout):
+        chunks.append(delta)
+        yield delta
+    await completion_cache.put(key, "".join(chunks))
+
 
 # ============================================================
 # MODELS: UI ↔ AgentHost
 # ============================================================
 
+SESSION_ID_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
+
+
 class QueryRequest(BaseModel):
     user_query: str
-    routing_mode: str = "auto"            # auto/manual
+    routing_mode: str = "auto"            # auto/manual/multi
     selected_agent: Optional[str] = None  # only used in manual mode
+    session_id: Optional[str] = Field(default=None, pattern=SESSION_ID_PATTERN)  # server-side history
 
 
 class QueryResponse(BaseModel):
     reply: str
 
 
+# One line of a /agenthost/batch body
+class BatchQuery(QueryRequest):
+    id: Optional[str] = None  # default: the line number
+
+
+# Plain chat with one model (no routing), for /agenthost/chat/stream
+class ChatRequest(BaseModel):
+    message: str
+    model: Optional[str] = None           # default COMPOSER_MODEL_NAME
+    session_id: Optional[str] = Field(default=None, pattern=SESSION_ID_PATTERN)
+    max_tokens: int = 256
+
+
 # ============================================================
 # MODELS: AgentHost ↔ Agents (Execution Contract)
 # ============================================================
+#
+# Built on every query, so these are plain slotted dataclasses (~4x cheaper
+# to construct than BaseModel). Pydantic validates only what crosses a
+# boundary: API bodies and HTTP agent replies (ExecutionResponsePayload).
 
-class ExecutionRequest(BaseModel):
+@dataclass(slots=True)
+class ExecutionRequest:
     request_id: str
     user_query: str
     routing_mode: str
     selected_agent: str
 
 
-class ExecutionResponse(BaseModel):
+@dataclass(slots=True)
+class ExecutionResponse:
     request_id: str
     status: str                     # success/error/partial
     result: Optional[Any] = None
@@ -76,11 +984,33 @@ class ExecutionResponse(BaseModel):
     metadata: Optional[Dict[str, Any]] = None
 
 
+# Execution request ids: a random per-process prefix plus a counter, unique
+# like a uuid4 but without a urandom call per request
+REQUEST_ID_PREFIX = uuid.uuid4().hex[:12]
+REQUEST_ID_SEQ = itertools.count(1)
+
+
+def new_request_id() -> str:
+    return f"{REQUEST_ID_PREFIX}-{next(REQUEST_ID_SEQ):x}"
+
+
+# Reply body of an HTTP agent
+class ExecutionResponsePayload(BaseModel):
+    request_id: str
+    status: str
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    metadata: Optional[Dict[str, Any]] = None
+
+
 # ============================================================
 # AGENT REGISTRY MODELS
 # ============================================================
 
-class AgentInfo(BaseModel):
+# Registry record (validated on the way in as AgentRegisterRequest). Mutable
+# only for health_status, which the health prober keeps current.
+@dataclass(slots=True, kw_only=True)
+class AgentInfo:
     agent_name: str
     description: str
     capability_tags: List[str]
@@ -89,7 +1019,15 @@ class AgentInfo(BaseModel):
     usage_hints: Optional[str] = None
     how_to_call: str
     version: Optional[str] = None
-    health_status: str
+    health_status: str                           # kept current by the health prober
+    health_url: Optional[str] = None             # probed with GET (default: how_to_call)
+    composition_mode: str = "llm"                # passthrough/template/llm
+    composition_template: Optional[str] = None   # used in template mode
+    max_concurrency: Optional[int] = None        # in-flight executions (default AGENT_MAX_CONCURRENCY)
+    timeout_seconds: Optional[float] = None      # execution deadline (default AGENT_EXEC_TIMEOUT_SECONDS)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
 
 
 class AgentsListResponse(BaseModel):
@@ -107,6 +1045,11 @@ class AgentRegisterRequest(BaseModel):
     how_to_call: str
     version: Optional[str] = None
     health_status: str = "healthy"
+    health_url: Optional[str] = None
+    composition_mode: str = "llm"
+    composition_template: Optional[str] = None
+    max_concurrency: Optional[int] = None
+    timeout_seconds: Optional[float] = None
 
 
 # Used for Deregister API
@@ -116,13 +1059,311 @@ class AgentDeregisterRequest(BaseModel):
 
 AGENT_REGISTRY: Dict[str, AgentInfo] = {}
 
+# Bumped on every registry change (register/deregister/health); anything derived
+# from the registry (e.g. cached routing decisions) is only valid for one generation.
+REGISTRY_GENERATION = 0
+
+
+# Names of the agents routing may pick (executable and healthy), updated per
+# agent on every registry change; eligible_agents() is the registry-ordered
+# list built from it once per generation instead of a scan per request.
+ELIGIBLE_AGENT_NAMES: set = set()
+eligible_agents_cache: Optional[Tuple[int, List[AgentInfo]]] = None
+
+
+def refresh_agent_eligibility(agent_name: str):
+    info = AGENT_REGISTRY.get(agent_name)
+    if info is not None and is_agent_executable(info) and (
+        info.health_status == "healthy" or (info.health_status == "recovering" and takes_trial_traffic(info))
+    ):
+        ELIGIBLE_AGENT_NAMES.add(agent_name)
+    else:
+        ELIGIBLE_AGENT_NAMES.discard(agent_name)
+
+
+def eligible_agents() -> List[AgentInfo]:
+    """
+    Executable & healthy agents in registry order. Shared; don't mutate.
+    """
+    global eligible_agents_cache
+    if OPEN_BREAKER_AGENTS:
+        release_expired_breakers()
+    if eligible_agents_cache is None or eligible_agents_cache[0] != REGISTRY_GENERATION:
+        agents = [info for name, info in AGENT_REGISTRY.items() if name in ELIGIBLE_AGENT_NAMES]
+        eligible_agents_cache = (REGISTRY_GENERATION, agents)
+    return eligible_agents_cache[1]
+
+
+def mark_registry_changed(reason: str, agent_name: Optional[str] = None):
+    """
+    agent_name: the one agent that changed; None re-checks them all.
+    """
+    global REGISTRY_GENERATION
+    REGISTRY_GENERATION += 1
+    ROUTING_CACHE.invalidate()
+    if agent_name is not None:
+        refresh_agent_eligibility(agent_name)
+    else:
+        ELIGIBLE_AGENT_NAMES.clear()
+        for name in AGENT_REGISTRY:
+            refresh_agent_eligibility(name)
+    logger.info("Registry changed (%s) → generation %d", reason, REGISTRY_GENERATION)
+
+
+# ============================================================
+# SEMANTIC FAST-PATH ROUTER (Local embeddings, no LLM call)
+# ============================================================
+
+SEMANTIC_ROUTER_ENABLED = os.getenv("SEMANTIC_ROUTER_ENABLED", "true").lower() in ("1", "true", "yes")
+SEMANTIC_EMBEDDING_BACKEND = os.getenv("SEMANTIC_EMBEDDING_BACKEND", "hashing")  # hashing/sentence-transformers
+SEMANTIC_EMBEDDING_MODEL = os.getenv("SEMANTIC_EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+SEMANTIC_ROUTER_MIN_SCORE = float(os.getenv("SEMANTIC_ROUTER_MIN_SCORE", "0.6"))
+SEMANTIC_ROUTER_MARGIN = float(os.getenv("SEMANTIC_ROUTER_MARGIN", "0.1"))
+
+
+class EmbeddingBackend(Protocol):
+    def embed(self, texts: List[str]) -> Any:
+        """
+        Vectors for texts, in the backend's own representation.
+        """
+        ...
+
+    def best_score(self, query: Any, vectors: Any) -> float:
+        """
+        Highest cosine similarity between query (embed([q]) item 0) and vectors.
+        """
+        ...
+
+
+class HashingEmbeddingBackend:
+    """
+    Deterministic bag-of-words embedding (unigrams + bigrams hashed into a
+    fixed number of buckets, L2-normalised). No model, no dependencies;
+    good enough for queries that reuse an agent's own vocabulary, and
+    stable across processes, so it doubles as the test backend.
+    Vectors are sparse ({bucket: weight}): a text only touches a few dozen
+    of the buckets, so dot products cost O(features), not O(dim).
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def embed_one(self, text: str) -> Dict[int, float]:
+        words = re.findall(r"[a-z0-9]+", text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        vec: Dict[int, float] = {}
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vec[bucket] = vec.get(bucket, 0.0) + (1.0 if digest[4] & 1 else -1.0)
+        norm = math.sqrt(sum(v * v for v in vec.values()))
+        return {k: v / norm for k, v in vec.items() if v} if norm else {}
+
+    def embed(self, texts: List[str]) -> List[Dict[int, float]]:
+        return [self.embed_one(t) for t in texts]
+
+    def best_score(self, query: Dict[int, float], vectors: List[Dict[int, float]]) -> float:
+        best = 0.0
+        for vec in vectors:
+            small, large = (query, vec) if len(query) <= len(vec) else (vec, query)
+            best = max(best, sum(w * large.get(k, 0.0) for k, w in small.items()))
+        return best
+
+
+class SentenceTransformerEmbeddingBackend:
+    """
+    CPU sentence-transformers model (optional dependency, loaded lazily).
+    """
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def embed(self, texts: List[str]) -> Any:
+        # one normalised numpy matrix (rows = texts)
+        return self.model.encode(texts, normalize_embeddings=True)
+
+    def best_score(self, query: Any, vectors: Any) -> float:
+        return float((vectors @ query).max())
+
+
+def make_embedding_backend(name: str) -> EmbeddingBackend:
+    if name == "sentence-transformers":
+        try:
+            return SentenceTransformerEmbeddingBackend(SEMANTIC_EMBEDDING_MODEL)
+        except Exception as e:
+            logger.warning("[semantic] sentence-transformers unavailable (%s) → hashing backend.", e)
+    return HashingEmbeddingBackend()
+
+
+embedding_backend: EmbeddingBackend = make_embedding_backend(SEMANTIC_EMBEDDING_BACKEND)
+
+# agent_name -> the backend's vectors for its routing texts (description, tags, prompts, examples)
+SEMANTIC_INDEX: Dict[str, Any] = {}
+
+SEMANTIC_ROUTER_STATS: Dict[str, int] = {
+    "fast_path": 0,
+    "llm_fallback": 0,
+}
+
+
+def agent_routing_texts(agent: AgentInfo) -> List[str]:
+    texts = [agent.description, " ".join(agent.capability_tags), *agent.example_queries]
+    if agent.curated_routing_prompts:
+        texts.append(agent.curated_routing_prompts)
+    return [t for t in texts if t.strip()]
+
+
+def index_agent_embeddings(agent: AgentInfo):
+    # CPU-bound (a model forward pass with sentence-transformers): the register
+    # endpoint runs it via asyncio.to_thread
+    texts = agent_routing_texts(agent)
+    if texts:
+        SEMANTIC_INDEX[agent.agent_name] = embedding_backend.embed(texts)
+    else:
+        SEMANTIC_INDEX.pop(agent.agent_name, None)
+
+
+def drop_agent_embeddings(agent_name: str):
+    SEMANTIC_INDEX.pop(agent_name, None)
+
+
+def score_agents_semantic_sync(user_query: str, agents: List[AgentInfo]) -> List[Tuple[float, str]]:
+    query_vec = embedding_backend.embed([user_query])[0]
+    scores: List[Tuple[float, str]] = []
+    for a in agents:
+        vectors = SEMANTIC_INDEX.get(a.agent_name)
+        if vectors is not None:
+            scores.append((embedding_backend.best_score(query_vec, vectors), a.agent_name))
+    scores.sort(reverse=True)
+    return scores
+
+
+async def score_agents_semantic(user_query: str, agents: List[AgentInfo]) -> List[Tuple[float, str]]:
+    """
+    (best cosine score, agent_name) for every indexed agent, highest first.
+    Encoding and scoring run on a worker thread, off the event loop.
+    """
+    return await asyncio.to_thread(score_agents_semantic_sync, user_query, agents)
+
+
+async def select_agent_semantic(user_query: str, agents: List[AgentInfo]) -> Optional[str]:
+    """
+    Nearest-neighbour match of the query against the indexed routing texts.
+    Returns an agent only when its best score clears SEMANTIC_ROUTER_MIN_SCORE
+    and beats the runner-up by SEMANTIC_ROUTER_MARGIN; otherwise None, and the
+    caller asks the router LLM.
+    """
+    if not SEMANTIC_ROUTER_ENABLED or not agents:
+        return None
+
+    scores = await score_agents_semantic(user_query, agents)
+    if not scores:
+        return None
+
+    top_score, top_agent = scores[0]
+    runner_up = scores[1][0] if len(scores) > 1 else 0.0
+
+    if top_score >= SEMANTIC_ROUTER_MIN_SCORE and top_score - runner_up >= SEMANTIC_ROUTER_MARGIN:
+        logger.info("[semantic] Fast path selected %s (score=%.3f, margin=%.3f)",
+                    top_agent, top_score, top_score - runner_up)
+        return top_agent
+
+    logger.info("[semantic] Low confidence (best=%s score=%.3f) → router LLM.", top_agent, top_score)
+    return None
+
+
+# ============================================================
+# ROUTING DECISION CACHE (LRU + TTL, per registry generation)
+# ============================================================
+
+ROUTING_CACHE_ENABLED = os.getenv("ROUTING_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+ROUTING_CACHE_MAX_ENTRIES = int(os.getenv("ROUTING_CACHE_MAX_ENTRIES", "1024"))
+ROUTING_CACHE_TTL_SECONDS = float(os.getenv("ROUTING_CACHE_TTL_SECONDS", "600"))
+
+
+def normalize_query(user_query: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", user_query.lower()))
+
+
+class RoutingCache:
+    """
+    Maps (normalized query fingerprint, registry generation) to the router's
+    decision: an agent name, or None for "none". Bounded by LRU size and TTL.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries: "OrderedDict[Tuple[str, int], Tuple[float, Optional[str]]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    @staticmethod
+    def key(user_query: str) -> Tuple[str, int]:
+        fingerprint = hashlib.sha1(normalize_query(user_query).encode()).hexdigest()
+        return fingerprint, REGISTRY_GENERATION
+
+    def contains(self, user_query: str) -> bool:
+        """
+        Non-counting, non-refreshing peek (used to decide whether to speculate).
+        """
+        entry = self.entries.get(self.key(user_query))
+        return entry is not None and time.monotonic() - entry[0] <= self.ttl_seconds
+
+    def get(self, user_query: str) -> Tuple[bool, Optional[str]]:
+        """
+        Returns (found, agent_name). found=False means ask the router.
+        """
+        key = self.key(user_query)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return False, None
+
+        stored_at, agent_name = entry
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self.entries[key]
+            self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            return False, None
+
+        self.entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return True, agent_name
+
+    def put(self, user_query: str, agent_name: Optional[str]):
+        key = self.key(user_query)
+        self.entries[key] = (time.monotonic(), agent_name)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def invalidate(self):
+        self.entries.clear()
+        self.stats["invalidations"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_ratio": self.stats["hits"] / lookups if lookups else 0.0,
+            "size": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "registry_generation": REGISTRY_GENERATION,
+        }
+
+
+ROUTING_CACHE = RoutingCache(ROUTING_CACHE_MAX_ENTRIES, ROUTING_CACHE_TTL_SECONDS)
+
 
 # ============================================================
 # REGISTER BUILT-IN DUMMY AGENT
 # ============================================================
 
-def register_builtin_dummy_agent():
-    dummy = AgentInfo(
+def builtin_dummy_agent() -> AgentInfo:
+    return AgentInfo(
         agent_name="DummyAgent",
         description="A simple built-in agent used for testing the AgentHost pipeline.",
         capability_tags=["test", "echo", "dummy"],
@@ -132,8 +1373,185 @@ def register_builtin_dummy_agent():
         how_to_call="internal://dummy",
         version="v1",
         health_status="healthy",
+        composition_mode="passthrough",
     )
+
+
+# name → factory for agents defined in code; they are registered at startup
+# (before the registry log is replayed) and can be overridden but not removed
+BUILTIN_AGENTS = {"DummyAgent": builtin_dummy_agent}
+
+
+def register_builtin_dummy_agent():
+    dummy = builtin_dummy_agent()
     AGENT_REGISTRY[dummy.agent_name] = dummy
+    index_agent_embeddings(dummy)
+    compile_agent_prompt(dummy)
+    mark_registry_changed(f"register {dummy.agent_name}", dummy.agent_name)
+
+
+# ============================================================
+# REGISTRY STORE (Append-only log, replayed at startup)
+# ============================================================
+#
+# Every register/deregister appends one JSON line ({"op": ..., ...}) and is
+# fsynced before the endpoint returns. Startup replays the log into
+# AGENT_REGISTRY (and the semantic index) before the app accepts requests.
+# Once the log holds far more records than live agents it is rewritten as one
+# register line per agent (temp file + rename). The built-in DummyAgent is
+# registered in code and never logged; a logged register of it is an override,
+# and deregistering it drops the override instead of removing the agent, so the
+# replayed state always matches the live one.
+
+REGISTRY_LOG_PATH = os.getenv("REGISTRY_LOG_PATH", "agent_registry.jsonl")  # empty = in-memory only
+REGISTRY_LOG_FSYNC = os.getenv("REGISTRY_LOG_FSYNC", "true").lower() in ("1", "true", "yes")
+REGISTRY_COMPACT_MIN_RECORDS = int(os.getenv("REGISTRY_COMPACT_MIN_RECORDS", "200"))
+REGISTRY_COMPACT_RATIO = float(os.getenv("REGISTRY_COMPACT_RATIO", "2.0"))
+
+
+class RegistryLog:
+    def __init__(self, path: str, fsync: bool, compact_min_records: int, compact_ratio: float):
+        self.path = path
+        self.fsync = fsync
+        self.compact_min_records = compact_min_records
+        self.compact_ratio = compact_ratio
+        self.lock = threading.Lock()
+        self.file = None
+        self.live: Dict[str, Dict[str, Any]] = {}  # agent_name → AgentInfo fields
+        self.records = 0
+        self.stats = {"appends": 0, "compactions": 0, "replayed": 0, "skipped_lines": 0, "replay_ms": 0.0}
+
+    def apply(self, record: Dict[str, Any]):
+        if record["op"] == "register":
+            self.live[record["agent"]["agent_name"]] = record["agent"]
+        elif record["op"] == "deregister":
+            self.live.pop(record["agent_name"], None)
+
+    def open(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Replay the log and open it for appending. A torn or unreadable line
+        (crash mid-write) is skipped and the log is compacted right away so
+        later appends never land after a partial line.
+        """
+        start = time.perf_counter()
+        torn = False
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        torn = True
+                        break
+                    try:
+                        self.apply(json.loads(line))
+                        self.records += 1
+                    except Exception:
+                        torn = True
+                        self.stats["skipped_lines"] += 1
+        self.stats["replayed"] = self.records
+        self.stats["replay_ms"] = round((time.perf_counter() - start) * 1000, 3)
+
+        with self.lock:
+            if torn or self.should_compact():
+                self.compact_locked()
+            else:
+                self.file = open(self.path, "a", encoding="utf-8")
+        return dict(self.live)
+
+    def should_compact(self) -> bool:
+        return self.records > max(self.compact_min_records, self.compact_ratio * len(self.live))
+
+    def write_line(self, f, record: Dict[str, Any]):
+        f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def sync(self, f):
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+
+    def append(self, record: Dict[str, Any]):
+        with self.lock:
+            self.write_line(self.file, record)
+            self.sync(self.file)
+            self.apply(record)
+            self.records += 1
+            self.stats["appends"] += 1
+            if self.should_compact():
+                self.compact_locked()
+
+    def compact_locked(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for agent in self.live.values():
+                self.write_line(f, {"op": "register", "agent": agent})
+            self.sync(f)
+        if self.file is not None:
+            self.file.close()
+        os.replace(tmp_path, self.path)
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.records = len(self.live)
+        self.stats["compactions"] += 1
+        logger.info("[registry] compacted %s to %d records", self.path, self.records)
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "path": self.path,
+                "records": self.records,
+                "live_agents": len(self.live),
+                **self.stats,
+            }
+
+
+REGISTRY_STORE: Optional[RegistryLog] = (
+    RegistryLog(REGISTRY_LOG_PATH, REGISTRY_LOG_FSYNC, REGISTRY_COMPACT_MIN_RECORDS, REGISTRY_COMPACT_RATIO)
+    if REGISTRY_LOG_PATH else None
+)
+
+# Serializes registry mutations so the log order matches the in-memory order
+REGISTRY_WRITE_LOCK = asyncio.Lock()
+
+
+def restore_registry():
+    """
+    Rebuild persisted agents (and their routing embeddings) at startup, after
+    the built-ins, so a persisted override of a built-in wins.
+    """
+    if REGISTRY_STORE is None:
+        return
+    start = time.perf_counter()
+    restored = 0
+    for name, fields in REGISTRY_STORE.open().items():
+        try:
+            agent = AgentInfo(**fields)
+        except Exception as e:
+            logger.warning("[registry] skipping persisted agent %s: %s", name, e)
+            continue
+        AGENT_REGISTRY[agent.agent_name] = agent
+        index_agent_embeddings(agent)
+        compile_agent_prompt(agent)
+        restored += 1
+    if restored:
+        mark_registry_changed(f"restore {restored} agents")
+    logger.info(
+        "[registry] restored %d agents from %s in %.1f ms",
+        restored, REGISTRY_STORE.path, (time.perf_counter() - start) * 1000,
+    )
+
+
+async def persist_registry_change(record: Dict[str, Any]):
+    if REGISTRY_STORE is None:
+        return
+    try:
+        await asyncio.to_thread(REGISTRY_STORE.append, record)
+    except Exception:
+        # the in-memory registry stays authoritative; only durability is lost
+        logger.exception("[registry] failed to persist %s", record.get("op"))
 
 
 # ============================================================
@@ -156,25 +1574,513 @@ AGENT_HANDLERS = {
 }
 
 
+# ============================================================
+# AGENT EXECUTION ENGINE (Thread pool + pooled HTTP, per-agent limits)
+# ============================================================
+#
+# In-process handlers (AGENT_HANDLERS) run on a thread pool (sync) or are
+# awaited directly (async def). Agents registered with an http(s):// how_to_call
+# receive the ExecutionRequest as a JSON POST and must answer with an
+# ExecutionResponse. Every execution waits for a per-agent concurrency slot
+# and is cancelled once its deadline (queueing included) expires.
+
+AGENT_EXEC_TIMEOUT_SECONDS = float(os.getenv("AGENT_EXEC_TIMEOUT_SECONDS", "30"))
+AGENT_MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", "64"))
+AGENT_THREADPOOL_WORKERS = int(os.getenv("AGENT_THREADPOOL_WORKERS", "32"))
+AGENT_HTTP_MAX_CONNECTIONS = int(os.getenv("AGENT_HTTP_MAX_CONNECTIONS", "512"))
+AGENT_HTTP_MAX_KEEPALIVE = int(os.getenv("AGENT_HTTP_MAX_KEEPALIVE", "64"))
+
+agent_executor = ThreadPoolExecutor(max_workers=AGENT_THREADPOOL_WORKERS, thread_name_prefix="agent-exec")
+agent_http_client: Optional[httpx.AsyncClient] = None
+
+# handler -> is it an async def (inspect is too slow to ask per request)
+HANDLER_IS_ASYNC: Dict[Any, bool] = {}
+
+# agent_name -> (limit, semaphore); rebuilt when the agent's limit changes
+AGENT_SEMAPHORES: Dict[str, Tuple[int, asyncio.Semaphore]] = {}
+AGENT_INFLIGHT: Dict[str, int] = {}
+
+
+def open_agent_http_client() -> httpx.AsyncClient:
+    global agent_http_client
+    if agent_http_client is None:
+        agent_http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=AGENT_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=AGENT_HTTP_MAX_KEEPALIVE,
+            ),
+            timeout=AGENT_EXEC_TIMEOUT_SECONDS,
+        )
+    return agent_http_client
+
+
+async def close_agent_http_client():
+    global agent_http_client
+    if agent_http_client is not None:
+        await agent_http_client.aclose()
+        agent_http_client = None
+
+
+def is_http_agent(agent_info: AgentInfo) -> bool:
+    return agent_info.how_to_call.startswith(("http://", "https://"))
+
+
+def is_agent_executable(agent_info: AgentInfo) -> bool:
+    return agent_info.agent_name in AGENT_HANDLERS or is_http_agent(agent_info)
+
+
+def agent_semaphore(agent_info: AgentInfo) -> asyncio.Semaphore:
+    limit = agent_info.max_concurrency or AGENT_MAX_CONCURRENCY
+    current = AGENT_SEMAPHORES.get(agent_info.agent_name)
+    if current is None or current[0] != limit:
+        current = (limit, asyncio.Semaphore(limit))
+        AGENT_SEMAPHORES[agent_info.agent_name] = current
+    return current[1]
+
+
+async def call_http_agent(agent_info: AgentInfo, exec_req: ExecutionRequest) -> ExecutionResponse:
+    client = open_agent_http_client()
+    resp = await client.post(agent_info.how_to_call, json=asdict(exec_req))
+    resp.raise_for_status()
+    reply = ExecutionResponsePayload.model_validate(resp.json())
+    return ExecutionResponse(reply.request_id, reply.status, reply.result, reply.error, reply.metadata)
+
+
+async def run_agent(agent_info: AgentInfo, exec_req: ExecutionRequest) -> ExecutionResponse:
+    handler = AGENT_HANDLERS.get(agent_info.agent_name)
+    if handler is None:
+        return await call_http_agent(agent_info, exec_req)
+    is_async = HANDLER_IS_ASYNC.get(handler)
+    if is_async is None:
+        is_async = HANDLER_IS_ASYNC[handler] = inspect.iscoroutinefunction(handler)
+    if is_async:
+        return await handler(exec_req)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(agent_executor, handler, exec_req)
+
+
+async def execute_agent(agent_info: AgentInfo, exec_req: ExecutionRequest) -> ExecutionResponse:
+    """
+    Execute one agent under its concurrency limit and deadline. Never raises:
+    failures and timeouts come back as status="error" responses.
+
+    NOTE: a sync handler that is already running on the thread pool cannot be
+    interrupted; on timeout its result is simply discarded.
+    """
+    agent_name = agent_info.agent_name
+    timeout = agent_info.timeout_seconds or AGENT_EXEC_TIMEOUT_SECONDS
+    start = time.perf_counter()
+    started = False  # a deadline spent queueing for a slot is not the agent's fault
+
+    try:
+        with stage_timer("agent_execution", agent=agent_name):
+            async with asyncio.timeout(timeout):
+                async with agent_semaphore(agent_info):
+                    started = True
+                    AGENT_INFLIGHT[agent_name] = AGENT_INFLIGHT.get(agent_name, 0) + 1
+                    try:
+                        exec_res = await run_agent(agent_info, exec_req)
+                    finally:
+                        AGENT_INFLIGHT[agent_name] -= 1
+        if exec_res.status == "error":
+            record_stage_error("agent_execution", agent=agent_name)
+        # an error *response* is still a live agent; only timeouts/exceptions count against it
+        record_agent_outcome(agent_name, True, time.perf_counter() - start)
+        return exec_res
+
+    except TimeoutError:
+        if started:
+            record_agent_outcome(agent_name, False, time.perf_counter() - start, "timeout")
+        logger.error(
+            "Agent '%s' timed out after %.1fs%s", agent_name, timeout, "" if started else " waiting for a slot"
+        )
+        return ExecutionResponse(
+            request_id=exec_req.request_id,
+            status="error",
+            error=f"Agent '{agent_name}' timed out after {timeout:g}s",
+            result=None,
+            metadata={"agent": agent_name, "timeout": True},
+        )
+    except Exception as e:
+        record_agent_outcome(agent_name, False, time.perf_counter() - start, str(e))
+        logger.error("Agent '%s' threw exception: %s", agent_name, e)
+        return ExecutionResponse(
+            request_id=exec_req.request_id,
+            status="error",
+            error=str(e),
+            result=None,
+            metadata={"agent": agent_name},
+        )
+
+
+# ============================================================
+# AGENT HEALTH (Background prober + circuit breakers)
+# ============================================================
+#
+# A background task GETs every HTTP agent's health_url (or how_to_call) on a
+# jittered schedule; real executions feed the same rolling window. Each agent
+# has a circuit breaker:
+#   closed    → healthy, routable; trips to open on HEALTH_FAILURE_THRESHOLD
+#               consecutive failures or an error rate ≥ HEALTH_ERROR_RATE_THRESHOLD
+#   open      → "unhealthy", not routable, not probed until HEALTH_OPEN_SECONDS
+#               pass (doubling per consecutive trip, up to HEALTH_OPEN_MAX_SECONDS)
+#   half_open → "recovering", probed every cycle; HEALTH_HALF_OPEN_SUCCESSES
+#               successes close it, one failure re-opens it
+# Open breakers turn half-open when routing next looks at the eligible agents,
+# prober or not. Agents nobody probes (in-process handlers, or every agent when
+# HEALTH_PROBE_ENABLED=false) take real traffic while recovering, since that
+# traffic is the only way their breaker can close again.
+# The state is mirrored into AgentInfo.health_status, which is what routing
+# filters on; every change bumps the registry generation.
+
+HEALTH_PROBE_ENABLED = os.getenv("HEALTH_PROBE_ENABLED", "true").lower() in ("1", "true", "yes")
+HEALTH_PROBE_INTERVAL_SECONDS = float(os.getenv("HEALTH_PROBE_INTERVAL_SECONDS", "10"))
+HEALTH_PROBE_JITTER = float(os.getenv("HEALTH_PROBE_JITTER", "0.2"))  # ± fraction of the interval
+HEALTH_PROBE_TIMEOUT_SECONDS = float(os.getenv("HEALTH_PROBE_TIMEOUT_SECONDS", "2"))
+HEALTH_PROBE_CONCURRENCY = int(os.getenv("HEALTH_PROBE_CONCURRENCY", "32"))
+HEALTH_WINDOW = int(os.getenv("HEALTH_WINDOW", "20"))
+HEALTH_MIN_SAMPLES = int(os.getenv("HEALTH_MIN_SAMPLES", "5"))
+HEALTH_FAILURE_THRESHOLD = int(os.getenv("HEALTH_FAILURE_THRESHOLD", "3"))
+HEALTH_ERROR_RATE_THRESHOLD = float(os.getenv("HEALTH_ERROR_RATE_THRESHOLD", "0.5"))
+HEALTH_OPEN_SECONDS = float(os.getenv("HEALTH_OPEN_SECONDS", "30"))
+HEALTH_OPEN_MAX_SECONDS = float(os.getenv("HEALTH_OPEN_MAX_SECONDS", "300"))
+HEALTH_HALF_OPEN_SUCCESSES = int(os.getenv("HEALTH_HALF_OPEN_SUCCESSES", "2"))
+
+BREAKER_HEALTH_STATUS = {"closed": "healthy", "open": "unhealthy", "half_open": "recovering"}
+
+
+class CircuitBreaker:
+    def __init__(self):
+        self.state = "closed"
+        self.window: deque = deque(maxlen=HEALTH_WINDOW)  # (ok, latency_seconds)
+        self.consecutive_failures = 0
+        self.consecutive_trips = 0
+        self.half_open_successes = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self.last_error: Optional[str] = None
+        self.last_probe_at: Optional[float] = None
+
+    def open_seconds(self) -> float:
+        return min(HEALTH_OPEN_SECONDS * 2 ** max(self.consecutive_trips - 1, 0), HEALTH_OPEN_MAX_SECONDS)
+
+    def error_rate(self) -> float:
+        if not self.window:
+            return 0.0
+        return sum(1 for ok, _ in self.window if not ok) / len(self.window)
+
+    def trip(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        self.consecutive_trips += 1
+        self.half_open_successes = 0
+
+    def record(self, ok: bool, latency: float, error: Optional[str] = None):
+        self.window.append((ok, latency))
+        if ok:
+            self.consecutive_failures = 0
+        else:
+            self.consecutive_failures += 1
+            self.last_error = error
+
+        if self.state == "half_open":
+            if not ok:
+                self.trip()
+            else:
+                self.half_open_successes += 1
+                if self.half_open_successes >= HEALTH_HALF_OPEN_SUCCESSES:
+                    self.state = "closed"
+                    self.consecutive_trips = 0
+                    self.window.clear()
+        elif self.state == "closed" and not ok:
+            if self.consecutive_failures >= HEALTH_FAILURE_THRESHOLD or (
+                len(self.window) >= HEALTH_MIN_SAMPLES and self.error_rate() >= HEALTH_ERROR_RATE_THRESHOLD
+            ):
+                self.trip()
+
+    def half_open_if_due(self):
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.open_seconds():
+            self.state = "half_open"
+            self.half_open_successes = 0
+
+    def due_for_probe(self) -> bool:
+        # open breakers are left alone until their open period is over
+        self.half_open_if_due()
+        return self.state != "open"
+
+    def snapshot(self) -> Dict[str, Any]:
+        latencies = sorted(latency for _, latency in self.window)
+        return {
+            "state": self.state,
+            "samples": len(self.window),
+            "error_rate": round(self.error_rate(), 4),
+            "latency_ms_avg": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+            "latency_ms_p95": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 2) if latencies else None,
+            "consecutive_failures": self.consecutive_failures,
+            "trips": self.trips,
+            "open_seconds": self.open_seconds() if self.state == "open" else None,
+            "last_error": self.last_error,
+            "last_probe_at": self.last_probe_at,
+        }
+
+
+AGENT_BREAKERS: Dict[str, CircuitBreaker] = {}
+OPEN_BREAKER_AGENTS: set = set()  # agents whose breaker is open, checked for expiry by routing
+health_probe_task: Optional[asyncio.Task] = None
+
+
+def agent_breaker(agent_name: str) -> CircuitBreaker:
+    breaker = AGENT_BREAKERS.get(agent_name)
+    if breaker is None:
+        breaker = AGENT_BREAKERS[agent_name] = CircuitBreaker()
+    return breaker
+
+
+def takes_trial_traffic(agent_info: AgentInfo) -> bool:
+    # probed agents recover through the prober; the rest only through real calls
+    return not (HEALTH_PROBE_ENABLED and is_http_agent(agent_info))
+
+
+def sync_agent_health(agent_name: str):
+    # mirror the breaker state into health_status (what routing filters on)
+    agent_info = AGENT_REGISTRY.get(agent_name)
+    breaker = AGENT_BREAKERS.get(agent_name)
+    if agent_info is None or breaker is None:
+        OPEN_BREAKER_AGENTS.discard(agent_name)
+        return
+    if breaker.state == "open":
+        OPEN_BREAKER_AGENTS.add(agent_name)
+    else:
+        OPEN_BREAKER_AGENTS.discard(agent_name)
+    status = BREAKER_HEALTH_STATUS[breaker.state]
+    if agent_info.health_status != status:
+        logger.info("[health] %s: %s → %s", agent_name, agent_info.health_status, status)
+        agent_info.health_status = status
+        mark_registry_changed(f"health {agent_name} {status}", agent_name)
+
+
+def release_expired_breakers():
+    # open → half_open once the open period is over, for every agent
+    for agent_name in list(OPEN_BREAKER_AGENTS):
+        breaker = AGENT_BREAKERS.get(agent_name)
+        if breaker is not None:
+            breaker.half_open_if_due()
+        sync_agent_health(agent_name)
+
+
+def record_agent_outcome(agent_name: str, ok: bool, latency: float, error: Optional[str] = None):
+    if agent_name not in AGENT_REGISTRY:
+        return
+    agent_breaker(agent_name).record(ok, latency, error)
+    sync_agent_health(agent_name)
+
+
+async def probe_agent(agent_info: AgentInfo, semaphore: asyncio.Semaphore):
+    # any HTTP answer below 500 means the agent's server is up (a GET on an
+    # execution endpoint typically answers 405)
+    await asyncio.sleep(random.uniform(0, HEALTH_PROBE_INTERVAL_SECONDS * HEALTH_PROBE_JITTER))
+    async with semaphore:
+        url = agent_info.health_url or agent_info.how_to_call
+        start = time.perf_counter()
+        try:
+            resp = await open_agent_http_client().get(url, timeout=HEALTH_PROBE_TIMEOUT_SECONDS)
+            ok = resp.status_code < 500
+            error = None if ok else f"HTTP {resp.status_code}"
+        except Exception as e:
+            ok, error = False, f"{type(e).__name__}: {e}"
+    if AGENT_REGISTRY.get(agent_info.agent_name) is not agent_info:
+        return  # deregistered or replaced while probing
+    breaker = agent_breaker(agent_info.agent_name)
+    breaker.last_probe_at = time.time()
+    record_agent_outcome(agent_info.agent_name, ok, time.perf_counter() - start, error)
+
+
+async def probe_agents_once():
+    semaphore = asyncio.Semaphore(HEALTH_PROBE_CONCURRENCY)
+    due = [
+        info for info in list(AGENT_REGISTRY.values())
+        if is_http_agent(info) and agent_breaker(info.agent_name).due_for_probe()
+    ]
+    # half-open transitions made by due_for_probe show up as "recovering" right away
+    for info in due:
+        sync_agent_health(info.agent_name)
+    await asyncio.gather(*(probe_agent(info, semaphore) for info in due))
+
+
+async def health_probe_loop():
+    while True:
+        try:
+            await probe_agents_once()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("[health] probe cycle failed")
+        jitter = random.uniform(-HEALTH_PROBE_JITTER, HEALTH_PROBE_JITTER)
+        await asyncio.sleep(HEALTH_PROBE_INTERVAL_SECONDS * (1 + jitter))
+
+
+def start_health_prober():
+    global health_probe_task
+    if HEALTH_PROBE_ENABLED and health_probe_task is None:
+        health_probe_task = asyncio.create_task(health_probe_loop())
+
+
+async def stop_health_prober():
+    global health_probe_task
+    if health_probe_task is not None:
+        health_probe_task.cancel()
+        try:
+            await health_probe_task
+        except asyncio.CancelledError:
+            pass
+        health_probe_task = None
+
+
+# ============================================================
+# ROUTER PROMPT (Precompiled agent blocks + BM25 shortlist)
+# ============================================================
+#
+# Each agent's description block is rendered once at registration. When more
+# than ROUTER_SHORTLIST_TOP_K agents are eligible, only the top-K by BM25 over
+# name/tags/examples/description are shown to the router LLM, and blocks are
+# added until ROUTER_PROMPT_MAX_CHARS is reached, so the prompt (and prefill
+# time) stays flat as the registry grows.
+
+ROUTER_SHORTLIST_TOP_K = int(os.getenv("ROUTER_SHORTLIST_TOP_K", "8"))
+ROUTER_PROMPT_MAX_CHARS = int(os.getenv("ROUTER_PROMPT_MAX_CHARS", "6000"))
+ROUTER_BM25_K1 = 1.2
+ROUTER_BM25_B = 0.75
+
+# agent_name -> rendered "Agent Name: ..." block
+AGENT_PROMPT_BLOCKS: Dict[str, str] = {}
+
+# BM25 index over agent routing fields: term -> {agent_name: tf}, plus doc lengths
+ROUTER_BM25_POSTINGS: Dict[str, Dict[str, int]] = {}
+ROUTER_BM25_LENGTHS: Dict[str, int] = {}
+
+ROUTER_PROMPT_STATS: Dict[str, int] = {
+    "prompts": 0,
+    "shortlisted": 0,
+    "agents_considered": 0,
+    "agents_in_prompt": 0,
+    "prompt_chars": 0,
+}
+
+
+def render_agent_block(a: AgentInfo) -> str:
+    return (
+        f"Agent Name: {a.agent_name}\n"
+        f"Description: {a.description}\n"
+        f"Tags: {', '.join(a.capability_tags)}\n"
+        f"When to use: {a.curated_routing_prompts}\n"
+        f"Example queries: {a.example_queries[:3]}\n\n"
+    )
+
+
+def lexical_terms(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def compile_agent_prompt(agent: AgentInfo):
+    """
+    Precompute the agent's router block and (re)index its routing fields for
+    BM25. Tags are counted twice: they are the most deliberate signal.
+    """
+    name = agent.agent_name
+    drop_agent_prompt(name)
+    AGENT_PROMPT_BLOCKS[name] = render_agent_block(agent)
+
+    terms = lexical_terms(" ".join([
+        re.sub(r"(?<=[a-z])(?=[A-Z])", " ", name),  # WeatherAgent → weather agent
+        agent.description,
+        " ".join(agent.capability_tags * 2),
+        " ".join(agent.example_queries),
+        agent.curated_routing_prompts,
+    ]))
+    counts: Dict[str, int] = {}
+    for term in terms:
+        counts[term] = counts.get(term, 0) + 1
+    for term, tf in counts.items():
+        ROUTER_BM25_POSTINGS.setdefault(term, {})[name] = tf
+    ROUTER_BM25_LENGTHS[name] = len(terms)
+
+
+def drop_agent_prompt(agent_name: str):
+    AGENT_PROMPT_BLOCKS.pop(agent_name, None)
+    if ROUTER_BM25_LENGTHS.pop(agent_name, None) is None:
+        return
+    for term in [t for t, postings in ROUTER_BM25_POSTINGS.items() if agent_name in postings]:
+        del ROUTER_BM25_POSTINGS[term][agent_name]
+        if not ROUTER_BM25_POSTINGS[term]:
+            del ROUTER_BM25_POSTINGS[term]
+
+
+def score_agents_bm25(user_query: str) -> Dict[str, float]:
+    n_docs = len(ROUTER_BM25_LENGTHS)
+    if not n_docs:
+        return {}
+    avg_len = (sum(ROUTER_BM25_LENGTHS.values()) / n_docs) or 1.0
+    scores: Dict[str, float] = {}
+    for term in set(lexical_terms(user_query)):
+        postings = ROUTER_BM25_POSTINGS.get(term)
+        if not postings:
+            continue
+        idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+        for name, tf in postings.items():
+            norm = 1 - ROUTER_BM25_B + ROUTER_BM25_B * ROUTER_BM25_LENGTHS[name] / avg_len
+            scores[name] = scores.get(name, 0.0) + idf * tf * (ROUTER_BM25_K1 + 1) / (tf + ROUTER_BM25_K1 * norm)
+    return scores
+
+
+def build_router_prompt(user_query: str, agents: List[AgentInfo]) -> Tuple[List[AgentInfo], str]:
+    """
+    (agents shown to the router LLM, their joined description blocks).
+    Shortlists by BM25 when there are more than ROUTER_SHORTLIST_TOP_K agents
+    (ties keep registry order) and stops adding blocks at the char budget.
+    """
+    candidates = agents
+    if len(agents) > ROUTER_SHORTLIST_TOP_K:
+        scores = score_agents_bm25(user_query)
+        order = {a.agent_name: i for i, a in enumerate(agents)}
+        candidates = sorted(agents, key=lambda a: (-scores.get(a.agent_name, 0.0), order[a.agent_name]))
+        candidates = candidates[:ROUTER_SHORTLIST_TOP_K]
+        ROUTER_PROMPT_STATS["shortlisted"] += 1
+
+    shown: List[AgentInfo] = []
+    blocks: List[str] = []
+    used = 0
+    for a in candidates:
+        block = AGENT_PROMPT_BLOCKS.get(a.agent_name) or render_agent_block(a)
+        if shown and used + len(block) > ROUTER_PROMPT_MAX_CHARS:
+            break
+        shown.append(a)
+        blocks.append(block)
+        used += len(block)
+
+    ROUTER_PROMPT_STATS["prompts"] += 1
+    ROUTER_PROMPT_STATS["agents_considered"] += len(agents)
+    ROUTER_PROMPT_STATS["agents_in_prompt"] += len(shown)
+    ROUTER_PROMPT_STATS["prompt_chars"] += used
+    return shown, "".join(blocks)
+
+
 # ============================================================
 # ROUTER LLM - Select Agent
 # ============================================================
 
-def select_agent_with_llm(user_query: str, agents: List[AgentInfo]) -> Optional[str]:
+async def select_agent_with_llm(user_query: str, agents: List[AgentInfo]) -> Optional[str]:
     if not agents:
         logger.warning("[router] No agents registered (or none eligible).")
         return None
 
-    # Build agents description block
-    agents_text = ""
-    for a in agents:
-        agents_text += (
-            f"Agent Name: {a.agent_name}\n"
-            f"Description: {a.description}\n"
-            f"Tags: {', '.join(a.capability_tags)}\n"
-            f"When to use: {a.curated_routing_prompts}\n"
-            f"Example queries: {a.example_queries[:3]}\n\n"
-        )
+    if ROUTING_CACHE_ENABLED:
+        found, cached = ROUTING_CACHE.get(user_query)
+        if found and (cached is None or any(a.agent_name == cached for a in agents)):
+            logger.info("[router] Cache hit → %s", cached or "none")
+            return cached
+
+    agents, agents_text = build_router_prompt(user_query, agents)
 
     system_message = (
         "You are an agent router. Pick ONE agent.\n"
@@ -196,22 +2102,20 @@ def select_agent_with_llm(user_query: str, agents: List[AgentInfo]) -> Optional[
     }
 
     try:
-        with httpx.Client(timeout=15) as client:
-            resp = client.post(
-                f"{LITELLM_BASE_URL}/v1/chat/completions",
-                json=payload,
-                headers={"Authorization": f"Bearer {LITELLM_API_KEY}"},
-            )
-        resp.raise_for_status()
-        out = resp.json()["choices"][0]["message"]["content"].strip()
+        with stage_timer("router_llm", model=ROUTER_MODEL_NAME):
+            out = (await post_chat_completion(payload, timeout=15)).strip()
 
         if out.lower() == "none":
             logger.info("[router] LLM selected none.")
+            if ROUTING_CACHE_ENABLED:
+                ROUTING_CACHE.put(user_query, None)
             return None
 
         for a in agents:
             if a.agent_name.lower() in out.lower():
                 logger.info("[router] LLM selected agent: %s", a.agent_name)
+                if ROUTING_CACHE_ENABLED:
+                    ROUTING_CACHE.put(user_query, a.agent_name)
                 return a.agent_name
 
         logger.warning("[router] No valid match for LLM output: %r", out)
@@ -222,91 +2126,657 @@ def select_agent_with_llm(user_query: str, agents: List[AgentInfo]) -> Optional[
         return None
 
 
+async def select_agents_ranked(
+    user_query: str,
+    agents: List[AgentInfo],
+    max_agents: int,
+) -> List[str]:
+    """
+    Multi-agent routing: up to max_agents agent names, most relevant first.
+    Agents clearing SEMANTIC_ROUTER_MIN_SCORE are taken from the local index
+    without an LLM call; otherwise the router LLM is asked for a ranked list.
+    """
+    if not agents:
+        logger.warning("[router] No agents registered (or none eligible).")
+        return []
+
+    if SEMANTIC_ROUTER_ENABLED:
+        confident = [
+            name for score, name in await score_agents_semantic(user_query, agents)
+            if score >= SEMANTIC_ROUTER_MIN_SCORE
+        ][:max_agents]
+        if confident:
+            SEMANTIC_ROUTER_STATS["fast_path"] += 1
+            logger.info("[semantic] Fast path selected agents: %s", confident)
+            return confident
+        SEMANTIC_ROUTER_STATS["llm_fallback"] += 1
+
+    agents, agents_text = build_router_prompt(user_query, agents)
+
+    system_message = (
+        f"You are an agent router. Pick up to {max_agents} agents that are needed "
+        "to answer the query, most relevant first.\n"
+        "Reply ONLY with a comma-separated list of agent names or 'none'."
+    )
+
+    user_message = (
+        f"User query:\n{user_query}\n\n"
+        f"Available agents:\n{agents_text}"
+    )
+
+    payload = {
+        "model": ROUTER_MODEL_NAME,
+        "messages": [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": user_message}
+        ],
+        "max_tokens": 64,
+    }
+
+    try:
+        with stage_timer("router_llm", model=ROUTER_MODEL_NAME):
+            out = (await post_chat_completion(payload, timeout=15)).strip().lower()
+    except Exception as e:
+        logger.error("[router] Error calling router LLM: %s", e)
+        return []
+
+    # rank by first mention in the LLM output
+    mentioned = sorted(
+        (out.find(a.agent_name.lower()), a.agent_name)
+        for a in agents if a.agent_name.lower() in out
+    )
+    selected = [name for _, name in mentioned][:max_agents]
+    logger.info("[router] LLM selected agents: %s (raw=%r)", selected, out)
+    return selected
+
+
 # ============================================================
 # FALLBACK CHAT (When no agent can be used)
 # ============================================================
 
-def fallback_chat_llm(user_query: str) -> str:
+FALLBACK_CHAT_ERROR_REPLY = "AgentHost is not capable of handling this request right now."
+
+
+def build_fallback_payload(user_query: str) -> Dict[str, Any]:
     system_message = "You are a helpful assistant. Answer the user's question directly."
 
-    payload = {
+    return {
         "model": COMPOSER_MODEL_NAME,
-        "messages": [
+        "messages": with_session_history([
             {"role": "system", "content": system_message},
             {"role": "user", "content": user_query}
-        ],
+        ]),
         "max_tokens": 256
     }
 
+
+async def fallback_chat_llm(user_query: str) -> str:
+    payload = build_fallback_payload(user_query)
+
     try:
-        with httpx.Client(timeout=20) as client:
-            resp = client.post(
-                f"{LITELLM_BASE_URL}/v1/chat/completions",
-                json=payload,
-                headers={"Authorization": f"Bearer {LITELLM_API_KEY}"},
-            )
-        resp.raise_for_status()
-        result = resp.json()["choices"][0]["message"]["content"]
+        with stage_timer("fallback", model=COMPOSER_MODEL_NAME):
+            result = await cached_chat_completion(payload, timeout=20)
         return result.strip()
 
     except Exception as e:
         logger.error("[fallback_chat] Error calling chat fallback: %s", e)
-        return "AgentHost is not capable of handling this request right now."
+        return FALLBACK_CHAT_ERROR_REPLY
+
+
+async def stream_llm_reply(
+    payload: Dict[str, Any],
+    error_reply: str,
+    stage: str,
+    agent: str = "",
+) -> AsyncIterator[str]:
+    """
+    Stream a completion with leading whitespace trimmed. If LiteLLM fails
+    before the first token, yield error_reply instead; after that, just stop.
+    """
+    sent = False
+
+    try:
+        with stage_timer(stage, agent=agent, model=payload["model"]):
+            async for delta in cached_stream_chat_completion(payload, timeout=20):
+                if not sent:
+                    delta = delta.lstrip()
+                    if not delta:
+                        continue
+                sent = True
+                yield delta
+
+    except Exception as e:
+        logger.error("[%s] LLM stream failed: %s", stage, e)
+        if not sent:
+            yield error_reply
 
 
-# ============================================================
-# COMPOSER LLM (Final Answer Formatting)
-# ============================================================
+async def fallback_chat_llm_stream(user_query: str) -> AsyncIterator[str]:
+    payload = build_fallback_payload(user_query)
+    async for delta in stream_llm_reply(payload, FALLBACK_CHAT_ERROR_REPLY, "fallback"):
+        yield delta
+
+
+# ============================================================
+# SPECULATIVE FALLBACK (Start fallback chat while the router decides)
+# ============================================================
+#
+# off      → never speculate
+# always   → speculate whenever the router LLM has to be asked
+# adaptive → speculate only while the router's recent "none" rate is at least
+#            SPECULATIVE_FALLBACK_MIN_NONE_RATE (EWMA over router decisions)
+
+SPECULATIVE_FALLBACK_MODE = os.getenv("SPECULATIVE_FALLBACK_MODE", "off")
+SPECULATIVE_FALLBACK_MIN_NONE_RATE = float(os.getenv("SPECULATIVE_FALLBACK_MIN_NONE_RATE", "0.3"))
+ROUTER_NONE_RATE_ALPHA = 0.1
+
+# Token counts are streamed chunks, which LiteLLM emits roughly one per token.
+SPECULATION_STATS: Dict[str, float] = {
+    "started": 0,
+    "used": 0,
+    "cancelled": 0,
+    "saved_tokens": 0,
+    "wasted_tokens": 0,
+    "saved_ms": 0.0,
+    "wasted_ms": 0.0,
+    "router_none_rate": 0.0,
+}
+
+
+class SpeculativeFallback:
+    def __init__(self, user_query: str):
+        self.started_at = time.perf_counter()
+        self.stream = BufferedStream(fallback_chat_llm_stream(user_query))
+        SPECULATION_STATS["started"] += 1
+
+    def claim(self) -> "SpeculativeFallback":
+        """
+        Router said none: the speculative answer becomes the reply.
+        """
+        SPECULATION_STATS["used"] += 1
+        SPECULATION_STATS["saved_tokens"] += len(self.stream.chunks)
+        SPECULATION_STATS["saved_ms"] += (time.perf_counter() - self.started_at) * 1000
+        return self
+
+    def cancel(self):
+        """
+        Router picked an agent: drop the in-flight fallback chat.
+        """
+        if self.stream.task.done() and self.stream.task.cancelled():
+            return
+        self.stream.cancel()
+        SPECULATION_STATS["cancelled"] += 1
+        SPECULATION_STATS["wasted_tokens"] += len(self.stream.chunks)
+        SPECULATION_STATS["wasted_ms"] += (time.perf_counter() - self.started_at) * 1000
+
+
+def should_speculate(user_query: str) -> bool:
+    if SPECULATIVE_FALLBACK_MODE == "always":
+        pass
+    elif SPECULATIVE_FALLBACK_MODE == "adaptive":
+        if SPECULATION_STATS["router_none_rate"] < SPECULATIVE_FALLBACK_MIN_NONE_RATE:
+            return False
+    else:
+        return False
+    # a cached router decision is instant, nothing to overlap
+    return not (ROUTING_CACHE_ENABLED and ROUTING_CACHE.contains(user_query))
+
+
+def record_router_decision(agent_name: Optional[str]):
+    rate = SPECULATION_STATS["router_none_rate"]
+    SPECULATION_STATS["router_none_rate"] = (
+        (1 - ROUTER_NONE_RATE_ALPHA) * rate + ROUTER_NONE_RATE_ALPHA * (0.0 if agent_name else 1.0)
+    )
+
+
+# ============================================================
+# COMPOSER LLM (Final Answer Formatting)
+# ============================================================
+
+def compose_fallback_text(agent_name: str, exec_res: ExecutionResponse) -> str:
+    if exec_res.status != "success":
+        return f"Agent '{agent_name}' failed: {exec_res.error}"
+    return str(exec_res.result)
+
+
+def build_composer_payload(
+    user_query: str,
+    agent_name: str,
+    agent_info: AgentInfo,
+    exec_res: ExecutionResponse,
+) -> Dict[str, Any]:
+    system_msg = (
+        "You are a response formatter. Use the agent result to answer the user clearly.\n"
+        "If error: explain politely. Do not invent extra details."
+    )
+
+    user_msg = (
+        f"User query: {user_query}\n"
+        f"Agent used: {agent_name}\n"
+        f"Agent description: {agent_info.description}\n"
+        f"Execution status: {exec_res.status}\n"
+        f"Raw result: {exec_res.result}\n"
+        f"Error: {exec_res.error}\n"
+    )
+
+    return {
+        "model": COMPOSER_MODEL_NAME,
+        "messages": with_session_history([
+            {"role": "system", "content": system_msg},
+            {"role": "user", "content": user_msg}
+        ]),
+        "max_tokens": 200
+    }
+
+
+async def compose_final_answer_with_llm(
+    user_query: str,
+    agent_name: str,
+    agent_info: AgentInfo,
+    exec_res: ExecutionResponse,
+) -> str:
+
+    try:
+        payload = build_composer_payload(user_query, agent_name, agent_info, exec_res)
+        with stage_timer("composer", agent=agent_name, model=COMPOSER_MODEL_NAME):
+            content = await cached_chat_completion(payload, timeout=20)
+        return content.strip()
+
+    except Exception as e:
+        logger.error("[composer] LLM composer failed: %s", e)
+        return compose_fallback_text(agent_name, exec_res)
+
+
+async def compose_final_answer_stream(
+    user_query: str,
+    agent_name: str,
+    agent_info: AgentInfo,
+    exec_res: ExecutionResponse,
+) -> AsyncIterator[str]:
+    payload = build_composer_payload(user_query, agent_name, agent_info, exec_res)
+    error_reply = compose_fallback_text(agent_name, exec_res)
+    async for delta in stream_llm_reply(payload, error_reply, "composer", agent=agent_name):
+        yield delta
+
+
+# ============================================================
+# COMPOSITION MODES (Skip the composer LLM when possible)
+# ============================================================
+#
+# An agent declares how its result becomes the final reply, either once via
+# AgentInfo.composition_mode or per response via ExecutionResponse.metadata:
+#   {"composition": "passthrough" | "template" | "llm"}
+#   {"final": true}                  → same as passthrough
+#   {"template": "..."}              → overrides AgentInfo.composition_template
+# Templates are str.format strings over: user_query, agent, status, result, error.
+
+COMPOSITION_MODES = ("passthrough", "template", "llm")
+DEFAULT_COMPOSITION_TEMPLATE = "{result}"
+
+COMPOSITION_STATS: Dict[str, float] = {
+    "passthrough": 0,
+    "template": 0,
+    "llm": 0,
+    "llm_ms_total": 0.0,
+    "estimated_ms_saved": 0.0,
+}
+
+
+class TemplateFields(dict):
+    def __missing__(self, key: str) -> str:
+        return ""
+
+
+def resolve_composition_mode(agent_info: AgentInfo, exec_res: ExecutionResponse) -> str:
+    meta = exec_res.metadata or {}
+    mode = meta.get("composition") or ("passthrough" if meta.get("final") else agent_info.composition_mode)
+    if mode not in COMPOSITION_MODES:
+        logger.warning("[composer] Unknown composition mode %r from %s → llm", mode, agent_info.agent_name)
+        return "llm"
+    return mode
+
+
+def compose_locally(
+    mode: str,
+    user_query: str,
+    agent_name: str,
+    agent_info: AgentInfo,
+    exec_res: ExecutionResponse,
+) -> str:
+    if exec_res.status != "success" or mode == "passthrough":
+        return compose_fallback_text(agent_name, exec_res)
+
+    template = (exec_res.metadata or {}).get("template") or agent_info.composition_template
+    fields = TemplateFields(
+        user_query=user_query,
+        agent=agent_name,
+        status=exec_res.status,
+        result="" if exec_res.result is None else exec_res.result,
+        error=exec_res.error or "",
+    )
+    try:
+        return (template or DEFAULT_COMPOSITION_TEMPLATE).format_map(fields)
+    except Exception as e:  # templates come from agents: any lookup or format error is theirs
+        logger.warning("[composer] Bad template for %s (%s) → passthrough", agent_name, e)
+        return compose_fallback_text(agent_name, exec_res)
+
+
+def record_composition(mode: str, request_id: str, elapsed_ms: float):
+    COMPOSITION_STATS[mode] += 1
+    if mode == "llm":
+        COMPOSITION_STATS["llm_ms_total"] += elapsed_ms
+        logger.info("[composer] mode=llm | request_id=%s | %.1f ms", request_id, elapsed_ms)
+        return
+
+    llm_calls = COMPOSITION_STATS["llm"]
+    avg_llm_ms = COMPOSITION_STATS["llm_ms_total"] / llm_calls if llm_calls else 0.0
+    saved_ms = max(avg_llm_ms - elapsed_ms, 0.0)
+    COMPOSITION_STATS["estimated_ms_saved"] += saved_ms
+    logger.info(
+        "[composer] mode=%s | request_id=%s | %.2f ms | LLM hop skipped (~%.0f ms saved, %.0f ms total)",
+        mode, request_id, elapsed_ms, saved_ms, COMPOSITION_STATS["estimated_ms_saved"],
+    )
+
+
+async def compose_reply(
+    user_query: str,
+    agent_name: str,
+    agent_info: AgentInfo,
+    exec_res: ExecutionResponse,
+) -> str:
+    mode = resolve_composition_mode(agent_info, exec_res)
+    started = time.perf_counter()
+    if mode == "llm":
+        final = await compose_final_answer_with_llm(user_query, agent_name, agent_info, exec_res)
+    else:
+        final = compose_locally(mode, user_query, agent_name, agent_info, exec_res)
+    record_composition(mode, exec_res.request_id, (time.perf_counter() - started) * 1000)
+    return final
+
 
-def compose_final_answer_with_llm(
+async def compose_reply_stream(
     user_query: str,
     agent_name: str,
     agent_info: AgentInfo,
     exec_res: ExecutionResponse,
-) -> str:
+) -> AsyncIterator[str]:
+    mode = resolve_composition_mode(agent_info, exec_res)
+    started = time.perf_counter()
+    if mode == "llm":
+        async for delta in compose_final_answer_stream(user_query, agent_name, agent_info, exec_res):
+            yield delta
+    else:
+        yield compose_locally(mode, user_query, agent_name, agent_info, exec_res)
+    record_composition(mode, exec_res.request_id, (time.perf_counter() - started) * 1000)
 
-    def fallback() -> str:
-        if exec_res.status != "success":
-            return f"Agent '{agent_name}' failed: {exec_res.error}"
-        return str(exec_res.result)
 
-    try:
-        system_msg = (
-            "You are a response formatter. Use the agent result to answer the user clearly.\n"
-            "If error: explain politely. Do not invent extra details."
-        )
+# ============================================================
+# SESSIONS (Server-side conversation history, token-budgeted)
+# ============================================================
+#
+# Clients send a session_id and only the new message. Turns are kept in an
+# LRU of Session objects backed by one JSONL log per session in SESSION_DIR.
+# The composer / fallback / chat payloads of a session request get at most
+# SESSION_CONTEXT_TOKENS of history: the running summary of older turns plus
+# the newest turns verbatim. Turns that no longer fit are folded into the
+# summary by a background LLM call (or just dropped with SESSION_SUMMARIZE
+# off), so prefill per turn stays flat however long the chat gets.
+# Routing only ever sees the new message.
+
+SESSION_DIR = os.getenv("SESSION_DIR", "sessions")  # empty = memory only
+SESSION_CACHE_MAX = int(os.getenv("SESSION_CACHE_MAX", "1000"))
+SESSION_CONTEXT_TOKENS = int(os.getenv("SESSION_CONTEXT_TOKENS", "1024"))
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "200"))  # unsummarized turns kept per session
+SESSION_SUMMARIZE = os.getenv("SESSION_SUMMARIZE", "true").lower() in ("1", "true", "yes")
+SESSION_SUMMARY_MODEL = os.getenv("SESSION_SUMMARY_MODEL", COMPOSER_MODEL_NAME)
+SESSION_SUMMARY_TOKENS = int(os.getenv("SESSION_SUMMARY_TOKENS", "200"))
+SESSION_SUMMARY_MIN_TURNS = int(os.getenv("SESSION_SUMMARY_MIN_TURNS", "4"))  # overflow before summarizing
+
+SESSION_ID_RE = re.compile(SESSION_ID_PATTERN)
+
+# History messages for the current request's LLM payloads
+session_history: ContextVar[Tuple[Dict[str, str], ...]] = ContextVar("session_history", default=())
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token plus per-message overhead; no tokenizer here
+    return len(text) // 4 + 4
 
-        user_msg = (
-            f"User query: {user_query}\n"
-            f"Agent used: {agent_name}\n"
-            f"Agent description: {agent_info.description}\n"
-            f"Execution status: {exec_res.status}\n"
-            f"Raw result: {exec_res.result}\n"
-            f"Error: {exec_res.error}\n"
+
+def with_session_history(messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """
+    Insert the session history between the system prompt and the new message.
+    """
+    history = session_history.get()
+    if not history:
+        return messages
+    return [messages[0], *history, *messages[1:]]
+
+
+class Session:
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.summary = ""
+        self.turns: List[Tuple[str, str, int]] = []  # (role, content, tokens) not yet in the summary
+        self.first_turn = 0  # absolute index of turns[0]
+        self.summarizing = False
+        self.lock: Optional[asyncio.Lock] = None  # shared by every instance of this id, see SessionStore.get
+
+    def apply(self, record: Dict[str, Any]):
+        if "summary" in record:
+            # the summary covers every turn before absolute index "upto"
+            del self.turns[:max(0, record["upto"] - self.first_turn)]
+            self.first_turn = max(self.first_turn, record["upto"])
+            self.summary = record["summary"]
+            return
+        self.turns.append((record["role"], record["content"], estimate_tokens(record["content"])))
+        if len(self.turns) > SESSION_MAX_TURNS:
+            del self.turns[0]
+            self.first_turn += 1
+
+    def records(self) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = [{"summary": self.summary, "upto": self.first_turn}] if self.first_turn else []
+        out.extend({"role": role, "content": content} for role, content, _ in self.turns)
+        return out
+
+    def summary_message(self) -> Optional[Dict[str, str]]:
+        if not self.summary:
+            return None
+        return {"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"}
+
+    def fitting_turns(self, budget: int) -> int:
+        summary = self.summary_message()
+        used = estimate_tokens(summary["content"]) if summary else 0
+        kept = 0
+        for _, _, tokens in reversed(self.turns):
+            if used + tokens > budget:
+                break
+            used += tokens
+            kept += 1
+        return kept
+
+    def context(self, budget: int) -> Tuple[Dict[str, str], ...]:
+        kept = self.fitting_turns(budget)
+        summary = self.summary_message()
+        messages = [summary] if summary else []
+        messages.extend(
+            {"role": role, "content": content}
+            for role, content, _ in self.turns[len(self.turns) - kept:]
         )
+        return tuple(messages)
+
+
+class SessionStore:
+    def __init__(self, directory: str, max_cached: int):
+        self.directory = directory
+        self.max_cached = max_cached
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+        # session_id → lock held across an in-memory change and its log write;
+        # weak so it lives as long as some Session instance of that id does
+        self.locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self.stats = {"loaded": 0, "created": 0, "evicted": 0, "turns": 0,
+                      "summaries": 0, "summary_errors": 0, "dropped_turns": 0}
+
+    def path(self, session_id: str) -> Optional[str]:
+        return os.path.join(self.directory, f"{session_id}.jsonl") if self.directory else None
+
+    def load(self, session_id: str) -> Session:
+        session = Session(session_id)
+        path = self.path(session_id)
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        session.apply(json.loads(line))
+                    except (ValueError, KeyError):
+                        continue  # torn last line
+            self.stats["loaded"] += 1
+        else:
+            self.stats["created"] += 1
+        return session
+
+    async def get(self, session_id: str) -> Session:
+        session = self.sessions.get(session_id)
+        if session is None:
+            loaded = await asyncio.to_thread(self.load, session_id)
+            session = self.sessions.setdefault(session_id, loaded)  # a concurrent load may have won
+            if session.lock is None:
+                session.lock = self.lock_for(session_id)
+            while len(self.sessions) > self.max_cached:
+                self.sessions.popitem(last=False)
+                self.stats["evicted"] += 1
+        self.sessions.move_to_end(session_id)
+        return session
+
+    def lock_for(self, session_id: str) -> asyncio.Lock:
+        lock = self.locks.get(session_id)
+        if lock is None:
+            lock = self.locks[session_id] = asyncio.Lock()
+        return lock
+
+    def write(self, session_id: str, records: List[Dict[str, Any]], rewrite: bool = False):
+        # blocking; callers hold the session's lock
+        path = self.path(session_id)
+        if not path:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        target = f"{path}.tmp" if rewrite else path
+        with open(target, "w" if rewrite else "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+        if rewrite:
+            os.replace(target, path)
+
+    async def append(self, session: Session, records: List[Dict[str, Any]]):
+        async with session.lock:
+            for record in records:
+                session.apply(record)
+            self.stats["turns"] += len(records)
+            await asyncio.to_thread(self.write, session.session_id, records)
+
+    async def compact(self, session: Session, summary: str, upto: int) -> bool:
+        """
+        Fold turns before `upto` into the summary and rewrite the log. Skipped
+        (False) when the session was evicted from the cache meanwhile: its log
+        may already hold turns this instance never saw.
+        """
+        async with session.lock:
+            if self.sessions.get(session.session_id) is not session:
+                return False
+            session.apply({"summary": summary, "upto": upto})
+            await asyncio.to_thread(self.write, session.session_id, session.records(), True)
+            return True
+
+    async def delete(self, session_id: str) -> bool:
+        async with self.lock_for(session_id):
+            found = self.sessions.pop(session_id, None) is not None
+            path = self.path(session_id)
+            if path and os.path.exists(path):
+                await asyncio.to_thread(os.remove, path)
+                found = True
+        return found
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"cached": len(self.sessions), **self.stats}
+
+
+SESSIONS = SessionStore(SESSION_DIR, SESSION_CACHE_MAX)
+SESSION_TASKS: set = set()
+
+
+def build_summary_payload(summary: str, turns: List[Tuple[str, str, int]]) -> Dict[str, Any]:
+    system_msg = (
+        "Summarize the conversation so far in a few sentences. Keep names, facts, "
+        "decisions and open questions; drop small talk."
+    )
+    lines = [f"{role}: {content}" for role, content, _ in turns]
+    user_msg = f"Previous summary: {summary or '(none)'}\n\nNew turns:\n" + "\n".join(lines)
+    return {
+        "model": SESSION_SUMMARY_MODEL,
+        "messages": [
+            {"role": "system", "content": system_msg},
+            {"role": "user", "content": user_msg}
+        ],
+        "max_tokens": SESSION_SUMMARY_TOKENS
+    }
 
-        payload = {
-            "model": COMPOSER_MODEL_NAME,
-            "messages": [
-                {"role": "system", "content": system_msg},
-                {"role": "user", "content": user_msg}
-            ],
-            "max_tokens": 200
-        }
 
-        with httpx.Client(timeout=20) as client:
-            resp = client.post(
-                f"{LITELLM_BASE_URL}/v1/chat/completions",
-                json=payload,
-                headers={"Authorization": f"Bearer {LITELLM_API_KEY}"},
-            )
-        resp.raise_for_status()
-        content = resp.json()["choices"][0]["message"]["content"]
-        return content.strip()
+async def summarize_session(session: Session, count: int):
+    """
+    Fold the oldest `count` turns into the summary; if the LLM fails they are
+    dropped instead (the old summary stays).
+    """
+    request_priority.set("batch")  # background work yields to interactive requests
+    upto = session.first_turn + count
+    summary = session.summary
+    try:
+        if SESSION_SUMMARIZE:
+            try:
+                payload = build_summary_payload(summary, session.turns[:count])
+                with stage_timer("session_summary", model=SESSION_SUMMARY_MODEL):
+                    summary = (await post_chat_completion(payload, timeout=30)).strip()
+                SESSIONS.stats["summaries"] += 1
+            except Exception as e:
+                logger.warning("[session] %s: summary failed (%s) → dropping %d turns", session.session_id, e, count)
+                SESSIONS.stats["summary_errors"] += 1
+                SESSIONS.stats["dropped_turns"] += count
+        else:
+            SESSIONS.stats["dropped_turns"] += count
+        if not await SESSIONS.compact(session, summary, upto):
+            logger.info("[session] %s: evicted while summarizing → summary discarded", session.session_id)
+    finally:
+        session.summarizing = False
+
+
+def maybe_summarize_session(session: Session):
+    overflow = len(session.turns) - session.fitting_turns(SESSION_CONTEXT_TOKENS)
+    overflow -= overflow % 2  # whole user/assistant exchanges
+    if session.summarizing or overflow < SESSION_SUMMARY_MIN_TURNS:
+        return
+    session.summarizing = True
+    task = asyncio.create_task(summarize_session(session, overflow))
+    SESSION_TASKS.add(task)
+    task.add_done_callback(SESSION_TASKS.discard)
+
+
+async def open_session(session_id: Optional[str]) -> Optional[Session]:
+    if not session_id:
+        return None
+    return await SESSIONS.get(session_id)
+
+
+def use_session_history(session: Optional[Session]):
+    session_history.set(session.context(SESSION_CONTEXT_TOKENS) if session is not None else ())
 
-    except Exception as e:
-        logger.error("[composer] LLM composer failed: %s", e)
-        return fallback()
+
+async def record_session_turn(session: Optional[Session], user_message: str, reply: str):
+    if session is None:
+        return
+    await SESSIONS.append(session, [
+        {"role": "user", "content": user_message},
+        {"role": "assistant", "content": reply},
+    ])
+    maybe_summarize_session(session)
 
 
 # ============================================================
@@ -318,31 +2788,65 @@ app = FastAPI(title="AgentHost MVP", version="1.2")
 
 @app.on_event("startup")
 async def startup():
+    open_litellm_client()
+    open_agent_http_client()
+    open_completion_cache_disk()
     register_builtin_dummy_agent()
+    restore_registry()
+    start_health_prober()
     logger.info("AgentHost started with agents: %s", list(AGENT_REGISTRY.keys()))
 
 
+@app.on_event("shutdown")
+async def shutdown():
+    await stop_health_prober()
+    await close_litellm_client()
+    await close_agent_http_client()
+    agent_executor.shutdown(wait=False, cancel_futures=True)
+    close_completion_cache_disk()
+    if REGISTRY_STORE is not None:
+        REGISTRY_STORE.close()
+    logger.info("AgentHost stopped, LiteLLM client closed.")
+
+
 # ============================================================
 # CORE QUERY ENDPOINT
 # ============================================================
 
-@app.post("/agenthost/query", response_model=QueryResponse)
-async def handle_query(payload: QueryRequest):
+ExecutedQuery = Tuple[str, AgentInfo, ExecutionResponse]
 
-    logger.info(
-        "Incoming query | routing_mode=%s | selected_agent=%s | query=%r",
-        payload.routing_mode,
-        payload.selected_agent,
-        payload.user_query,
-    )
 
+class QueryContext:
+    """
+    Per-request state shared between routing and the reply stage.
+    """
+
+    __slots__ = ("speculate", "speculative")
+
+    def __init__(self, speculate: bool = True):
+        self.speculate = speculate
+        self.speculative: Optional[SpeculativeFallback] = None
+
+    def cancel_speculation(self):
+        if self.speculative is not None:
+            self.speculative.cancel()
+            self.speculative = None
+
+
+async def route_query(payload: QueryRequest, ctx: QueryContext) -> Optional[AgentInfo]:
+    """
+    Resolve the agent for a query (manual or auto routing).
+
+    Returns None when the query should be answered by fallback chat instead
+    (possibly already running speculatively in ctx.speculative).
+    """
     # ----------------------
     # Routing Mode: MANUAL
     # ----------------------
     if payload.routing_mode == "manual":
         if not payload.selected_agent:
             logger.warning("Manual mode but no selected_agent → fallback chat.")
-            return QueryResponse(reply=fallback_chat_llm(payload.user_query))
+            return None
 
         agent_name = payload.selected_agent
 
@@ -350,43 +2854,56 @@ async def handle_query(payload: QueryRequest):
         # ----------------------
         # Routing Mode: AUTO
         # ----------------------
-        # only consider agents that have handlers AND are healthy
-        all_infos = AGENT_REGISTRY.items()
-        eligible_agents: List[AgentInfo] = [
-            info for name, info in all_infos
-            if name in AGENT_HANDLERS and info.health_status == "healthy"
-        ]
+        # only consider agents that are executable (handler or HTTP) AND healthy
+        with stage_timer("registry_lookup"):
+            agents = eligible_agents()
 
-        if not eligible_agents:
-            logger.warning("No eligible agents (with handlers & healthy) → fallback chat.")
-            return QueryResponse(reply=fallback_chat_llm(payload.user_query))
+        if not agents:
+            logger.warning("No eligible agents (executable & healthy) → fallback chat.")
+            return None
 
-        agent_name = select_agent_with_llm(payload.user_query, eligible_agents)
+        with stage_timer("semantic_router"):
+            agent_name = await select_agent_semantic(payload.user_query, agents)
+        if agent_name:
+            SEMANTIC_ROUTER_STATS["fast_path"] += 1
+        else:
+            SEMANTIC_ROUTER_STATS["llm_fallback"] += 1
+            if ctx.speculate and should_speculate(payload.user_query):
+                ctx.speculative = SpeculativeFallback(payload.user_query)
+            agent_name = await select_agent_with_llm(payload.user_query, agents)
+            record_router_decision(agent_name)
 
         if not agent_name:
             logger.info("Router returned NONE → fallback chat.")
-            return QueryResponse(reply=fallback_chat_llm(payload.user_query))
+            return None
 
     # ----------------------
     # Validate agent
     # ----------------------
     agent_info = AGENT_REGISTRY.get(agent_name)
-    handler = AGENT_HANDLERS.get(agent_name)
 
-    if not agent_info or not handler:
+    if not agent_info or not is_agent_executable(agent_info):
         logger.warning("Invalid or unhandled agent '%s' → fallback chat.", agent_name)
-        return QueryResponse(reply=fallback_chat_llm(payload.user_query))
+        return None
 
-    if agent_info.health_status != "healthy":
+    if OPEN_BREAKER_AGENTS:
+        release_expired_breakers()
+    if agent_name not in ELIGIBLE_AGENT_NAMES:
         logger.warning("Agent unhealthy '%s' → fallback chat.", agent_name)
-        return QueryResponse(reply=fallback_chat_llm(payload.user_query))
+        return None
 
     logger.info("Using agent: %s", agent_name)
+    ctx.cancel_speculation()
+    return agent_info
+
+
+async def execute_routed(payload: QueryRequest, agent_info: AgentInfo) -> ExecutedQuery:
+    agent_name = agent_info.agent_name
 
     # ----------------------
     # Build ExecutionRequest
     # ----------------------
-    request_id = str(uuid.uuid4())
+    request_id = new_request_id()
     exec_req = ExecutionRequest(
         request_id=request_id,
         user_query=payload.user_query,
@@ -397,17 +2914,7 @@ async def handle_query(payload: QueryRequest):
     # ----------------------
     # Execute Agent
     # ----------------------
-    try:
-        exec_res = handler(exec_req)
-    except Exception as e:
-        logger.error("Agent '%s' threw exception: %s", agent_name, e)
-        exec_res = ExecutionResponse(
-            request_id=request_id,
-            status="error",
-            error=str(e),
-            result=None,
-            metadata={"agent": agent_name},
-        )
+    exec_res = await execute_agent(agent_info, exec_req)
 
     logger.info(
         "Agent executed | request_id=%s | agent=%s | status=%s",
@@ -416,10 +2923,259 @@ async def handle_query(payload: QueryRequest):
         exec_res.status,
     )
 
+    return agent_name, agent_info, exec_res
+
+
+async def route_and_execute(payload: QueryRequest, ctx: QueryContext) -> Optional[ExecutedQuery]:
+    """
+    Returns (agent_name, agent_info, exec_res), or None for fallback chat.
+    """
+    agent_info = await route_query(payload, ctx)
+    if agent_info is None:
+        return None
+    return await execute_routed(payload, agent_info)
+
+
+# ============================================================
+# MULTI-AGENT FAN-OUT (routing_mode="multi")
+# ============================================================
+
+MULTI_AGENT_MAX_AGENTS = int(os.getenv("MULTI_AGENT_MAX_AGENTS", "3"))
+MULTI_AGENT_DEADLINE_SECONDS = float(os.getenv("MULTI_AGENT_DEADLINE_SECONDS", "20"))
+# After the first success, stragglers get at most this much longer
+MULTI_AGENT_GRACE_SECONDS = float(os.getenv("MULTI_AGENT_GRACE_SECONDS", "2"))
+# Compose as soon as this many agents succeeded (0 = wait for all / grace)
+MULTI_AGENT_ENOUGH_SUCCESSES = int(os.getenv("MULTI_AGENT_ENOUGH_SUCCESSES", "0"))
+
+
+async def fan_out_agents(
+    payload: QueryRequest,
+    agent_infos: List[AgentInfo],
+    deadline_seconds: float,
+) -> AsyncIterator[Tuple[str, ExecutionResponse]]:
+    """
+    Execute all agents concurrently and yield (agent_name, exec_res) in
+    completion order. Stops waiting at the global deadline, at
+    MULTI_AGENT_GRACE_SECONDS after the first success, or once
+    MULTI_AGENT_ENOUGH_SUCCESSES agents succeeded; agents still running then
+    are cancelled and reported as timed out, so a fast success never waits
+    on a slow agent for the full deadline.
+    """
+    tasks: Dict[asyncio.Task, ExecutionRequest] = {}
+    for info in agent_infos:
+        exec_req = ExecutionRequest(
+            request_id=new_request_id(),
+            user_query=payload.user_query,
+            routing_mode=payload.routing_mode,
+            selected_agent=info.agent_name,
+        )
+        tasks[asyncio.create_task(execute_agent(info, exec_req))] = exec_req
+
+    pending = set(tasks)
+    started = time.monotonic()
+    deadline = started + deadline_seconds
+    successes = 0
+    try:
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(
+                pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                exec_res = task.result()
+                if exec_res.status == "success":
+                    successes += 1
+                    deadline = min(deadline, time.monotonic() + MULTI_AGENT_GRACE_SECONDS)
+                yield tasks[task].selected_agent, exec_res
+            if MULTI_AGENT_ENOUGH_SUCCESSES and successes >= MULTI_AGENT_ENOUGH_SUCCESSES:
+                break
+
+        waited = time.monotonic() - started
+        for task in pending:
+            task.cancel()
+            agent_name = tasks[task].selected_agent
+            logger.warning("[multi] Agent '%s' cancelled after %.1fs (%d agents succeeded).",
+                           agent_name, waited, successes)
+            yield agent_name, ExecutionResponse(
+                request_id=tasks[task].request_id,
+                status="error",
+                error=f"Agent '{agent_name}' did not finish within {waited:.1f}s",
+                metadata={"agent": agent_name, "timeout": True},
+            )
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def aggregate_agent_results(results: Dict[str, ExecutionResponse]) -> ExecutionResponse:
+    succeeded = {name: res for name, res in results.items() if res.status == "success"}
+    failed = {name: res for name, res in results.items() if res.status != "success"}
+
+    if not failed:
+        status = "success"
+    elif succeeded:
+        status = "partial"
+    else:
+        status = "error"
+
+    return ExecutionResponse(
+        request_id=new_request_id(),
+        status=status,
+        result={name: res.result for name, res in succeeded.items()} or None,
+        error="; ".join(f"{name}: {res.error}" for name, res in failed.items()) or None,
+        metadata={
+            "agents": list(results),
+            "statuses": {name: res.status for name, res in results.items()},
+        },
+    )
+
+
+def compose_multi_fallback_text(aggregate: ExecutionResponse) -> str:
+    lines = [f"[{name}] {result}" for name, result in (aggregate.result or {}).items()]
+    if aggregate.error:
+        lines.append(f"Failed: {aggregate.error}")
+    return "\n".join(lines)
+
+
+def build_multi_composer_payload(
+    user_query: str,
+    agent_infos: List[AgentInfo],
+    aggregate: ExecutionResponse,
+) -> Dict[str, Any]:
+    system_msg = (
+        "You are a response formatter. Combine the agent results to answer the user clearly.\n"
+        "If some agents failed: mention it politely. Do not invent extra details."
+    )
+
+    results = aggregate.result or {}
+    statuses = (aggregate.metadata or {}).get("statuses", {})
+    agents_block = ""
+    for info in agent_infos:
+        agents_block += (
+            f"Agent: {info.agent_name} ({info.description})\n"
+            f"Status: {statuses.get(info.agent_name, 'error')}\n"
+            f"Result: {results.get(info.agent_name)}\n\n"
+        )
+
+    user_msg = (
+        f"User query: {user_query}\n"
+        f"Overall status: {aggregate.status}\n"
+        f"Errors: {aggregate.error}\n\n"
+        f"{agents_block}"
+    )
+
+    return {
+        "model": COMPOSER_MODEL_NAME,
+        "messages": with_session_history([
+            {"role": "system", "content": system_msg},
+            {"role": "user", "content": user_msg}
+        ]),
+        "max_tokens": 300
+    }
+
+
+async def route_multi(payload: QueryRequest) -> List[AgentInfo]:
+    with stage_timer("registry_lookup"):
+        agents = eligible_agents()
+    names = await select_agents_ranked(payload.user_query, agents, MULTI_AGENT_MAX_AGENTS)
+    if not names:
+        logger.info("Multi router returned NONE → fallback chat.")
+    return [AGENT_REGISTRY[name] for name in names if name in AGENT_REGISTRY]
+
+
+async def handle_multi_query(payload: QueryRequest, agent_infos: List[AgentInfo]) -> str:
+    results: Dict[str, ExecutionResponse] = {}
+    async for agent_name, exec_res in fan_out_agents(payload, agent_infos, MULTI_AGENT_DEADLINE_SECONDS):
+        results[agent_name] = exec_res
+
+    aggregate = aggregate_agent_results(results)
+    logger.info("[multi] Agents executed | status=%s | statuses=%s",
+                aggregate.status, aggregate.metadata["statuses"])
+
+    try:
+        payload_llm = build_multi_composer_payload(payload.user_query, agent_infos, aggregate)
+        with stage_timer("composer", agent="multi", model=COMPOSER_MODEL_NAME):
+            content = await cached_chat_completion(payload_llm, timeout=20)
+        return content.strip()
+    except Exception as e:
+        logger.error("[composer] Multi-agent LLM composer failed: %s", e)
+        return compose_multi_fallback_text(aggregate)
+
+
+async def handle_multi_query_events(payload: QueryRequest, agent_infos: List[AgentInfo]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Event stream for multi mode: one "agent_result" per agent as it completes,
+    then the composer tokens, then "done" carrying the aggregate status.
+    """
+    yield {"type": "start", "agent": None, "agents": [info.agent_name for info in agent_infos]}
+
+    results: Dict[str, ExecutionResponse] = {}
+    async for agent_name, exec_res in fan_out_agents(payload, agent_infos, MULTI_AGENT_DEADLINE_SECONDS):
+        results[agent_name] = exec_res
+        yield {"type": "agent_result", "agent": agent_name, "status": exec_res.status}
+
+    aggregate = aggregate_agent_results(results)
+    payload_llm = build_multi_composer_payload(payload.user_query, agent_infos, aggregate)
+    async for delta in stream_llm_reply(
+        payload_llm, compose_multi_fallback_text(aggregate), "composer", agent="multi"
+    ):
+        yield {"type": "token", "content": delta}
+
+    yield {"type": "done", "status": aggregate.status}
+
+
+async def fallback_reply(payload: QueryRequest, ctx: QueryContext) -> str:
+    if ctx.speculative is not None:
+        speculative, ctx.speculative = ctx.speculative.claim(), None
+        return (await speculative.stream.text()).strip()
+    return await fallback_chat_llm(payload.user_query)
+
+
+async def fallback_reply_stream(payload: QueryRequest, ctx: QueryContext) -> AsyncIterator[str]:
+    if ctx.speculative is not None:
+        speculative, ctx.speculative = ctx.speculative.claim(), None
+        try:
+            async for delta in speculative.stream.follow():
+                yield delta
+        finally:
+            speculative.stream.cancel()
+        return
+    async for delta in fallback_chat_llm_stream(payload.user_query):
+        yield delta
+
+
+def log_incoming_query(payload: QueryRequest):
+    logger.info(
+        "Incoming query | routing_mode=%s | selected_agent=%s | query=%r",
+        payload.routing_mode,
+        payload.selected_agent,
+        payload.user_query,
+    )
+
+
+async def answer_query(payload: QueryRequest) -> str:
+    if payload.routing_mode == "multi":
+        agent_infos = await route_multi(payload)
+        if not agent_infos:
+            return await fallback_chat_llm(payload.user_query)
+        return await handle_multi_query(payload, agent_infos)
+
+    ctx = QueryContext()
+    try:
+        executed = await route_and_execute(payload, ctx)
+        if executed is None:
+            return await fallback_reply(payload, ctx)
+    finally:
+        ctx.cancel_speculation()
+
+    agent_name, agent_info, exec_res = executed
+
     # ----------------------
     # Compose Final Answer
     # ----------------------
-    final = compose_final_answer_with_llm(
+    final = await compose_reply(
         payload.user_query, agent_name, agent_info, exec_res
     )
 
@@ -430,7 +3186,510 @@ async def handle_query(payload: QueryRequest):
         exec_res.status,
     )
 
-    return QueryResponse(reply=final)
+    return final
+
+
+@app.post("/agenthost/query", response_model=QueryResponse)
+async def handle_query(payload: QueryRequest, request: Request, response: Response):
+    """
+    Send `X-AgentHost-Timing: true` to get the per-stage breakdown back in a
+    Server-Timing response header. `X-AgentHost-Priority: batch` queues the
+    request behind interactive ones; 429/503 + Retry-After when overloaded.
+    """
+    log_incoming_query(payload)
+    set_completion_cache_policy(request)
+
+    with track_request("query") as timings:
+        try:
+            admitted_at = await admit_request(request_priority_from(request))
+        except AdmissionRejected as e:
+            logger.warning("[admission] Rejected query (%d): %s", e.status_code, e.reason)
+            return rejection_response(e)
+        try:
+            session = await open_session(payload.session_id)
+            use_session_history(session)
+            reply = await answer_query(payload)
+            await record_session_turn(session, payload.user_query, reply)
+        finally:
+            release_request(admitted_at)
+
+    if wants_timing_header(request):
+        response.headers["Server-Timing"] = server_timing_header(timings)
+    return QueryResponse(reply=reply)
+
+
+def ndjson_event(event: Dict[str, Any]) -> str:
+    return json.dumps(event) + "\n"
+
+
+async def query_events(payload: QueryRequest) -> AsyncIterator[Dict[str, Any]]:
+    ctx = QueryContext()
+    if payload.routing_mode == "multi":
+        agent_infos = await route_multi(payload)
+        if agent_infos:
+            async for event in handle_multi_query_events(payload, agent_infos):
+                yield event
+            return
+        executed = None
+    else:
+        try:
+            executed = await route_and_execute(payload, ctx)
+        except BaseException:
+            ctx.cancel_speculation()
+            raise
+
+    if executed is None:
+        yield {"type": "start", "agent": None}
+        async for delta in fallback_reply_stream(payload, ctx):
+            yield {"type": "token", "content": delta}
+        yield {"type": "done"}
+        return
+
+    agent_name, agent_info, exec_res = executed
+    yield {"type": "start", "agent": agent_name}
+    async for delta in compose_reply_stream(
+        payload.user_query, agent_name, agent_info, exec_res
+    ):
+        yield {"type": "token", "content": delta}
+
+    logger.info(
+        "Composer stream finished | request_id=%s | agent=%s | status=%s",
+        exec_res.request_id,
+        agent_name,
+        exec_res.status,
+    )
+    yield {"type": "done"}
+
+
+@app.post("/agenthost/query/stream")
+async def handle_query_stream(payload: QueryRequest, request: Request):
+    """
+    Streaming variant of /agenthost/query (NDJSON, one event per line):
+
+      {"type": "start", "agent": "<name>" | null}
+      {"type": "token", "content": "..."}     (repeated)
+      {"type": "done"}
+
+    Routing and agent execution happen before "start"; the composer (or
+    fallback chat) tokens are forwarded as LiteLLM produces them.
+    In multi mode "start" also lists "agents", each finished agent emits
+    {"type": "agent_result", ...}, and "done" carries the aggregate status.
+    With `X-AgentHost-Timing: true`, "done" also carries "timings_ms".
+    """
+    log_incoming_query(payload)
+    set_completion_cache_policy(request)
+    include_timings = wants_timing_header(request)
+
+    async def events(timings: Dict[str, float]) -> AsyncIterator[Dict[str, Any]]:
+        session = await open_session(payload.session_id)
+        use_session_history(session)
+        reply: List[str] = []
+        async for event in query_events(payload):
+            if event["type"] == "token":
+                reply.append(event["content"])
+            elif event["type"] == "done":
+                await record_session_turn(session, payload.user_query, "".join(reply))
+                if include_timings:
+                    event["timings_ms"] = {
+                        stage: round(seconds * 1000, 1) for stage, seconds in timings.items()
+                    }
+            yield event
+
+    return await admitted_stream(request, "query_stream", events)
+
+
+async def admitted_stream(
+    request: Request,
+    endpoint: str,
+    events: Callable[[Dict[str, float]], AsyncIterator[Dict[str, Any]]],
+) -> Response:
+    """
+    NDJSON StreamingResponse for events(timings), admitted before the
+    response starts so a rejection can still be a 429/503.
+    """
+    priority = request_priority_from(request)
+    queue_timings: Dict[str, float] = {}
+    timings_token = request_timings.set(queue_timings)
+    try:
+        admitted_at = await admit_request(priority)
+    except AdmissionRejected as e:
+        logger.warning("[admission] Rejected %s (%d): %s", endpoint, e.status_code, e.reason)
+        return rejection_response(e)
+    finally:
+        request_timings.reset(timings_token)
+
+    released = False
+
+    def release_once():
+        # from the generator, or from the background task if the client left
+        # before the body was ever iterated
+        nonlocal released
+        if not released:
+            released = True
+            release_request(admitted_at)
+
+    async def body() -> AsyncIterator[str]:
+        request_priority.set(priority)
+        try:
+            with track_request(endpoint) as timings:
+                timings.update(queue_timings)
+                async for event in events(timings):
+                    yield ndjson_event(event)
+        finally:
+            release_once()
+
+    return StreamingResponse(
+        body(), media_type="application/x-ndjson", background=BackgroundTask(release_once)
+    )
+
+
+@app.post("/agenthost/chat/stream")
+async def handle_chat_stream(payload: ChatRequest, request: Request):
+    """
+    Plain chat with one LiteLLM model, no routing. With a session_id the
+    client sends only the new message; history is kept server-side.
+    Events: {"type": "start", "model", "session_id"}, tokens, {"type": "done"}.
+    """
+    set_completion_cache_policy(request)
+    model = payload.model or COMPOSER_MODEL_NAME
+
+    async def events(timings: Dict[str, float]) -> AsyncIterator[Dict[str, Any]]:
+        session = await open_session(payload.session_id)
+        use_session_history(session)
+        yield {"type": "start", "model": model, "session_id": payload.session_id}
+        llm_payload = {
+            "model": model,
+            "messages": with_session_history([
+                {"role": "system", "content": "You are a helpful assistant."},
+                {"role": "user", "content": payload.message}
+            ]),
+            "max_tokens": payload.max_tokens
+        }
+        reply: List[str] = []
+        async for delta in stream_llm_reply(llm_payload, FALLBACK_CHAT_ERROR_REPLY, "chat"):
+            reply.append(delta)
+            yield {"type": "token", "content": delta}
+        await record_session_turn(session, payload.message, "".join(reply))
+        yield {"type": "done"}
+
+    return await admitted_stream(request, "chat_stream", events)
+
+
+# ============================================================
+# BATCH QUERIES (JSONL in, JSONL results in completion order)
+# ============================================================
+#
+# POST /agenthost/batch takes one BatchQuery per line. Queries are routed by
+# a small worker pool (speculation off), then queued per (agent, model) group;
+# each group runs as many workers as its bottleneck allows: the agent's
+# concurrency cap and, if it composes with an LLM, the model's admission cap.
+# All LLM calls run in the "batch" priority class, so interactive traffic
+# keeps precedence on the shared model slots.
+#
+# Lines are parsed as the body arrives (the raw upload is never buffered),
+# and every routing / execution step waits for a request slot in the "batch"
+# admission class like any other request.
+#
+# Progress: with BATCH_STATE_DIR set, every result is appended to
+# <dir>/<batch_id>.jsonl. Re-posting the same body with ?batch_id=... skips
+# the ids that already succeeded (and replays them with replay=true). The file
+# is deleted once every query succeeded; files of batches left unfinished are
+# swept after BATCH_STATE_TTL_SECONDS.
+
+BATCH_STATE_DIR = os.getenv("BATCH_STATE_DIR", "batch_jobs")  # empty = no resume
+BATCH_STATE_TTL_SECONDS = float(os.getenv("BATCH_STATE_TTL_SECONDS", str(7 * 24 * 3600)))
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "100000"))
+BATCH_ROUTE_CONCURRENCY = int(os.getenv("BATCH_ROUTE_CONCURRENCY", "16"))
+BATCH_GROUP_MAX_CONCURRENCY = int(os.getenv("BATCH_GROUP_MAX_CONCURRENCY", "32"))
+
+BATCH_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+BATCH_STATS = {"batches": 0, "resumed": 0, "queries": 0, "ok": 0, "errors": 0, "skipped": 0}
+
+
+class BatchProgress:
+    """
+    Append-only result log of one batch (a torn last line is ignored).
+    Appends come from several worker threads, so writes are serialized.
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.file = None
+        self.lock = threading.Lock()
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        done: Dict[str, Dict[str, Any]] = {}
+        if self.path and os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get("status") == "ok":
+                        done[record["id"]] = record
+        return done
+
+    def append(self, record: Dict[str, Any]):
+        if not self.path:
+            return
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self.lock:
+            if self.file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self.file = open(self.path, "a", encoding="utf-8")
+            self.file.write(line)
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def discard(self):
+        # the batch completed; nothing left to resume
+        self.close()
+        if self.path:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+def sweep_batch_state() -> int:
+    # blocking: drop progress files of batches not touched for the TTL
+    if not BATCH_STATE_DIR or not os.path.isdir(BATCH_STATE_DIR):
+        return 0
+    cutoff = time.time() - BATCH_STATE_TTL_SECONDS
+    removed = 0
+    with os.scandir(BATCH_STATE_DIR) as entries:
+        for entry in entries:
+            try:
+                if entry.name.endswith(".jsonl") and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+    return removed
+
+
+def parse_batch_line(lineno: int, line: bytes, seen: set) -> Optional[Tuple[str, Any]]:
+    """
+    (id, BatchQuery) for one line, None for a blank one; an unparsable line or
+    a duplicate id yields (id, error message) so it is reported instead of dropped.
+    """
+    if not line.strip():
+        return None
+    try:
+        query = BatchQuery.model_validate_json(line.decode("utf-8", errors="replace"))
+    except ValidationError as e:
+        error = e.errors()[0]
+        where = ".".join(str(part) for part in error["loc"])
+        return str(lineno), f"invalid line {lineno}: {where + ': ' if where else ''}{error['msg']}"
+    query_id = query.id or str(lineno)
+    if query_id in seen:
+        return query_id, f"duplicate id on line {lineno}"
+    seen.add(query_id)
+    return query_id, query
+
+
+async def read_batch_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[str, Any]]:
+    # parse the JSONL body line by line as it is received
+    seen: set = set()
+    lineno = 0
+    pending = b""
+    async for chunk in chunks:
+        *lines, pending = (pending + chunk).split(b"\n")
+        for line in lines:
+            lineno += 1
+            item = parse_batch_line(lineno, line, seen)
+            if item is not None:
+                yield item
+    item = parse_batch_line(lineno + 1, pending, seen)
+    if item is not None:
+        yield item
+
+
+def batch_group(agent_info: Optional[AgentInfo], multi: bool) -> Tuple[str, str, int]:
+    """
+    (agent, model, worker count) for the queue a routed query goes to.
+    """
+    if multi:
+        return "multi", COMPOSER_MODEL_NAME, BATCH_GROUP_MAX_CONCURRENCY
+    composer_cap = model_limiter(COMPOSER_MODEL_NAME).capacity if ADMISSION_ENABLED else BATCH_GROUP_MAX_CONCURRENCY
+    if agent_info is None:
+        return "fallback", COMPOSER_MODEL_NAME, min(composer_cap, BATCH_GROUP_MAX_CONCURRENCY)
+    workers = agent_info.max_concurrency or AGENT_MAX_CONCURRENCY
+    model = ""
+    if agent_info.composition_mode == "llm":
+        model = COMPOSER_MODEL_NAME
+        workers = min(workers, composer_cap)
+    return agent_info.agent_name, model, min(workers, BATCH_GROUP_MAX_CONCURRENCY)
+
+
+async def answer_routed(query: BatchQuery, agent_info: Optional[AgentInfo], agent_infos: List[AgentInfo]) -> str:
+    if query.routing_mode == "multi":
+        if not agent_infos:
+            return await fallback_chat_llm(query.user_query)
+        return await handle_multi_query(query, agent_infos)
+    if agent_info is None:
+        return await fallback_chat_llm(query.user_query)
+    agent_name, agent_info, exec_res = await execute_routed(query, agent_info)
+    return await compose_reply(query.user_query, agent_name, agent_info, exec_res)
+
+
+class BatchRun:
+    def __init__(self, items: List[Tuple[str, Any]], progress: BatchProgress):
+        self.items = items
+        self.progress = progress
+        self.results: asyncio.Queue = asyncio.Queue()
+        self.groups: Dict[Tuple[str, str], asyncio.Queue] = {}
+        self.tasks: List[asyncio.Task] = []
+
+    def spawn(self, coro):
+        self.tasks.append(asyncio.create_task(coro))
+
+    @asynccontextmanager
+    async def admitted(self):
+        # one request slot per routing / execution step, behind interactive traffic
+        admitted_at = await admit_request("batch")
+        try:
+            yield
+        finally:
+            release_request(admitted_at)
+
+    async def finish(self, query_id: str, started: float, agent: Optional[str], reply: Optional[str] = None,
+                     error: Optional[str] = None):
+        record = {
+            "type": "result",
+            "id": query_id,
+            "status": "ok" if error is None else "error",
+            "agent": agent,
+            "reply": reply,
+            "error": error,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        BATCH_STATS["ok" if error is None else "errors"] += 1
+        await asyncio.to_thread(self.progress.append, record)
+        await self.results.put(record)
+
+    async def route_worker(self, pending: asyncio.Queue):
+        request_priority.set("batch")
+        while not pending.empty():
+            query_id, query = pending.get_nowait()
+            started = time.perf_counter()
+            try:
+                async with self.admitted():
+                    if query.routing_mode == "multi":
+                        agent_info, agent_infos = None, await route_multi(query)
+                    else:
+                        agent_info, agent_infos = await route_query(query, QueryContext(speculate=False)), []
+            except Exception as e:
+                await self.finish(query_id, started, None, error=f"routing failed: {e}")
+                continue
+            agent, model, workers = batch_group(agent_info, query.routing_mode == "multi")
+            group = self.groups.get((agent, model))
+            if group is None:
+                group = self.groups[(agent, model)] = asyncio.Queue()
+                for _ in range(workers):
+                    self.spawn(self.group_worker(group))
+            group.put_nowait((query_id, query, started, agent_info, agent_infos))
+
+    async def group_worker(self, group: asyncio.Queue):
+        request_priority.set("batch")
+        while True:
+            query_id, query, started, agent_info, agent_infos = await group.get()
+            agent = agent_info.agent_name if agent_info is not None else None
+            try:
+                async with self.admitted():
+                    session = await open_session(query.session_id)
+                    use_session_history(session)
+                    reply = await answer_routed(query, agent_info, agent_infos)
+                    await record_session_turn(session, query.user_query, reply)
+            except Exception as e:
+                await self.finish(query_id, started, agent, error=str(e))
+            else:
+                await self.finish(query_id, started, agent, reply=reply)
+
+    async def run(self) -> AsyncIterator[Dict[str, Any]]:
+        pending: asyncio.Queue = asyncio.Queue()
+        expected = 0
+        for query_id, query in self.items:
+            expected += 1
+            if isinstance(query, str):
+                await self.finish(query_id, time.perf_counter(), None, error=query)
+            else:
+                pending.put_nowait((query_id, query))
+        try:
+            for _ in range(min(BATCH_ROUTE_CONCURRENCY, pending.qsize())):
+                self.spawn(self.route_worker(pending))
+            for _ in range(expected):
+                yield await self.results.get()
+        finally:
+            # client gone or batch done: stop the workers; progress is on disk
+            for task in self.tasks:
+                task.cancel()
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+            self.progress.close()
+
+
+@app.post("/agenthost/batch")
+async def handle_batch(request: Request, batch_id: Optional[str] = None, replay: bool = False):
+    """
+    Bulk variant of /agenthost/query. Body: JSONL, one BatchQuery per line
+    ({"id": ..., "user_query": ..., "routing_mode": ..., "selected_agent": ...}).
+    Response: JSONL — a "start" line with the batch_id, one "result" line per
+    query in completion order, then "done" with the totals.
+    """
+    if batch_id is not None and not BATCH_ID_RE.match(batch_id):
+        return JSONResponse(status_code=400, content={"detail": "batch_id must match [A-Za-z0-9_-]{1,64}"})
+    items: List[Tuple[str, Any]] = []
+    async for item in read_batch_lines(request.stream()):
+        items.append(item)
+        if len(items) > BATCH_MAX_QUERIES:
+            return JSONResponse(status_code=413, content={"detail": f"batch exceeds {BATCH_MAX_QUERIES} queries"})
+
+    batch_id = batch_id or uuid.uuid4().hex
+    progress = BatchProgress(os.path.join(BATCH_STATE_DIR, f"{batch_id}.jsonl") if BATCH_STATE_DIR else None)
+    done = await asyncio.to_thread(progress.load)
+    swept = await asyncio.to_thread(sweep_batch_state)
+    if swept:
+        logger.info("[batch] swept %d expired progress files", swept)
+    todo = [(query_id, query) for query_id, query in items if query_id not in done]
+    skipped = len(items) - len(todo)
+
+    BATCH_STATS["batches"] += 1
+    BATCH_STATS["resumed"] += 1 if done else 0
+    BATCH_STATS["queries"] += len(todo)
+    BATCH_STATS["skipped"] += skipped
+    logger.info("[batch] %s: %d queries (%d already done)", batch_id, len(items), skipped)
+
+    async def events() -> AsyncIterator[str]:
+        started = time.perf_counter()
+        counts = {"ok": 0, "error": 0}
+        yield ndjson_event({"type": "start", "batch_id": batch_id, "total": len(items), "skipped": skipped})
+        if replay:
+            for query_id, _ in items:
+                if query_id in done:
+                    yield ndjson_event(done[query_id])
+        with track_request("batch"):
+            async for record in BatchRun(todo, progress).run():
+                counts[record["status"]] += 1
+                yield ndjson_event(record)
+        if not counts["error"]:
+            await asyncio.to_thread(progress.discard)
+        yield ndjson_event({
+            "type": "done",
+            "batch_id": batch_id,
+            "ok": counts["ok"] + skipped,
+            "errors": counts["error"],
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
+
+    return StreamingResponse(
+        events(), media_type="application/x-ndjson", headers={"X-AgentHost-Batch-Id": batch_id}
+    )
 
 
 # ============================================================
@@ -448,15 +3707,23 @@ async def list_agents():
 @app.post("/agenthost/register", response_model=AgentInfo)
 async def register_agent(payload: AgentRegisterRequest):
     """
-    Register or update an agent in the in-memory registry.
+    Register or update an agent in the registry (persisted to the registry
+    log when REGISTRY_LOG_PATH is set, so it survives restarts).
 
     NOTE:
-    - Only agents that ALSO have a handler entry in AGENT_HANDLERS
-      will be actually executable and considered by the router.
-    - This endpoint manages metadata; execution wiring for external agents comes later.
+    - Agents are executable (and considered by the router) if they have a
+      handler entry in AGENT_HANDLERS or an http(s):// how_to_call URL.
+    - HTTP agents receive the ExecutionRequest as JSON and must return an
+      ExecutionResponse.
     """
     agent = AgentInfo(**payload.model_dump())
-    AGENT_REGISTRY[agent.agent_name] = agent
+    async with REGISTRY_WRITE_LOCK:
+        await asyncio.to_thread(index_agent_embeddings, agent)
+        AGENT_REGISTRY[agent.agent_name] = agent
+        AGENT_BREAKERS.pop(agent.agent_name, None)  # re-registration starts with a clean slate
+        compile_agent_prompt(agent)
+        mark_registry_changed(f"register {agent.agent_name}", agent.agent_name)
+        await persist_registry_change({"op": "register", "agent": agent.to_dict()})
     logger.info("Agent registered/updated: %s", agent.agent_name)
     return agent
 
@@ -464,15 +3731,42 @@ async def register_agent(payload: AgentRegisterRequest):
 @app.post("/agenthost/deregister")
 async def deregister_agent(payload: AgentDeregisterRequest) -> Dict[str, Any]:
     """
-    Deregister an agent from the in-memory registry.
+    Deregister an agent from the registry (and the registry log).
 
-    This does NOT touch AGENT_HANDLERS (execution wiring). For now, handlers
-    are managed in code. Later, for HTTP-based agents, we will add dynamic
-    handler wiring as well.
+    This does NOT touch AGENT_HANDLERS (execution wiring). In-process handlers
+    are managed in code; HTTP agents are executable only while registered.
+
+    Built-in agents (BUILTIN_AGENTS) are registered in code on every start, so
+    they cannot be removed: deregistering one resets it to its built-in
+    definition and logs the deregister, which drops any persisted override.
     """
     name = payload.agent_name
-    if name in AGENT_REGISTRY:
-        del AGENT_REGISTRY[name]
+    if name in BUILTIN_AGENTS:
+        agent = BUILTIN_AGENTS[name]()
+        async with REGISTRY_WRITE_LOCK:
+            await asyncio.to_thread(index_agent_embeddings, agent)
+            AGENT_REGISTRY[name] = agent
+            AGENT_BREAKERS.pop(name, None)
+            compile_agent_prompt(agent)
+            mark_registry_changed(f"reset {name}", name)
+            await persist_registry_change({"op": "deregister", "agent_name": name})
+        logger.info("Built-in agent reset (not removed): %s", name)
+        return {
+            "status": "reset",
+            "message": f"Agent '{name}' is built in and cannot be removed; reset to its built-in definition.",
+            "agent_name": name,
+        }
+
+    async with REGISTRY_WRITE_LOCK:
+        found = AGENT_REGISTRY.pop(name, None) is not None
+        if found:
+            drop_agent_embeddings(name)
+            drop_agent_prompt(name)
+            AGENT_SEMAPHORES.pop(name, None)
+            AGENT_BREAKERS.pop(name, None)
+            mark_registry_changed(f"deregister {name}", name)
+            await persist_registry_change({"op": "deregister", "agent_name": name})
+    if found:
         logger.info("Agent deregistered: %s", name)
         return {
             "status": "ok",
@@ -487,6 +3781,220 @@ async def deregister_agent(payload: AgentDeregisterRequest) -> Dict[str, Any]:
             "agent_name": name,
         }
 
+
+@app.get("/agenthost/router/stats")
+async def router_stats() -> Dict[str, Any]:
+    """
+    How often the semantic fast path answered vs. fell through to the router LLM,
+    and how big the router prompts were (agents shown / shortlisted, chars).
+    """
+    total = SEMANTIC_ROUTER_STATS["fast_path"] + SEMANTIC_ROUTER_STATS["llm_fallback"]
+    prompts = ROUTER_PROMPT_STATS["prompts"]
+    return {
+        **SEMANTIC_ROUTER_STATS,
+        "fast_path_ratio": SEMANTIC_ROUTER_STATS["fast_path"] / total if total else 0.0,
+        "backend": type(embedding_backend).__name__,
+        "indexed_agents": len(SEMANTIC_INDEX),
+        "prompt": {
+            **ROUTER_PROMPT_STATS,
+            "shortlist_top_k": ROUTER_SHORTLIST_TOP_K,
+            "max_chars": ROUTER_PROMPT_MAX_CHARS,
+            "avg_agents_in_prompt": ROUTER_PROMPT_STATS["agents_in_prompt"] / prompts if prompts else 0.0,
+            "avg_prompt_chars": ROUTER_PROMPT_STATS["prompt_chars"] / prompts if prompts else 0.0,
+        },
+    }
+
+
+@app.get("/agenthost/router/cache")
+async def router_cache_stats() -> Dict[str, Any]:
+    """
+    Routing decision cache stats (hits / misses / evictions / invalidations).
+    """
+    return ROUTING_CACHE.snapshot()
+
+
+@app.get("/agenthost/completion-cache")
+async def completion_cache_stats() -> Dict[str, Any]:
+    """
+    Completion cache stats for fallback chat + composer outputs.
+    """
+    stats = completion_cache.snapshot()
+    if completion_cache.disk is not None:
+        stats["disk_entries"] = await asyncio.to_thread(len, completion_cache.disk)
+    return stats
+
+
+@app.get("/agenthost/composition/stats")
+async def composition_stats() -> Dict[str, Any]:
+    """
+    Per-mode composition counts and the estimated composer time saved.
+    """
+    return dict(COMPOSITION_STATS)
+
+
+@app.get("/agenthost/registry/stats")
+async def registry_stats() -> Dict[str, Any]:
+    """
+    Registry size and generation, plus the persistent log (records, replay
+    time, compactions) when enabled.
+    """
+    return {
+        "agents": len(AGENT_REGISTRY),
+        "generation": REGISTRY_GENERATION,
+        "store": REGISTRY_STORE.snapshot() if REGISTRY_STORE is not None else None,
+    }
+
+
+@app.get("/agenthost/health")
+async def agent_health() -> Dict[str, Any]:
+    """
+    Per-agent health as seen by the prober and live traffic: breaker state,
+    rolling error rate and latency, trips and the last error.
+    """
+    return {
+        "probe_enabled": HEALTH_PROBE_ENABLED,
+        "interval_seconds": HEALTH_PROBE_INTERVAL_SECONDS,
+        "agents": {
+            name: {
+                "health_status": info.health_status,
+                "probed": is_http_agent(info),
+                **(AGENT_BREAKERS[name].snapshot() if name in AGENT_BREAKERS else {"state": "closed", "samples": 0}),
+            }
+            for name, info in AGENT_REGISTRY.items()
+        },
+    }
+
+
+@app.get("/agenthost/single-flight/stats")
+async def single_flight_stats() -> Dict[str, Any]:
+    """
+    LiteLLM call coalescing: upstream calls made (leaders) vs. requests that
+    joined one already in flight.
+    """
+    return single_flight.snapshot()
+
+
+@app.post("/agenthost/sessions")
+async def create_session() -> Dict[str, Any]:
+    """
+    A fresh session id (clients may also pick their own).
+    """
+    return {"session_id": uuid.uuid4().hex}
+
+
+@app.get("/agenthost/sessions/stats")
+async def session_stats() -> Dict[str, Any]:
+    return {"dir": SESSION_DIR, "context_tokens": SESSION_CONTEXT_TOKENS, **SESSIONS.snapshot()}
+
+
+@app.get("/agenthost/sessions/{session_id}")
+async def get_session(session_id: str) -> Dict[str, Any]:
+    """
+    The session's summary, unsummarized turns and the size of the context the
+    next turn would get.
+    """
+    if not SESSION_ID_RE.match(session_id):
+        return JSONResponse(status_code=400, content={"detail": "invalid session_id"})
+    session = await SESSIONS.get(session_id)
+    context = session.context(SESSION_CONTEXT_TOKENS)
+    return {
+        "session_id": session_id,
+        "summary": session.summary,
+        "summarized_turns": session.first_turn,
+        "turns": [{"role": role, "content": content} for role, content, _ in session.turns],
+        "context_messages": len(context),
+        "context_tokens": sum(estimate_tokens(m["content"]) for m in context),
+    }
+
+
+@app.delete("/agenthost/sessions/{session_id}")
+async def delete_session(session_id: str) -> Dict[str, Any]:
+    if not SESSION_ID_RE.match(session_id):
+        return JSONResponse(status_code=400, content={"detail": "invalid session_id"})
+    return {"session_id": session_id, "deleted": await SESSIONS.delete(session_id)}
+
+
+@app.get("/agenthost/batch/stats")
+async def batch_stats() -> Dict[str, Any]:
+    return {"state_dir": BATCH_STATE_DIR, **BATCH_STATS}
+
+
+@app.get("/agenthost/admission/stats")
+async def admission_stats() -> Dict[str, Any]:
+    """
+    Request and per-model slot pools: capacity, active, queued per priority
+    class, admitted / rejected counts and the current Retry-After estimate.
+    """
+    return {
+        "enabled": ADMISSION_ENABLED,
+        "wait_seconds": ADMISSION_WAIT_SECONDS,
+        "requests": REQUEST_LIMITER.snapshot(),
+        "models": {model: limiter.snapshot() for model, limiter in MODEL_LIMITERS.items()},
+    }
+
+
+@app.get("/agenthost/speculation/stats")
+async def speculation_stats() -> Dict[str, Any]:
+    """
+    Speculative fallback: how often the early answer was used vs. cancelled,
+    and the tokens / time saved vs. wasted.
+    """
+    return {"mode": SPECULATIVE_FALLBACK_MODE, **SPECULATION_STATS}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus text exposition: stage latency histograms, error counters,
+    in-flight gauges and the cache / router / speculation stats.
+    """
+    lines: List[str] = []
+    for metric in (STAGE_DURATION, REQUEST_DURATION, STAGE_ERRORS, INFLIGHT_REQUESTS):
+        lines.extend(metric.render())
+
+    lines.extend(ADMISSION_WAIT.render())
+    limiters = [REQUEST_LIMITER, *MODEL_LIMITERS.values()]
+    lines.append("# HELP agenthost_admission_queue_depth Requests / LLM calls waiting for a slot.")
+    lines.append("# TYPE agenthost_admission_queue_depth gauge")
+    for limiter in limiters:
+        for cls, depth in limiter.queued.items():
+            lines.append(f"agenthost_admission_queue_depth{format_labels(('pool', 'priority'), (limiter.name, cls))} {depth}")
+    lines.append("# HELP agenthost_admission_active Slots currently held.")
+    lines.append("# TYPE agenthost_admission_active gauge")
+    for limiter in limiters:
+        lines.append(f"agenthost_admission_active{format_labels(('pool',), (limiter.name,))} {limiter.active}")
+    lines.append("# HELP agenthost_admission_rejected_total Rejected admissions (reason: full = 429, timeout = 503).")
+    lines.append("# TYPE agenthost_admission_rejected_total counter")
+    for limiter in limiters:
+        for reason in ("full", "timeout"):
+            value = limiter.stats[f"rejected_{reason}"]
+            lines.append(f"agenthost_admission_rejected_total{format_labels(('pool', 'reason'), (limiter.name, reason))} {value}")
+
+    lines.append("# HELP agenthost_agent_inflight_executions Agent executions currently running.")
+    lines.append("# TYPE agenthost_agent_inflight_executions gauge")
+    for name, count in sorted(AGENT_INFLIGHT.items()):
+        lines.append(f"agenthost_agent_inflight_executions{format_labels(('agent',), (name,))} {count}")
+
+    lines.append("# HELP agenthost_agent_circuit_open Agent circuit breaker state (1 = open, 0.5 = half-open).")
+    lines.append("# TYPE agenthost_agent_circuit_open gauge")
+    for name, breaker in sorted(AGENT_BREAKERS.items()):
+        value = {"closed": 0, "half_open": 0.5, "open": 1}[breaker.state]
+        lines.append(f"agenthost_agent_circuit_open{format_labels(('agent',), (name,))} {value:g}")
+
+    lines.extend(render_stats_gauges("semantic_router", SEMANTIC_ROUTER_STATS))
+    lines.extend(render_stats_gauges("router_prompt", ROUTER_PROMPT_STATS))
+    lines.extend(render_stats_gauges("routing_cache", ROUTING_CACHE.snapshot()))
+    lines.extend(render_stats_gauges("completion_cache", completion_cache.snapshot()))
+    lines.extend(render_stats_gauges("composition", COMPOSITION_STATS))
+    lines.extend(render_stats_gauges("speculation", SPECULATION_STATS))
+    lines.extend(render_stats_gauges("single_flight", single_flight.snapshot()))
+    lines.extend(render_stats_gauges("batch", BATCH_STATS))
+    lines.extend(render_stats_gauges("sessions", SESSIONS.snapshot()))
+    lines.append("# TYPE agenthost_registered_agents gauge")
+    lines.append(f"agenthost_registered_agents {len(AGENT_REGISTRY)}")
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+
 @app.get("/agenthost/llm-models")
 async def list_llm_models():
     """
@@ -494,13 +4002,8 @@ async def list_llm_models():
     Returns exactly what LiteLLM returns from /v1/models.
     """
     try:
-        with httpx.Client(timeout=15.0) as client:
-            resp = client.get(
-                f"{LITELLM_BASE_URL}/v1/models",
-                headers={
-                    "Authorization": f"Bearer {LITELLM_API_KEY}"
-                }
-            )
+        client = open_litellm_client()
+        resp = await client.get("/v1/models", timeout=15.0)
         resp.raise_for_status()
         data = resp.json()
         logger.info("Fetched LLM model list from LiteLLM.")
@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+# no persistence or background probing; logs/ lands in a scratch dir
+os.environ.update({
+    "REGISTRY_LOG_PATH": "",
+    "SESSION_DIR": "",
+    "BATCH_STATE_DIR": "",
+    "HEALTH_PROBE_ENABLED": "false",
+})
+os.chdir(tempfile.mkdtemp(prefix="agenthost-tests-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
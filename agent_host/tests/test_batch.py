@@ -0,0 +1,35 @@
+import asyncio
+import json
+
+import main
+
+
+async def chunks(body: bytes, size: int):
+    for i in range(0, len(body), size):
+        yield body[i:i + size]
+
+
+def read_lines(body: bytes, size: int):
+    async def collect():
+        return [item async for item in main.read_batch_lines(chunks(body, size))]
+    return asyncio.run(collect())
+
+
+def test_lines_split_across_chunks_are_parsed_once():
+    lines = [json.dumps({"id": f"q{i}", "user_query": f"question {i}"}) for i in range(5)]
+    body = ("\n".join(lines) + "\n\n").encode()
+
+    for size in (1, 7, len(body)):
+        items = read_lines(body, size)
+        assert [query_id for query_id, _ in items] == [f"q{i}" for i in range(5)]
+        assert all(isinstance(query, main.BatchQuery) for _, query in items)
+
+
+def test_bad_and_duplicate_lines_are_reported():
+    body = b'{"id": "a", "user_query": "x"}\n{"bad json\n{"id": "a", "user_query": "y"}'
+
+    items = read_lines(body, 4)
+
+    assert items[0][0] == "a"
+    assert items[1] == ("2", items[1][1]) and items[1][1].startswith("invalid line 2")
+    assert items[2] == ("a", "duplicate id on line 3")
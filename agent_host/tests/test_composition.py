@@ -0,0 +1,39 @@
+import pytest
+
+import main
+
+
+def template_agent(template: str) -> main.AgentInfo:
+    return main.AgentInfo(
+        agent_name="TemplateAgent",
+        description="d",
+        capability_tags=[],
+        curated_routing_prompts="x",
+        example_queries=[],
+        how_to_call="internal://template",
+        health_status="healthy",
+        composition_mode="template",
+        composition_template=template,
+    )
+
+
+@pytest.mark.parametrize("template, result", [
+    ("got {result[b]}", {"a": 1}),     # KeyError
+    ("got {result[0]}", 42),           # TypeError: not subscriptable
+    ("got {result.missing}", "text"),  # AttributeError
+    ("got {result", "text"),           # ValueError: unbalanced brace
+])
+def test_bad_agent_template_falls_back_to_the_result(template, result):
+    exec_res = main.ExecutionResponse("r", "success", result, None, {})
+
+    text = main.compose_locally("template", "q", "TemplateAgent", template_agent(template), exec_res)
+
+    assert text == str(result)
+
+
+def test_template_fills_fields():
+    exec_res = main.ExecutionResponse("r", "success", {"b": 2}, None, {})
+
+    text = main.compose_locally("template", "q", "TemplateAgent", template_agent("got {result[b]}"), exec_res)
+
+    assert text == "got 2"
@@ -1,44 +1,1507 @@
-from fastapi import FastAPI, HTTPException
-from typing import List
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterator, List, Literal, NamedTuple, Optional, Tuple
+import asyncio
+import base64
+import bisect
+import ctypes
+import ctypes.util
+import fnmatch
+import json
+import logging
+import math
+import mimetypes
+import mmap
+import os
+import re
+import select
+import shutil
+import stat
+import struct
+import sys
+import threading
+import time
+import uuid
+
 app = FastAPI()
 
+logger = logging.getLogger("mcp_file_service")
+logger.setLevel(logging.INFO)
+if not logger.handlers:
+    _log_handler = logging.StreamHandler()
+    _log_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(name)s - %(message)s"))
+    logger.addHandler(_log_handler)
+
+# Chunk size for streamed uploads/downloads (memory per transfer stays ~constant)
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", str(1024 * 1024)))
+
+
+def resolve_file_path(folder_name: str, file_name: str) -> str:
+    # file_name must be a plain name, not a path
+    if not file_name or file_name in (".", "..") or os.sep in file_name or "/" in file_name:
+        raise HTTPException(status_code=400, detail=f"Invalid file name: {file_name!r}")
+    return os.path.join(folder_name, file_name)
+
+
+# uploads land in "<name>.part-<hex>" until complete; listings and the search
+# index never show these
+PARTIAL_UPLOAD_RE = re.compile(r"\.part-[0-9a-f]{32}$")
+
+
+def partial_upload_path(path: str) -> str:
+    return f"{path}.part-{uuid.uuid4().hex}"
+
+
+def is_partial_upload(name: str) -> bool:
+    return PARTIAL_UPLOAD_RE.search(name) is not None
+
+
+# ---------------------------------------------------------------------------
+# Directory index (in-memory listings + stat data, kept fresh by inotify)
+# ---------------------------------------------------------------------------
+
+DIR_CACHE_ENABLED = os.getenv("DIR_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+# auto | inotify | poll
+DIR_CACHE_BACKEND = os.getenv("DIR_CACHE_BACKEND", "auto").lower()
+DIR_CACHE_MAX_FOLDERS = int(os.getenv("DIR_CACHE_MAX_FOLDERS", "256"))
+# poll backend: a cached folder is re-validated by its own mtime, and rescanned
+# at least this often so in-place edits (which don't touch the dir) show up
+DIR_CACHE_POLL_TTL = float(os.getenv("DIR_CACHE_POLL_TTL", "2.0"))
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class EntryInfo(NamedTuple):
+    name: str
+    type: str
+    size: int
+    mtime: float
+
+
+def entry_type(mode: int) -> str:
+    if stat.S_ISDIR(mode):
+        return "dir"
+    if stat.S_ISREG(mode):
+        return "file"
+    if stat.S_ISLNK(mode):
+        return "symlink"
+    return "other"
+
+
+def entry_info(name: str, st: os.stat_result) -> EntryInfo:
+    return EntryInfo(name, entry_type(st.st_mode), st.st_size, st.st_mtime)
+
+
+def scan_folder(folder: str) -> List[EntryInfo]:
+    # one scandir pass; stat comes from the DirEntry, sorted by name
+    with os.scandir(folder) as it:
+        entries = [entry_info(e.name, e.stat(follow_symlinks=False)) for e in it if not is_partial_upload(e.name)]
+    entries.sort(key=lambda e: e.name)
+    return entries
+
+
+class CachedFolder:
+    def __init__(self, entries: List[EntryInfo], dir_mtime_ns: int):
+        self.entries: Dict[str, EntryInfo] = {e.name: e for e in entries}
+        self.ordered: Optional[List[EntryInfo]] = entries
+        self.dir_mtime_ns = dir_mtime_ns
+        self.loaded_at = time.monotonic()
+        self.wd: Optional[int] = None
+
+    def listing(self) -> List[EntryInfo]:
+        if self.ordered is None:
+            self.ordered = sorted(self.entries.values(), key=lambda e: e.name)
+        return self.ordered
+
+
+class InotifyWatcher:
+    """
+    Minimal inotify binding over libc (Linux only). Events are read on a
+    daemon thread and handed to on_event(wd, mask, name).
+    """
+
+    def __init__(self, on_event):
+        self.on_event = on_event
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="dir-index-inotify", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join(timeout=2)
+        os.close(self.fd)
+
+    def add_watch(self, path: str) -> int:
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        return wd
+
+    def rm_watch(self, wd: int):
+        self.libc.inotify_rm_watch(self.fd, wd)
+
+    def run(self):
+        poller = select.poll()
+        poller.register(self.fd, select.POLLIN)
+        while not self.stopped.is_set():
+            if not poller.poll(500):
+                continue
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            offset = 0
+            while offset < len(data):
+                wd, mask, _cookie, length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+                offset += length
+                self.on_event(wd, mask, name)
+
+
+class DirectoryIndex:
+    """
+    LRU of folder listings with per-entry stat data. With inotify each cached
+    folder holds a watch and events patch single entries in place; the poll
+    backend re-validates a folder by its mtime instead. File endpoints also
+    write through (upsert/remove) so the service's own changes never miss.
+    All methods are thread-safe; scans happen outside the lock.
+    """
+
+    def __init__(self, enabled: bool, backend: str, max_folders: int, poll_ttl: float):
+        self.enabled = enabled
+        self.requested_backend = backend
+        self.backend = "off"
+        self.max_folders = max_folders
+        self.poll_ttl = poll_ttl
+        self.lock = threading.Lock()
+        self.folders: "OrderedDict[str, CachedFolder]" = OrderedDict()
+        self.wd_to_folder: Dict[int, str] = {}
+        # bumped by every change notice; a scan is only stored if its
+        # folder's generation didn't move while it was running
+        self.generations: Dict[str, int] = {}
+        self.watcher: Optional[InotifyWatcher] = None
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "patches": 0,
+            "invalidations": 0,
+            "evictions": 0,
+            "write_through": 0,
+        }
+
+    def start(self):
+        if not self.enabled:
+            return
+        self.backend = "poll"
+        if self.requested_backend in ("auto", "inotify") and sys.platform.startswith("linux"):
+            try:
+                self.watcher = InotifyWatcher(self.handle_event)
+                self.watcher.start()
+                self.backend = "inotify"
+            except Exception as e:
+                logger.warning("[dir-index] inotify unavailable (%s); using polling", e)
+                self.watcher = None
+
+    def stop(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        with self.lock:
+            self.folders.clear()
+            self.wd_to_folder.clear()
+
+    @staticmethod
+    def key(folder: str) -> str:
+        return os.path.abspath(folder)
+
+    def get(self, folder: str) -> Optional[List[EntryInfo]]:
+        # cache-only lookup; on the inotify backend this does no I/O at all,
+        # on the poll backend it stats the folder (blocking)
+        if not self.enabled:
+            return None
+        key = self.key(folder)
+        with self.lock:
+            cached = self.folders.get(key)
+        if cached is not None and self.backend == "poll" and not self.poll_valid(key, cached):
+            self.invalidate(key)
+            cached = None
+        with self.lock:
+            if cached is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            self.folders.move_to_end(key)
+            return cached.listing()
+
+    def poll_valid(self, key: str, cached: CachedFolder) -> bool:
+        if time.monotonic() - cached.loaded_at > self.poll_ttl:
+            return False
+        try:
+            return os.stat(key).st_mtime_ns == cached.dir_mtime_ns
+        except OSError:
+            return False
+
+    def load(self, folder: str) -> List[EntryInfo]:
+        # blocking: scan the folder and cache the result
+        key = self.key(folder)
+        if not self.enabled:
+            return scan_folder(key)
+
+        dir_mtime_ns = os.stat(key).st_mtime_ns
+        wd = None
+        if self.watcher is not None:
+            # watch before scanning so nothing changing mid-scan goes unseen
+            wd = self.watcher.add_watch(key)
+            with self.lock:
+                self.wd_to_folder[wd] = key
+        with self.lock:
+            generation = self.generations.get(key, 0)
+
+        entries = scan_folder(key)
+
+        with self.lock:
+            if self.generations.get(key, 0) != generation:
+                # changed under us; serve this scan but let the next call rescan
+                return entries
+            cached = CachedFolder(entries, dir_mtime_ns)
+            cached.wd = wd
+            self.folders[key] = cached
+            self.folders.move_to_end(key)
+            evicted = []
+            while len(self.folders) > self.max_folders:
+                _, old = self.folders.popitem(last=False)
+                self.stats["evictions"] += 1
+                evicted.append(old.wd)
+        for old_wd in evicted:
+            self.drop_watch(old_wd)
+        return entries
+
+    def listing(self, folder: str) -> List[EntryInfo]:
+        # blocking: cached listing, loading it on a miss
+        entries = self.get(folder)
+        return entries if entries is not None else self.load(folder)
+
+    def drop_watch(self, wd: Optional[int]):
+        if wd is None or self.watcher is None:
+            return
+        with self.lock:
+            still_used = any(c.wd == wd for c in self.folders.values())
+            if not still_used:
+                self.wd_to_folder.pop(wd, None)
+        if not still_used:
+            self.watcher.rm_watch(wd)
+
+    def invalidate(self, key: str):
+        with self.lock:
+            self.generations[key] = self.generations.get(key, 0) + 1
+            cached = self.folders.pop(key, None)
+            if cached is not None:
+                self.stats["invalidations"] += 1
+        if cached is not None:
+            self.drop_watch(cached.wd)
+
+    def patch(self, key: str, name: str):
+        # re-stat one entry and update it in place (removing it if it's gone)
+        if is_partial_upload(name):
+            return
+        try:
+            info = entry_info(name, os.lstat(os.path.join(key, name)))
+        except FileNotFoundError:
+            info = None
+        except OSError:
+            self.invalidate(key)
+            return
+        with self.lock:
+            self.generations[key] = self.generations.get(key, 0) + 1
+            cached = self.folders.get(key)
+            if cached is None:
+                return
+            if info is None:
+                cached.entries.pop(name, None)
+            else:
+                cached.entries[name] = info
+            cached.ordered = None
+            self.stats["patches"] += 1
+            if self.backend == "poll":
+                try:
+                    cached.dir_mtime_ns = os.stat(key).st_mtime_ns
+                except OSError:
+                    pass
+
+    def handle_event(self, wd: int, mask: int, name: str):
+        if mask & IN_Q_OVERFLOW:
+            # events were dropped; nothing cached can be trusted
+            with self.lock:
+                keys = list(self.folders)
+            for key in keys:
+                self.invalidate(key)
+            return
+        with self.lock:
+            key = self.wd_to_folder.get(wd)
+            if mask & IN_IGNORED:
+                self.wd_to_folder.pop(wd, None)
+        if key is None:
+            return
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+            self.invalidate(key)
+        elif name:
+            self.patch(key, name)
+
+    def write_through(self, folder: str, name: str):
+        # called by the file endpoints right after they change `name`
+        if not self.enabled:
+            return
+        key = self.key(folder)
+        with self.lock:
+            self.stats["write_through"] += 1
+        self.patch(key, name)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                "enabled": self.enabled,
+                "backend": self.backend,
+                "folders": len(self.folders),
+                "max_folders": self.max_folders,
+                "watches": len(self.wd_to_folder),
+                **self.stats,
+                "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            }
+
+
+DIR_INDEX = DirectoryIndex(DIR_CACHE_ENABLED, DIR_CACHE_BACKEND, DIR_CACHE_MAX_FOLDERS, DIR_CACHE_POLL_TTL)
+
+
+# ---------------------------------------------------------------------------
+# Full-text index (token -> file/position postings, persisted as a snapshot)
+# ---------------------------------------------------------------------------
+
+SEARCH_INDEX_ENABLED = os.getenv("SEARCH_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", ".search_index.json")  # empty = memory only
+SEARCH_INDEX_FLUSH_SECONDS = float(os.getenv("SEARCH_INDEX_FLUSH_SECONDS", "2.0"))
+SEARCH_INDEX_MAX_FILE_BYTES = int(os.getenv("SEARCH_INDEX_MAX_FILE_BYTES", str(5 * 1024 * 1024)))
+SEARCH_MAX_PREFIX_TERMS = 200
+SEARCH_SNIPPET_BYTES = 160
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_RE = re.compile(r"\w+")
+QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def tokenize(text: str) -> Tuple[List[str], List[int]]:
+    # lowercased word tokens plus the byte offset of each one in the utf-8 text
+    tokens: List[str] = []
+    offsets: List[int] = []
+    byte_pos = 0
+    char_pos = 0
+    for m in TOKEN_RE.finditer(text):
+        byte_pos += len(text[char_pos:m.start()].encode("utf-8"))
+        char_pos = m.start()
+        tokens.append(m.group().lower())
+        offsets.append(byte_pos)
+    return tokens, offsets
+
+
+def read_indexable_text(path: str) -> Optional[str]:
+    # None for files that are too big or look binary; raises
+    # UnicodeDecodeError for non-utf-8 text, whose token offsets (computed on
+    # the decoded text) would not match the bytes on disk
+    st = os.stat(path)
+    if not stat.S_ISREG(st.st_mode) or st.st_size > SEARCH_INDEX_MAX_FILE_BYTES:
+        return None
+    with open(path, "rb") as f:
+        data = f.read()
+    if b"\0" in data[:8192]:
+        return None
+    return data.decode("utf-8")
+
+
+class SearchIndex:
+    """
+    In-memory inverted index over the files this service writes (plus any
+    folder indexed through /search/reindex). Postings map token -> {path:
+    [token positions]}; each doc keeps the byte offset of every position so
+    snippets are a single seek+read. Changes mark the index dirty and a
+    background task snapshots it to SEARCH_INDEX_PATH (temp file + rename).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.postings: Dict[str, Dict[str, List[int]]] = {}
+        self.total_tokens = 0
+        self.vocab: Optional[List[str]] = None  # sorted terms for prefix lookups
+        self.dirty = False
+        self.stats = {"indexed": 0, "removed": 0, "skipped": 0, "not_utf8": 0, "queries": 0, "flushes": 0}
+
+    @staticmethod
+    def key(path: str) -> str:
+        return os.path.abspath(path)
+
+    def remove_locked(self, key: str) -> bool:
+        doc = self.docs.pop(key, None)
+        if doc is None:
+            return False
+        for term in doc["terms"]:
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(key, None)
+                if not postings:
+                    del self.postings[term]
+                    self.vocab = None
+        self.total_tokens -= doc["length"]
+        self.dirty = True
+        return True
+
+    def index_file(self, path: str) -> bool:
+        # blocking: (re)index one file; tokenizing happens outside the lock
+        key = self.key(path)
+        if is_partial_upload(key):
+            return False
+        try:
+            st = os.stat(key)
+            text = read_indexable_text(key)
+        except FileNotFoundError:
+            self.remove(key)
+            return False
+        except UnicodeDecodeError:
+            text = None
+            with self.lock:
+                self.stats["not_utf8"] += 1
+        if text is None:
+            with self.lock:
+                self.remove_locked(key)
+                self.stats["skipped"] += 1
+            return False
+
+        tokens, offsets = tokenize(text)
+        positions: Dict[str, List[int]] = {}
+        for pos, token in enumerate(tokens):
+            positions.setdefault(token, []).append(pos)
+
+        with self.lock:
+            self.remove_locked(key)
+            for term, plist in positions.items():
+                postings = self.postings.get(term)
+                if postings is None:
+                    postings = self.postings[term] = {}
+                    self.vocab = None
+                postings[key] = plist
+            self.docs[key] = {
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "length": len(tokens),
+                "offsets": offsets,
+                "terms": list(positions),
+            }
+            self.total_tokens += len(tokens)
+            self.stats["indexed"] += 1
+            self.dirty = True
+        return True
+
+    def remove(self, path: str):
+        with self.lock:
+            if self.remove_locked(self.key(path)):
+                self.stats["removed"] += 1
+
+    def reindex_folder(self, folder: str, recursive: bool = False) -> Dict[str, int]:
+        indexed = skipped = 0
+        root = self.key(folder)
+        for dir_path, dir_names, file_names in os.walk(root):
+            for name in file_names:
+                if self.index_file(os.path.join(dir_path, name)):
+                    indexed += 1
+                else:
+                    skipped += 1
+            if not recursive:
+                break
+        return {"indexed": indexed, "skipped": skipped}
+
+    def reconcile(self):
+        # after loading a snapshot: drop vanished files, reindex changed ones
+        with self.lock:
+            known = {key: (doc["size"], doc["mtime_ns"]) for key, doc in self.docs.items()}
+        for key, (size, mtime_ns) in known.items():
+            try:
+                st = os.stat(key)
+            except FileNotFoundError:
+                self.remove(key)
+                continue
+            if st.st_size != size or st.st_mtime_ns != mtime_ns:
+                self.index_file(key)
+
+    # ---------------- querying ----------------
+
+    def expand_prefix_locked(self, prefix: str) -> List[str]:
+        if self.vocab is None:
+            self.vocab = sorted(self.postings)
+        start = bisect.bisect_left(self.vocab, prefix)
+        terms = []
+        for term in self.vocab[start:start + SEARCH_MAX_PREFIX_TERMS]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def clause_matches_locked(self, clause: Tuple[str, List[str]]) -> Dict[str, Tuple[int, int]]:
+        # doc -> (match count, first matching position)
+        kind, tokens = clause
+        if kind == "prefix":
+            hits: Dict[str, Tuple[int, int]] = {}
+            for term in self.expand_prefix_locked(tokens[0]):
+                for key, plist in self.postings[term].items():
+                    count, first = hits.get(key, (0, plist[0]))
+                    hits[key] = (count + len(plist), min(first, plist[0]))
+            return hits
+        if len(tokens) == 1:
+            return {key: (len(plist), plist[0]) for key, plist in self.postings.get(tokens[0], {}).items()}
+
+        # phrase: positions of the first token where the rest follow in order
+        lists = [self.postings.get(t) for t in tokens]
+        if any(p is None for p in lists):
+            return {}
+        candidates = set(lists[0])
+        for p in lists[1:]:
+            candidates &= p.keys()
+        hits = {}
+        for key in candidates:
+            following = [set(p[key]) for p in lists[1:]]
+            starts = [
+                pos for pos in lists[0][key]
+                if all(pos + i + 1 in s for i, s in enumerate(following))
+            ]
+            if starts:
+                hits[key] = (len(starts), starts[0])
+        return hits
+
+    def search(self, query: str, folder: Optional[str] = None, limit: int = 10) -> Dict[str, Any]:
+        clauses: List[Tuple[str, List[str]]] = []
+        for phrase, word in QUERY_RE.findall(query):
+            if phrase:
+                tokens, _ = tokenize(phrase)
+                if tokens:
+                    clauses.append(("phrase", tokens))
+            elif word.endswith("*") and len(word) > 1:
+                tokens, _ = tokenize(word[:-1])
+                if tokens:
+                    # "foo-ba*" -> foo AND ba*
+                    clauses.extend(("phrase", [t]) for t in tokens[:-1])
+                    clauses.append(("prefix", tokens[-1:]))
+            else:
+                tokens, _ = tokenize(word)
+                if tokens:
+                    clauses.append(("phrase", tokens))
+        if not clauses:
+            raise HTTPException(status_code=400, detail="Empty search query")
+
+        scope = self.key(folder) + os.sep if folder else None
+        with self.lock:
+            self.stats["queries"] += 1
+            n_docs = len(self.docs) or 1
+            avg_len = (self.total_tokens / n_docs) or 1.0
+            scores: Dict[str, float] = {}
+            first_pos: Dict[str, int] = {}
+            for i, clause in enumerate(clauses):
+                hits = self.clause_matches_locked(clause)
+                if scope:
+                    hits = {k: v for k, v in hits.items() if k.startswith(scope)}
+                idf = math.log(1 + (n_docs - len(hits) + 0.5) / (len(hits) + 0.5))
+                matched = hits.keys() if i == 0 else scores.keys() & hits.keys()
+                next_scores: Dict[str, float] = {}
+                for key in matched:
+                    tf, pos = hits[key]
+                    norm = 1 - BM25_B + BM25_B * self.docs[key]["length"] / avg_len
+                    next_scores[key] = scores.get(key, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * norm)
+                    first_pos[key] = min(first_pos.get(key, pos), pos)
+                scores = next_scores
+                if not scores:
+                    break
+
+            ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+            top = [(key, score, self.docs[key]["offsets"][first_pos[key]]) for key, score in ranked[:limit]]
+
+        results = []
+        for key, score, offset in top:
+            results.append({
+                "path": os.path.relpath(key),
+                "score": round(score, 4),
+                "offset": offset,
+                "snippet": self.snippet(key, offset),
+            })
+        return {"query": query, "total": len(scores), "results": results}
+
+    @staticmethod
+    def snippet(key: str, offset: int) -> str:
+        start = max(0, offset - SEARCH_SNIPPET_BYTES // 2)
+        try:
+            with open(key, "rb") as f:
+                f.seek(start)
+                data = f.read(SEARCH_SNIPPET_BYTES)
+        except OSError:
+            return ""
+        text = " ".join(data.decode("utf-8", errors="ignore").split())
+        return ("…" if start > 0 else "") + text + ("…" if len(data) == SEARCH_SNIPPET_BYTES else "")
+
+    # ---------------- persistence ----------------
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning("[search] ignoring unreadable index snapshot %s: %s", self.path, e)
+            return
+        with self.lock:
+            self.docs = data.get("docs", {})
+            self.postings = data.get("postings", {})
+            self.total_tokens = sum(doc["length"] for doc in self.docs.values())
+            self.vocab = None
+            self.dirty = False
+        logger.info("[search] loaded %d docs from %s", len(self.docs), self.path)
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            if not self.dirty:
+                return
+            # position lists and doc entries are replaced, never mutated in
+            # place, so copying the two dict levels is enough to serialize
+            # without holding the lock
+            docs = dict(self.docs)
+            postings = {term: dict(plist) for term, plist in self.postings.items()}
+            self.dirty = False
+        try:
+            data = json.dumps({"version": 1, "docs": docs, "postings": postings})
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            with self.lock:
+                self.dirty = True
+            raise
+        with self.lock:
+            self.stats["flushes"] += 1
+
+    async def flush_loop(self):
+        while True:
+            await asyncio.sleep(SEARCH_INDEX_FLUSH_SECONDS)
+            try:
+                await asyncio.to_thread(self.save)
+            except Exception as e:
+                logger.warning("[search] snapshot failed: %s", e)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "enabled": SEARCH_INDEX_ENABLED,
+                "path": self.path or None,
+                "docs": len(self.docs),
+                "terms": len(self.postings),
+                "tokens": self.total_tokens,
+                "dirty": self.dirty,
+                **self.stats,
+            }
+
+
+SEARCH_INDEX = SearchIndex(SEARCH_INDEX_PATH)
+search_tasks: List[asyncio.Task] = []
+
+
+def index_written_file(path: str):
+    # called by the file endpoints (in their worker thread) after a write
+    if SEARCH_INDEX_ENABLED:
+        SEARCH_INDEX.index_file(path)
+
+
+def unindex_file(path: str):
+    if SEARCH_INDEX_ENABLED:
+        SEARCH_INDEX.remove(path)
+
+
+@app.on_event("startup")
+async def startup_event():
+    DIR_INDEX.start()
+    if SEARCH_INDEX_ENABLED:
+        await asyncio.to_thread(SEARCH_INDEX.load)
+        search_tasks.append(asyncio.create_task(asyncio.to_thread(SEARCH_INDEX.reconcile)))
+        search_tasks.append(asyncio.create_task(SEARCH_INDEX.flush_loop()))
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    DIR_INDEX.stop()
+    for task in search_tasks:
+        task.cancel()
+    if SEARCH_INDEX_ENABLED:
+        await asyncio.to_thread(SEARCH_INDEX.save)
+
+
+async def folder_listing(folder_name: str) -> List[EntryInfo]:
+    # inotify hits are answered on the event loop; anything that touches the
+    # disk (misses, and every poll-backend lookup, which stats the folder to
+    # validate it) goes to a worker thread
+    if DIR_INDEX.backend == "inotify":
+        entries = DIR_INDEX.get(folder_name)
+        if entries is not None:
+            return entries
+    return await asyncio.to_thread(DIR_INDEX.listing, folder_name)
+
+
 @app.get("/status")
 def read_status():
-    return {"status": "ok"} 
+    return {"status": "ok"}
 
 @app.get("/list-files", response_model=List[str])
-def list_files(folder_name: str):
-    # list files in the specified folder
+async def list_files(folder_name: str):
+    # list files in the specified folder (served from the directory index)
+    try:
+        return [e.name for e in await folder_listing(folder_name)]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/dir-cache/stats")
+def dir_cache_stats():
+    return DIR_INDEX.snapshot()
+
+
+@app.get("/search")
+async def search_files(q: str, folder_name: Optional[str] = None, limit: int = 10):
+    # ranked full-text search; supports "exact phrases" and prefix* terms,
+    # all terms must match. folder_name limits results to that folder tree
+    if not SEARCH_INDEX_ENABLED:
+        raise HTTPException(status_code=503, detail="Search index is disabled")
+    limit = max(1, min(limit, 100))
+    return await asyncio.to_thread(SEARCH_INDEX.search, q, folder_name, limit)
+
+
+@app.post("/search/reindex")
+async def reindex_folder(folder_name: str, recursive: bool = False):
+    # index files that were not written through this service
+    if not SEARCH_INDEX_ENABLED:
+        raise HTTPException(status_code=503, detail="Search index is disabled")
+    if not os.path.isdir(folder_name):
+        raise HTTPException(status_code=404, detail=f"Folder not found: {folder_name}")
+    try:
+        return await asyncio.to_thread(SEARCH_INDEX.reindex_folder, folder_name, recursive)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/search/stats")
+def search_stats():
+    return SEARCH_INDEX.snapshot()
+
+# ---------------------------------------------------------------------------
+# Paginated listing (scandir walk, sorted depth-first, cursor = last path)
+# ---------------------------------------------------------------------------
+
+LIST_DEFAULT_LIMIT = 1000
+LIST_MAX_LIMIT = 10000
+LIST_BATCH_SIZE = 500
+
+
+def encode_cursor(parts: Tuple[str, ...]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(parts)).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, ...]:
     try:
-        import os
-        files = os.listdir(folder_name)
-        return files
+        return tuple(json.loads(base64.urlsafe_b64decode(cursor.encode())))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def walk_entries(
+    root: str,
+    after: Tuple[str, ...] = (),
+    recursive: bool = False,
+    max_depth: Optional[int] = None,
+    pattern: Optional[str] = None,
+) -> Iterator[Tuple[Tuple[str, ...], Dict[str, Any]]]:
+    """
+    Depth-first walk with each directory's entries sorted by name, which makes
+    the walk order the sort order of the path component tuples. Resuming after
+    a cursor therefore only has to skip subtrees that sort entirely before it.
+    Directory reads go through DIR_INDEX, so repeated walks are served from
+    memory.
+    """
+
+    def visit(dir_path: str, prefix: Tuple[str, ...], depth: int):
+        for entry in DIR_INDEX.listing(dir_path):
+            parts = prefix + (entry.name,)
+            is_ancestor_of_cursor = parts == after[:len(parts)] and len(parts) < len(after)
+            if parts <= after and not is_ancestor_of_cursor:
+                continue
+
+            rel_path = "/".join(parts)
+
+            if not is_ancestor_of_cursor:
+                target = rel_path if pattern and "/" in pattern else entry.name
+                if not pattern or fnmatch.fnmatch(target, pattern):
+                    yield parts, {"path": rel_path, **entry._asdict()}
+
+            if recursive and entry.type == "dir" and (max_depth is None or depth < max_depth):
+                yield from visit(os.path.join(dir_path, entry.name), parts, depth + 1)
+
+    yield from visit(root, (), 1)
+
+
+async def iter_listing(
+    folder_name: str,
+    cursor: Optional[str],
+    limit: int,
+    recursive: bool,
+    max_depth: Optional[int],
+    pattern: Optional[str],
+) -> AsyncIterator[Tuple[Optional[Dict[str, Any]], Optional[str]]]:
+    """
+    Runs the walk in worker threads, LIST_BATCH_SIZE entries at a time.
+    Yields (entry, None) per entry, then (None, next_cursor) once.
+    """
+    after = decode_cursor(cursor) if cursor else ()
+    walker = walk_entries(folder_name, after, recursive, max_depth, pattern)
+
+    def next_batch(n: int) -> List[Tuple[Tuple[str, ...], Dict[str, Any]]]:
+        batch = []
+        for item in walker:
+            batch.append(item)
+            if len(batch) >= n:
+                break
+        return batch
+
+    sent = 0
+    last_parts: Optional[Tuple[str, ...]] = None
+    exhausted = False
+    while sent < limit:
+        batch = await asyncio.to_thread(next_batch, min(LIST_BATCH_SIZE, limit - sent))
+        if not batch:
+            exhausted = True
+            break
+        for parts, entry in batch:
+            last_parts = parts
+            sent += 1
+            yield entry, None
+
+    if not exhausted:
+        # peek one more so the last page doesn't hand out a dangling cursor
+        exhausted = not await asyncio.to_thread(next_batch, 1)
+    walker.close()
+    yield None, (None if exhausted or last_parts is None else encode_cursor(last_parts))
+
+
+@app.get("/list-entries")
+async def list_entries(
+    folder_name: str,
+    cursor: Optional[str] = None,
+    limit: int = LIST_DEFAULT_LIMIT,
+    recursive: bool = False,
+    max_depth: Optional[int] = None,
+    pattern: Optional[str] = None,
+    format: str = "json",
+):
+    # paginated listing with per-entry metadata; pass next_cursor back as
+    # cursor to continue. format=ndjson streams one entry per line and ends
+    # with {"end": true, "next_cursor": ...}
+    if not os.path.isdir(folder_name):
+        raise HTTPException(status_code=404, detail=f"Folder not found: {folder_name}")
+    limit = max(1, min(limit, LIST_MAX_LIMIT))
+    listing = iter_listing(folder_name, cursor, limit, recursive, max_depth, pattern)
+
+    if format == "ndjson":
+        async def lines() -> AsyncIterator[str]:
+            async for entry, next_cursor in listing:
+                if entry is not None:
+                    yield json.dumps(entry) + "\n"
+                else:
+                    yield json.dumps({"end": True, "next_cursor": next_cursor}) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    try:
+        entries: List[Dict[str, Any]] = []
+        next_cursor = None
+        async for entry, end_cursor in listing:
+            if entry is not None:
+                entries.append(entry)
+            else:
+                next_cursor = end_cursor
+        return {"entries": entries, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    
+
 @app.post("/create-file/{folder_name}/{file_name}")
-def create_file(folder_name: str, file_name: str, content: str):
+async def create_file(folder_name: str, file_name: str, content: str):
     # create a file with the specified content
-    try:
-        import os
+    def write():
         if not os.path.exists(folder_name):
             os.makedirs(folder_name)
         with open(os.path.join(folder_name, file_name), 'w') as f:
             f.write(content)
+        DIR_INDEX.write_through(folder_name, file_name)
+        index_written_file(os.path.join(folder_name, file_name))
+
+    try:
+        await asyncio.to_thread(write)
         return {"message": "File created successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    
+
 @app.delete("/delete-file/{folder_name}/{file_name}")
-def delete_file(folder_name: str, file_name: str):
+async def delete_file(folder_name: str, file_name: str):
     # delete the specified file
-    try:
-        import os
+    def remove():
         os.remove(os.path.join(folder_name, file_name))
+        DIR_INDEX.write_through(folder_name, file_name)
+        unindex_file(os.path.join(folder_name, file_name))
+
+    try:
+        await asyncio.to_thread(remove)
         return {"message": "File deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    
+
+
+@app.put("/upload-file/{folder_name}/{file_name}")
+async def upload_file(folder_name: str, file_name: str, request: Request):
+    # stream the raw request body to disk chunk by chunk; the file appears
+    # atomically (temp file + rename) once the whole body has been written
+    path = resolve_file_path(folder_name, file_name)
+    tmp_path = partial_upload_path(path)
+    written = 0
+    renamed = False
+
+    try:
+        await asyncio.to_thread(os.makedirs, folder_name, exist_ok=True)
+        f = await asyncio.to_thread(open, tmp_path, "wb")
+        try:
+            async for chunk in request.stream():
+                if chunk:
+                    await asyncio.to_thread(f.write, chunk)
+                    written += len(chunk)
+        finally:
+            await asyncio.to_thread(f.close)
+        await asyncio.to_thread(os.replace, tmp_path, path)
+        renamed = True
+        await asyncio.to_thread(DIR_INDEX.write_through, folder_name, file_name)
+        await asyncio.to_thread(index_written_file, path)
+        return {"message": "File uploaded successfully", "bytes": written}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # also on CancelledError (client gone mid-upload)
+        if not renamed:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+
+
+# ---------------------------------------------------------------------------
+# Reads (Range requests, head/tail), served from an mmap of the file
+# ---------------------------------------------------------------------------
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+DEFAULT_HEAD_TAIL_LINES = 10
+
+
+class MappedFile:
+    """Read-only mmap of a file; slices come straight from the page cache."""
+
+    def __init__(self, path: str):
+        self.f = open(path, "rb")
+        try:
+            self.size = os.fstat(self.f.fileno()).st_size
+            self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        except Exception:
+            self.f.close()
+            raise
+
+    def advise_sequential(self):
+        if self.mm is not None and hasattr(self.mm, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+            self.mm.madvise(mmap.MADV_SEQUENTIAL)
+
+    def read(self, start: int, end: int) -> bytes:
+        return self.mm[start:end] if self.mm is not None else b""
+
+    def head_lines(self, lines: int) -> int:
+        # end offset just past the Nth newline (or EOF)
+        pos = 0
+        for _ in range(lines):
+            nl = self.mm.find(b"\n", pos)
+            if nl < 0:
+                return self.size
+            pos = nl + 1
+        return pos
+
+    def tail_lines(self, lines: int) -> int:
+        # start offset of the last N lines (a trailing newline doesn't count)
+        if lines <= 0:
+            return self.size
+        end = self.size - 1 if self.mm[self.size - 1:self.size] == b"\n" else self.size
+        for _ in range(lines):
+            nl = self.mm.rfind(b"\n", 0, end)
+            if nl < 0:
+                return 0
+            end = nl
+        return end + 1
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+        self.f.close()
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Single byte range -> (start, end_exclusive). None means serve the whole
+    file (no header, or a multi-range request we choose to ignore).
+    """
+    m = RANGE_RE.match(header.strip())
+    if not m:
+        return None
+    first, last = m.groups()
+    if first:
+        start = int(first)
+        end = min(int(last) + 1, size) if last else size
+    elif last:
+        start, end = max(size - int(last), 0), size
+    else:
+        return None
+    if start >= size or start >= end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+def head_tail_span(mapped: MappedFile, mode: str, lines: Optional[int], max_bytes: Optional[int]) -> Tuple[int, int]:
+    size = mapped.size
+    if size == 0:
+        return 0, 0
+    if lines is None and max_bytes is None:
+        lines = DEFAULT_HEAD_TAIL_LINES
+    if mode == "head":
+        end = mapped.head_lines(lines) if lines is not None else size
+        if max_bytes is not None:
+            end = min(end, max_bytes)
+        return 0, end
+    start = mapped.tail_lines(lines) if lines is not None else 0
+    if max_bytes is not None:
+        start = max(start, size - max_bytes)
+    return start, size
+
+
+async def iter_mapped(mapped: MappedFile, start: int, end: int, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    # page faults happen in the worker thread, not on the event loop
+    try:
+        pos = start
+        while pos < end:
+            chunk = await asyncio.to_thread(mapped.read, pos, min(pos + chunk_size, end))
+            pos += len(chunk)
+            yield chunk
+    finally:
+        await asyncio.to_thread(mapped.close)
+
+
+async def serve_file(
+    path: str,
+    request: Request,
+    media_type: str,
+    disposition: Optional[str] = None,
+    mode: Optional[str] = None,
+    lines: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+) -> StreamingResponse:
+    """
+    Stream [start, end) of a file. head/tail mode picks the span from the
+    file's lines/bytes; otherwise a Range header yields a 206 partial response.
+    Only the requested bytes are ever touched.
+    """
+    try:
+        mapped = await asyncio.to_thread(MappedFile, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"File not found: {path}")
+    except IsADirectoryError:
+        raise HTTPException(status_code=400, detail=f"Not a file: {path}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    size = mapped.size
+    status_code = 200
+    headers = {"Accept-Ranges": "bytes", "X-File-Size": str(size)}
+    try:
+        if mode:
+            start, end = await asyncio.to_thread(head_tail_span, mapped, mode, lines, max_bytes)
+        else:
+            span = parse_range(request.headers.get("range", ""), size)
+            start, end = span or (0, size)
+            if span:
+                status_code = 206
+                headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+            else:
+                mapped.advise_sequential()
+    except BaseException:
+        await asyncio.to_thread(mapped.close)
+        raise
+
+    start = min(start, end)
+    headers["Content-Length"] = str(end - start)
+    if disposition:
+        headers["Content-Disposition"] = disposition
+    return StreamingResponse(iter_mapped(mapped, start, end), status_code=status_code, media_type=media_type, headers=headers)
+
+
+@app.get("/read-file/{folder_name}/{file_name}")
+async def read_file(
+    folder_name: str,
+    file_name: str,
+    request: Request,
+    mode: Optional[Literal["head", "tail"]] = None,
+    lines: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+):
+    # read a file's contents; honours Range headers, or mode=head|tail with
+    # lines and/or max_bytes (default: 10 lines) for peeking at logs
+    path = resolve_file_path(folder_name, file_name)
+    if (lines is not None and lines < 0) or (max_bytes is not None and max_bytes < 0):
+        raise HTTPException(status_code=400, detail="lines and max_bytes must be >= 0")
+    media_type = mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+    return await serve_file(path, request, media_type, mode=mode, lines=lines, max_bytes=max_bytes)
+
+
+@app.get("/download-file/{folder_name}/{file_name}")
+async def download_file(folder_name: str, file_name: str, request: Request):
+    # stream the file back without loading it into memory (resumable via Range)
+    path = resolve_file_path(folder_name, file_name)
+    return await serve_file(
+        path,
+        request,
+        "application/octet-stream",
+        disposition=f'attachment; filename="{file_name}"',
+    )
+
+# ---------------------------------------------------------------------------
+# Batch file operations
+# ---------------------------------------------------------------------------
+
+BATCH_MAX_OPERATIONS = int(os.getenv("BATCH_MAX_OPERATIONS", "10000"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+
+
+class BatchOperation(BaseModel):
+    op: Literal["create", "append", "delete", "move"]
+    folder_name: str
+    file_name: str
+    content: Optional[str] = None           # create / append
+    dest_folder_name: Optional[str] = None  # move
+    dest_file_name: Optional[str] = None    # move
+
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+    atomic: bool = False
+    max_concurrency: Optional[int] = None
+
+
+def batch_op_paths(op: BatchOperation) -> List[str]:
+    # every path the op touches, absolute so aliases like ./d/a and d/a compare
+    # equal; raises HTTPException(400) for bad names
+    paths = [os.path.abspath(resolve_file_path(op.folder_name, op.file_name))]
+    if op.op == "move":
+        if not op.dest_folder_name or not op.dest_file_name:
+            raise HTTPException(status_code=400, detail="move needs dest_folder_name and dest_file_name")
+        paths.append(os.path.abspath(resolve_file_path(op.dest_folder_name, op.dest_file_name)))
+    elif op.op in ("create", "append") and op.content is None:
+        raise HTTPException(status_code=400, detail=f"{op.op} needs content")
+    return paths
+
+
+def note_file_changed(path: str):
+    # keep the directory index and search index in step with a change
+    folder, name = os.path.split(path)
+    DIR_INDEX.write_through(folder, name)
+    index_written_file(path)
+
+
+def apply_batch_op(op: BatchOperation, paths: List[str]):
+    # blocking: perform one operation directly (non-atomic mode)
+    path = paths[0]
+    if op.op in ("create", "append"):
+        os.makedirs(op.folder_name, exist_ok=True)
+        with open(path, "w" if op.op == "create" else "a") as f:
+            f.write(op.content)
+    elif op.op == "delete":
+        os.remove(path)
+    else:
+        os.makedirs(op.dest_folder_name, exist_ok=True)
+        os.replace(path, paths[1])
+    for changed in paths:
+        note_file_changed(changed)
+
+
+def batch_result(index: int, op: BatchOperation, status: str, detail: Optional[str] = None) -> Dict[str, Any]:
+    result = {"index": index, "op": op.op, "path": os.path.join(op.folder_name, op.file_name), "status": status}
+    if detail:
+        result["detail"] = detail
+    return result
+
+
+async def run_batch_concurrently(ops: List[BatchOperation], max_concurrency: int) -> List[Dict[str, Any]]:
+    """
+    Independent paths run in parallel (bounded by a semaphore); operations on
+    the same path keep their request order. Before anything is awaited each op
+    gets a "done" future and the futures of the previous ops on its paths, so
+    the ordering is fixed by the request, not by when tasks reach a lock.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    loop = asyncio.get_running_loop()
+    last_on_path: Dict[str, asyncio.Future] = {}
+
+    async def run(index: int, op: BatchOperation, paths: List[str],
+                  after: List[asyncio.Future], done: asyncio.Future) -> Dict[str, Any]:
+        try:
+            if after:
+                await asyncio.wait(after)
+            async with semaphore:
+                try:
+                    await asyncio.to_thread(apply_batch_op, op, paths)
+                    return batch_result(index, op, "ok")
+                except Exception as e:
+                    return batch_result(index, op, "error", str(e))
+        finally:
+            done.set_result(None)
+
+    tasks = []
+    for index, op in enumerate(ops):
+        try:
+            paths = batch_op_paths(op)
+        except HTTPException as e:
+            tasks.append(asyncio.sleep(0, batch_result(index, op, "error", e.detail)))
+            continue
+        done = loop.create_future()
+        after = []
+        for path in set(paths):
+            previous = last_on_path.get(path)
+            if previous is not None and previous not in after:
+                after.append(previous)
+            last_on_path[path] = done
+        tasks.append(run(index, op, paths, after, done))
+
+    return await asyncio.gather(*tasks)
+
+
+class PlannedFile:
+    """Final state of one path after replaying the batch in memory."""
+
+    def __init__(self, exists: bool, base: Optional[str] = None, chunks: Optional[List[str]] = None):
+        self.exists = exists
+        self.base = base            # existing file whose bytes come first
+        self.chunks = chunks or []  # text appended after base
+        self.staged: Optional[str] = None
+
+
+class AtomicBatch:
+    """
+    All-or-nothing execution:
+      1. plan: replay the ops in memory to get each touched path's final state
+         (any failing op aborts before the disk is touched)
+      2. stage: write every final file into a staging dir inside its target
+         folder (in parallel, bounded), so commits are same-filesystem renames
+      3. commit: move current files aside into the staging dir, rename staged
+         files into place; on any error undo the renames in reverse order
+    """
+
+    def __init__(self, ops: List[BatchOperation]):
+        self.ops = ops
+        self.batch_id = uuid.uuid4().hex
+        self.plan: Dict[str, PlannedFile] = {}
+        self.staging_dirs: Dict[str, str] = {}
+
+    def current(self, path: str) -> PlannedFile:
+        if path not in self.plan:
+            exists = os.path.isfile(path)
+            return PlannedFile(exists, base=path if exists else None)
+        return self.plan[path]
+
+    def plan_ops(self) -> List[Dict[str, Any]]:
+        results = []
+        failed = False
+        for index, op in enumerate(self.ops):
+            if failed:
+                results.append(batch_result(index, op, "skipped"))
+                continue
+            try:
+                paths = batch_op_paths(op)
+                state = self.current(paths[0])
+                if op.op == "create":
+                    self.plan[paths[0]] = PlannedFile(True, chunks=[op.content])
+                elif op.op == "append":
+                    self.plan[paths[0]] = PlannedFile(True, state.base, state.chunks + [op.content])
+                elif not state.exists:
+                    raise FileNotFoundError(f"No such file: {paths[0]}")
+                elif op.op == "delete":
+                    self.plan[paths[0]] = PlannedFile(False)
+                elif paths[0] == paths[1]:
+                    pass  # moving a file onto itself leaves it as it is
+                else:
+                    self.plan[paths[1]] = PlannedFile(True, state.base, list(state.chunks))
+                    self.plan[paths[0]] = PlannedFile(False)
+                results.append(batch_result(index, op, "ok"))
+            except HTTPException as e:
+                failed = True
+                results.append(batch_result(index, op, "error", e.detail))
+            except Exception as e:
+                failed = True
+                results.append(batch_result(index, op, "error", str(e)))
+        return results
+
+    def staging_dir(self, path: str) -> str:
+        folder = os.path.dirname(path) or "."
+        if folder not in self.staging_dirs:
+            staging = os.path.join(folder, f".batch-{self.batch_id}")
+            os.makedirs(staging)
+            self.staging_dirs[folder] = staging
+        return self.staging_dirs[folder]
+
+    def prepare_staging(self):
+        # blocking: create target folders and staging dirs up front, in order
+        for path in self.plan:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.staging_dir(path)
+
+    def stage(self, path: str):
+        # blocking: materialise one path's final content
+        planned = self.plan[path]
+        if not planned.exists:
+            return
+        staged = os.path.join(self.staging_dir(path), uuid.uuid4().hex)
+        if planned.base is not None:
+            shutil.copyfile(planned.base, staged)
+        with open(staged, "a") as f:
+            for chunk in planned.chunks:
+                f.write(chunk)
+        planned.staged = staged
+
+    def commit(self):
+        # blocking: only renames from here on
+        undo: List[Tuple[str, str]] = []  # (src, dst) renames to reverse
+        try:
+            for path, planned in self.plan.items():
+                if os.path.exists(path):
+                    backup = os.path.join(self.staging_dir(path), f"backup-{uuid.uuid4().hex}")
+                    os.replace(path, backup)
+                    undo.append((path, backup))
+                if planned.staged is not None:
+                    os.replace(planned.staged, path)
+                    undo.append((planned.staged, path))
+        except Exception:
+            for src, dst in reversed(undo):
+                os.replace(dst, src)
+            raise
+
+    def cleanup(self):
+        for staging in self.staging_dirs.values():
+            shutil.rmtree(staging, ignore_errors=True)
+
+    async def run(self, max_concurrency: int) -> Tuple[bool, List[Dict[str, Any]]]:
+        results = await asyncio.to_thread(self.plan_ops)
+        if any(r["status"] != "ok" for r in results):
+            for r in results:
+                if r["status"] == "ok":
+                    r["status"] = "skipped"
+            return False, results
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def stage(path: str):
+            async with semaphore:
+                await asyncio.to_thread(self.stage, path)
+
+        try:
+            await asyncio.to_thread(self.prepare_staging)
+            await asyncio.gather(*(stage(path) for path in self.plan))
+            await asyncio.to_thread(self.commit)
+        except Exception as e:
+            for r in results:
+                r["status"] = "rolled_back"
+                r["detail"] = str(e)
+            return False, results
+        finally:
+            await asyncio.to_thread(self.cleanup)
+
+        for path in self.plan:
+            await asyncio.to_thread(note_file_changed, path)
+        return True, results
+
+
+@app.post("/batch")
+async def batch_operations(payload: BatchRequest):
+    # run many create/append/delete/move operations in one request;
+    # results come back in request order. atomic=true applies all or none
+    ops = payload.operations
+    if len(ops) > BATCH_MAX_OPERATIONS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_OPERATIONS} operations per batch")
+    max_concurrency = max(1, min(payload.max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+
+    if payload.atomic:
+        committed, results = await AtomicBatch(ops).run(max_concurrency)
+    else:
+        results = await run_batch_concurrently(ops, max_concurrency)
+        committed = all(r["status"] == "ok" for r in results)
+
+    body = {
+        "atomic": payload.atomic,
+        "committed": committed,
+        "succeeded": sum(r["status"] == "ok" for r in results),
+        "failed": sum(r["status"] == "error" for r in results),
+        "results": results,
+    }
+    if payload.atomic and not committed:
+        return JSONResponse(status_code=409, content=body)
+    return body
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=6001, log_level="info", reload=True)
\ No newline at end of file
+    uvicorn.run("main:app", host="0.0.0.0", port=6001, log_level="info", reload=True)
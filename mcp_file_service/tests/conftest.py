@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+# no snapshot file, no background tasks; the app is used without its lifespan
+os.environ.setdefault("SEARCH_INDEX_PATH", "")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # folder names in requests are relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    return TestClient(main.app)
@@ -0,0 +1,38 @@
+import pytest
+
+
+def move_onto_itself(folder: str, dest_folder: str):
+    return {
+        "op": "move",
+        "folder_name": folder,
+        "file_name": "a.txt",
+        "dest_folder_name": dest_folder,
+        "dest_file_name": "a.txt",
+    }
+
+
+@pytest.mark.parametrize("atomic", [True, False])
+@pytest.mark.parametrize("dest_folder", ["d", "./d"])
+def test_move_onto_itself_keeps_the_file(client, tmp_path, atomic, dest_folder):
+    (tmp_path / "d").mkdir()
+    (tmp_path / "d" / "a.txt").write_text("keep me")
+
+    resp = client.post("/batch", json={"atomic": atomic, "operations": [move_onto_itself("d", dest_folder)]})
+
+    assert resp.status_code == 200
+    assert resp.json()["committed"] is True
+    assert (tmp_path / "d" / "a.txt").read_text() == "keep me"
+
+
+def test_same_path_ops_run_in_request_order(client, tmp_path):
+    ops = [
+        {"op": "create", "folder_name": "d", "file_name": "A", "content": "first"},
+        {"op": "move", "folder_name": "d", "file_name": "A", "dest_folder_name": "d", "dest_file_name": "B"},
+        {"op": "create", "folder_name": "d", "file_name": "B", "content": "second"},
+    ]
+
+    resp = client.post("/batch", json={"operations": ops})
+
+    assert [r["status"] for r in resp.json()["results"]] == ["ok", "ok", "ok"]
+    assert sorted(p.name for p in (tmp_path / "d").iterdir()) == ["B"]
+    assert (tmp_path / "d" / "B").read_text() == "second"
@@ -0,0 +1,22 @@
+import pytest
+
+
+@pytest.mark.parametrize("content", ["line1\nline2", "line1\nline2\n"])
+def test_tail_zero_lines_is_empty(client, tmp_path, content):
+    (tmp_path / "e").mkdir()
+    (tmp_path / "e" / "n.txt").write_text(content)
+
+    resp = client.get("/read-file/e/n.txt", params={"mode": "tail", "lines": 0})
+
+    assert resp.status_code == 200
+    assert resp.headers["content-length"] == "0"
+    assert resp.content == b""
+
+
+def test_tail_last_line_without_trailing_newline(client, tmp_path):
+    (tmp_path / "e").mkdir()
+    (tmp_path / "e" / "n.txt").write_text("line1\nline2")
+
+    resp = client.get("/read-file/e/n.txt", params={"mode": "tail", "lines": 1})
+
+    assert resp.content == b"line2"
@@ -0,0 +1,28 @@
+import main
+
+
+def test_non_utf8_files_are_skipped(client, tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "latin1.txt").write_bytes("café needle".encode("latin-1"))
+    (docs / "utf8.txt").write_text("café needle", encoding="utf-8")
+    not_utf8 = main.SEARCH_INDEX.stats["not_utf8"]
+
+    resp = client.post("/search/reindex", params={"folder_name": "docs"})
+
+    assert resp.json() == {"indexed": 1, "skipped": 1}
+    assert main.SEARCH_INDEX.stats["not_utf8"] == not_utf8 + 1
+    hits = client.get("/search", params={"q": "needle", "folder_name": "docs"}).json()["results"]
+    assert [hit["path"].rsplit("/", 1)[-1] for hit in hits] == ["utf8.txt"]
+
+
+def test_offsets_point_at_the_token_bytes(client, tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    data = "héllo wörld — needle".encode("utf-8")
+    (docs / "a.txt").write_bytes(data)
+
+    client.post("/search/reindex", params={"folder_name": "docs"})
+    hit = client.get("/search", params={"q": "needle", "folder_name": "docs"}).json()["results"][0]
+
+    assert data[hit["offset"]:hit["offset"] + len(b"needle")] == b"needle"
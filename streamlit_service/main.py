@@ -1,14 +1,14 @@
 import streamlit as st
 import requests
-from typing import List, Dict, Any
+import json
+import uuid
+from typing import Iterator, List, Dict, Any
 
 # ===========================
 # Config (adjust if needed)
 # ===========================
 
 DEFAULT_AGENTHOST_URL = "http://localhost:8000"
-DEFAULT_LITELLM_URL = "http://localhost:4100"
-DEFAULT_LITELLM_API_KEY = "sk-litellm-hub-local-123"
 
 
 # ===========================
@@ -19,12 +19,13 @@ def get_agenthost_base_url() -> str:
     return st.session_state.get("agenthost_url", DEFAULT_AGENTHOST_URL).rstrip("/")
 
 
-def get_litellm_base_url() -> str:
-    return st.session_state.get("litellm_url", DEFAULT_LITELLM_URL).rstrip("/")
-
-
-def get_litellm_api_key() -> str:
-    return st.session_state.get("litellm_api_key", DEFAULT_LITELLM_API_KEY)
+def get_session_id(key: str) -> str:
+    """
+    Server-side conversation id for one chat tab (AgentHost keeps the history).
+    """
+    if key not in st.session_state:
+        st.session_state[key] = uuid.uuid4().hex
+    return st.session_state[key]
 
 
 @st.cache_data(show_spinner=False)
@@ -66,59 +67,67 @@ def call_agenthost_query(
     user_query: str,
     routing_mode: str,
     selected_agent: str | None,
-) -> str:
+    session_id: str,
+) -> Iterator[str]:
+    """
+    Streams the reply from AgentHost /agenthost/query/stream (NDJSON events),
+    yielding text chunks as the composer produces them.
+    Only the new message is sent; AgentHost keeps the history per session_id.
+    """
     payload = {
         "user_query": user_query,
         "routing_mode": routing_mode,
         "selected_agent": selected_agent,
+        "session_id": session_id,
     }
+    yield from stream_agenthost_events(f"{agenthost_url}/agenthost/query/stream", payload)
+
+
+def stream_agenthost_events(url: str, payload: Dict[str, Any]) -> Iterator[str]:
+    """
+    POST to an AgentHost NDJSON stream endpoint and yield the token chunks.
+    """
     try:
-        resp = requests.post(
-            f"{agenthost_url}/agenthost/query",
+        with requests.post(
+            url,
             json=payload,
+            headers={"X-AgentHost-Priority": "interactive"},
+            stream=True,
             timeout=30,
-        )
-        resp.raise_for_status()
-        data = resp.json()
-        return data.get("reply", "(no reply field)")
+        ) as resp:
+            if resp.status_code in (429, 503):
+                # AgentHost is shedding load; tell the user when to try again
+                retry_after = resp.headers.get("Retry-After", "a few")
+                yield f"[AgentHost busy] Too many requests right now, please retry in {retry_after} s."
+                return
+            resp.raise_for_status()
+            for line in resp.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event.get("type") == "token":
+                    yield event.get("content", "")
     except Exception as e:
-        return f"[AgentHost error] {e}"
+        yield f"[AgentHost error] {e}"
 
 
 def call_direct_llm_chat(
-    litellm_url: str,
-    api_key: str,
+    agenthost_url: str,
     model: str,
     user_query: str,
-    history: list[dict[str, str]] | None = None,
-) -> str:
+    session_id: str,
+) -> Iterator[str]:
     """
-    Simple direct chat with LiteLLM /v1/chat/completions
-    history: list of {"role": "user"/"assistant", "content": "..."}
+    Plain chat with one model via AgentHost /agenthost/chat/stream.
+    Only the new message is sent; AgentHost keeps the (token-budgeted)
+    history per session_id.
     """
-    messages = [{"role": "system", "content": "You are a helpful assistant."}]
-    if history:
-        messages.extend(history)
-    messages.append({"role": "user", "content": user_query})
-
     payload = {
         "model": model,
-        "messages": messages,
-        "max_tokens": 256,
+        "message": user_query,
+        "session_id": session_id,
     }
-
-    try:
-        resp = requests.post(
-            f"{litellm_url}/v1/chat/completions",
-            json=payload,
-            headers={"Authorization": f"Bearer {api_key}"},
-            timeout=30,
-        )
-        resp.raise_for_status()
-        data = resp.json()
-        return data["choices"][0]["message"]["content"]
-    except Exception as e:
-        return f"[LiteLLM error] {e}"
+    yield from stream_agenthost_events(f"{agenthost_url}/agenthost/chat/stream", payload)
 
 
 # ===========================
@@ -139,27 +148,18 @@ with st.sidebar:
     )
     st.session_state["agenthost_url"] = agenthost_url
 
-    litellm_url = st.text_input(
-        "LiteLLM URL",
-        value=st.session_state.get("litellm_url", DEFAULT_LITELLM_URL),
-        help="Base URL of LiteLLM proxy",
-    )
-    st.session_state["litellm_url"] = litellm_url
-
-    litellm_api_key = st.text_input(
-        "LiteLLM API Key",
-        value=st.session_state.get("litellm_api_key", DEFAULT_LITELLM_API_KEY),
-        help="API key used to call LiteLLM",
-        type="password",
-    )
-    st.session_state["litellm_api_key"] = litellm_api_key
-
     st.markdown("---")
     if st.button("🔄 Refresh Agents & LLM Models"):
         fetch_agents.clear()
         fetch_llm_models.clear()
         st.rerun()
 
+    if st.button("🧹 New conversation"):
+        # fresh server-side sessions; the old ones stay on AgentHost
+        for key in ("agenthost_history", "llm_history", "agenthost_session_id", "llm_session_id"):
+            st.session_state.pop(key, None)
+        st.rerun()
+
 # Load agents & models
 agents = fetch_agents(get_agenthost_base_url())
 agent_names = [a["agent_name"] for a in agents]
@@ -170,7 +170,7 @@ llm_models = fetch_llm_models(get_agenthost_base_url())
 if "agenthost_history" not in st.session_state:
     st.session_state["agenthost_history"] = []  # list of (role, content)
 if "llm_history" not in st.session_state:
-    st.session_state["llm_history"] = []       # list of {"role": "...", "content": "..."}
+    st.session_state["llm_history"] = []       # list of {"role": "...", "content": "..."}, display only
 
 tab_agenthost, tab_llm = st.tabs(["🤖 AgentHost Chat", "🧩 Direct LLM Chat"])
 
@@ -182,16 +182,22 @@ with tab_agenthost:
     st.subheader("🤖 AgentHost Chat (Agents + Routing + Composer)")
 
     # Agent selection
-    agent_options = ["Any (auto)"] + agent_names
+    agent_options = ["Any (auto)", "Several (multi)"] + agent_names
     selected_agent_option = st.selectbox(
         "Select Agent",
         options=agent_options,
-        help="Choose 'Any (auto)' to let AgentHost decide, or pick a specific agent (manual mode).",
+        help=(
+            "Choose 'Any (auto)' to let AgentHost decide, 'Several (multi)' to let it "
+            "run multiple agents in parallel, or pick a specific agent (manual mode)."
+        ),
     )
 
     if selected_agent_option == "Any (auto)":
         routing_mode = "auto"
         selected_agent_value = None
+    elif selected_agent_option == "Several (multi)":
+        routing_mode = "multi"
+        selected_agent_value = None
     else:
         routing_mode = "manual"
         selected_agent_value = selected_agent_option
@@ -204,13 +210,20 @@ with tab_agenthost:
 
     if st.button("Send to AgentHost", key="send_agenthost"):
         if user_input.strip():
-            # Call AgentHost
-            reply = call_agenthost_query(
-                get_agenthost_base_url(),
-                user_input.strip(),
-                routing_mode,
-                selected_agent_value,
-            )
+            # Call AgentHost (tokens render as they arrive)
+            live_reply = st.empty()
+            with live_reply.container():
+                st.markdown("**AgentHost:**")
+                reply = st.write_stream(
+                    call_agenthost_query(
+                        get_agenthost_base_url(),
+                        user_input.strip(),
+                        routing_mode,
+                        selected_agent_value,
+                        get_session_id("agenthost_session_id"),
+                    )
+                )
+            live_reply.empty()
 
             # Update history
             st.session_state["agenthost_history"].append(("user", user_input.strip()))
@@ -229,7 +242,7 @@ with tab_agenthost:
 # ===========================
 
 with tab_llm:
-    st.subheader("🧩 Direct LLM Chat (LiteLLM)")
+    st.subheader("🧩 Direct LLM Chat (LiteLLM via AgentHost)")
 
     if llm_models:
         selected_model = st.selectbox(
@@ -249,17 +262,20 @@ with tab_llm:
 
     if st.button("Send to LLM", key="send_llm"):
         if user_input_llm.strip():
-            # Prepare history in chat-completions format
-            history_for_model = st.session_state["llm_history"]
-            reply = call_direct_llm_chat(
-                get_litellm_base_url(),
-                get_litellm_api_key(),
-                selected_model,
-                user_input_llm.strip(),
-                history_for_model,
-            )
-
-            # Update history (for model context)
+            live_reply = st.empty()
+            with live_reply.container():
+                st.markdown(f"**LLM ({selected_model}):**")
+                reply = st.write_stream(
+                    call_direct_llm_chat(
+                        get_agenthost_base_url(),
+                        selected_model,
+                        user_input_llm.strip(),
+                        get_session_id("llm_session_id"),
+                    )
+                )
+            live_reply.empty()
+
+            # Update history (display only; AgentHost keeps the model context)
             st.session_state["llm_history"].append(
                 {"role": "user", "content": user_input_llm.strip()}
             )